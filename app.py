@@ -1,13 +1,21 @@
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, flash, Response, g
 import os
-import uuid
+import json
+import time
 import logging
-import re
 from werkzeug.utils import secure_filename
 from config import Config
 from utils.file_processor import FileProcessor
 from utils.encryption_engine import EncryptionEngine
-from utils.password_book import PasswordBookManager
+from utils.password_book import PasswordBookManager, PasswordBookIndex, remove_timestamp_prefix
+from utils.job_queue import JobQueue, start_workers, JOB_FINISHED, JOB_FAILED
+from utils.session_store import SessionStore
+from utils.janitor import start_janitor
+from utils.admission import estimate_encrypt_job, estimate_decrypt_job, check_admission
+from utils.uploads import UploadRequest
+from utils.chunked_upload import ChunkedUploadStore
+from utils.artifacts import ArtifactRegistry, ARTIFACT_ENCRYPTED, ARTIFACT_DECRYPTED
+from utils.storage_layout import locate
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -21,22 +29,49 @@ logger = logging.getLogger(__name__)
 file_processor = FileProcessor()
 encryption_engine = EncryptionEngine()
 password_book_manager = PasswordBookManager()
+job_queue = JobQueue()
+upload_store = ChunkedUploadStore(file_processor)
+artifact_registry = ArtifactRegistry()
 
-# 会话管理（简化版）
-sessions = {}
+
+class AppRequest(UploadRequest):
+    """上传文件直接写入上传目录；加密页面上传的文件在数据到达前按文件名校验"""
+    file_processor = file_processor
+    validate_endpoints = frozenset({'encrypt_config'})
+
+
+app.request_class = AppRequest
+
+# 会话管理：会话数据保存在多个 web 进程共享的 SQLite 中，通过 session_id Cookie 关联
+session_store = SessionStore()
+SESSION_COOKIE = 'session_id'
 
 
 def get_session():
-    """获取或创建会话"""
-    session_id = request.cookies.get('session_id')
-    if not session_id or session_id not in sessions:
-        session_id = str(uuid.uuid4())
-        sessions[session_id] = {
-            'uploaded_files': [],
-            'password_books': [],
-            'created_time': os.times().elapsed
-        }
-    return session_id, sessions[session_id]
+    """获取或创建当前请求的会话，请求结束时写回会话存储"""
+    if 'session' not in g:
+        session_id = request.cookies.get(SESSION_COOKIE)
+        session = session_store.load(session_id)
+        if session is None:
+            session_id, session = session_store.create()
+        g.session_id, g.session = session_id, session
+    return g.session_id, g.session
+
+
+@app.before_request
+def ensure_janitor():
+    """确保当前进程的后台清理线程已启动（gunicorn 的每个 worker 各自启动）"""
+    start_janitor()
+
+
+@app.after_request
+def save_session(response):
+    """保存本次请求使用过的会话，并刷新会话 Cookie"""
+    if 'session' in g:
+        session_store.save(g.session_id, g.session)
+        response.set_cookie(SESSION_COOKIE, g.session_id, max_age=Config.SESSION_TTL,
+                            httponly=True, samesite='Lax')
+    return response
 
 
 def find_matching_password_book(encrypted_filename, password_books_dict):
@@ -46,11 +81,11 @@ def find_matching_password_book(encrypted_filename, password_books_dict):
 
     for pb_filename, pb_data in password_books_dict.items():
         # 获取密码本中记录的原始文件名
-        original_filename = pb_data.get('metadata', {}).get('original_filename', '')
+        original_filename = pb_data.original_filename or ''
         original_base = os.path.splitext(original_filename)[0] if original_filename else ''
 
         # 获取密码本中记录的最终加密文件名
-        final_filename = pb_data.get('metadata', {}).get('final_filename', '')
+        final_filename = pb_data.final_filename or ''
         final_base = os.path.splitext(final_filename)[0] if final_filename else ''
 
         logger.debug(f"检查密码本: {pb_filename}, 原始文件: {original_filename}, 最终文件: {final_filename}")
@@ -93,28 +128,21 @@ def match_filename_prefix(encrypted_base, original_base):
     return encrypted_clean == original_clean
 
 
-def remove_timestamp_prefix(filename):
-    """移除时间戳前缀"""
-    # 匹配常见的时间戳格式：20241102_143000_ 或 20241102143000_
-    pattern = r'^\d{8}_\d{6}_|\d{14}_'
-    return re.sub(pattern, '', filename)
-
-
 def simple_password_book_match(encrypted_filename, password_books_dict):
     """简单的密码本匹配逻辑"""
     encrypted_base = os.path.splitext(encrypted_filename)[0]
 
     for pb_filename, pb_data in password_books_dict.items():
-        pb_original_name = pb_data.get('metadata', {}).get('original_filename', '')
+        pb_original_name = pb_data.original_filename or ''
         pb_original_base = os.path.splitext(pb_original_name)[0] if pb_original_name else ''
 
         # 简单的包含匹配
         if (encrypted_base in pb_original_base or
                 pb_original_base in encrypted_base or
                 encrypted_base in pb_filename):
-            return pb_data
+            return pb_filename, pb_data
 
-    return None
+    return None, None
 
 
 @app.route('/')
@@ -166,6 +194,12 @@ def encrypt_config():
                 else:
                     flash(f"{file.filename} 上传失败: {filename}", 'error')
 
+        # 通过分块上传接口上传的大文件
+        upload_ids = request.form.getlist('upload_ids')
+        for file_info in upload_store.take(upload_ids, session_id, 'encrypt'):
+            uploaded_files.append(file_info)
+            flash(f"{file_info['original_name']} 上传成功", 'success')
+
         # 如果没有新文件上传，检查会话中是否有已上传的文件
         if not uploaded_files and session['uploaded_files']:
             uploaded_files = session['uploaded_files']
@@ -176,7 +210,7 @@ def encrypt_config():
             return redirect(request.url)
 
         # 更新会话（如果有新文件上传）
-        if 'files' in request.files and uploaded_files:
+        if ('files' in request.files or upload_ids) and uploaded_files:
             session['uploaded_files'] = uploaded_files
 
         # 获取加密参数
@@ -185,6 +219,9 @@ def encrypt_config():
         specific_code = request.form.get('specific_code', '').strip()
         encrypt_password_book = request.form.get('encrypt_password_book') == 'on'
         password = request.form.get('password', '')
+        compression_profile = request.form.get('compression_profile', Config.DEFAULT_COMPRESSION_PROFILE)
+        if compression_profile not in Config.COMPRESSION_PROFILES:
+            compression_profile = Config.DEFAULT_COMPRESSION_PROFILE
 
         # 计算加密轮数
         if rounds_method == 'specific_code' and specific_code:
@@ -192,82 +229,24 @@ def encrypt_config():
         else:
             rounds = encryption_engine.calculate_rounds(manual_rounds=manual_rounds)
 
-        # 处理每个文件
-        results = []
-        for file_info in session['uploaded_files']:
-            try:
-                # 执行加密
-                success, encrypted_file, password_book, error = encryption_engine.multi_round_encrypt(
-                    file_info['filepath'],
-                    rounds,
-                    original_filename=file_info['original_name']
-                )
-                if success:
-                    # 生成密码本
-                    success_pb, password_book_data, book_id = password_book_manager.generate_password_book({
-                        'metadata': password_book['metadata'],
-                        'rounds': password_book['rounds']
-                    })
-                    if success_pb:
-                        # 加密密码本（如果需要）
-                        if encrypt_password_book and password:
-                            success_enc, encrypted_pb, error_enc = password_book_manager.encrypt_password_book(
-                                password_book_data, password
-                            )
-                            if success_enc:
-                                password_book_data = encrypted_pb
-
-                        # 保存密码本
-                        success_save, pb_filepath, pb_filename = password_book_manager.save_password_book(
-                            password_book_data)
-
-                        if success_save:
-                            results.append({
-                                'original_file': file_info['original_name'],
-                                'encrypted_file': os.path.basename(encrypted_file),
-                                'encrypted_filepath': encrypted_file,
-                                'password_book': pb_filename,
-                                'password_bookpath': pb_filepath,
-                                'rounds': rounds,
-                                'success': True
-                            })
-                            # 更新会话
-                            session['password_books'].append({
-                                'filename': pb_filename,
-                                'filepath': pb_filepath,
-                                'original_file': file_info['original_name']
-                            })
-                        else:
-                            results.append({
-                                'original_file': file_info['original_name'],
-                                'success': False,
-                                'error': f'保存密码本失败: {pb_filename}'
-                            })
-                    else:
-                        results.append({
-                            'original_file': file_info['original_name'],
-                            'success': False,
-                            'error': f'生成密码本失败: {book_id}'
-                        })
-                else:
-                    results.append({
-                        'original_file': file_info['original_name'],
-                        'success': False,
-                        'error': error
-                    })
-
-            except Exception as e:
-                results.append({
-                    'original_file': file_info['original_name'],
-                    'success': False,
-                    'error': str(e)
-                })
+        # 估算任务所需的临时磁盘空间和 CPU 耗时，资源不足时拒绝（已上传的文件保留在会话中，可稍后重试）
+        estimate = estimate_encrypt_job(session['uploaded_files'], rounds, compression_profile)
+        admitted, reason = check_admission(job_queue, estimate)
+        if not admitted:
+            flash(reason, 'error')
+            return redirect(request.url)
 
-        # 清理上传的原始文件
-        file_paths = [file_info['filepath'] for file_info in session['uploaded_files']]
-        file_processor.cleanup_temp_files(file_paths)
+        # 提交后台任务，由工作进程并发处理每个文件并清理上传的原始文件
+        job_id = job_queue.submit('encrypt', {
+            'files': session['uploaded_files'],
+            'rounds': rounds,
+            'encrypt_password_book': encrypt_password_book,
+            'profile': compression_profile,
+            'owner': session_id
+        }, owner=session_id, secrets={'password': password}, **estimate)
+        start_workers()
         session['uploaded_files'] = []
-        return render_template('result.html', results=results, operation='encrypt')
+        return redirect(url_for('job_status', job_id=job_id))
 
     # 如果没有上传文件，显示提示信息
     if not session['uploaded_files']:
@@ -275,7 +254,10 @@ def encrypt_config():
 
     return render_template('encrypt.html',
                            files=session['uploaded_files'],
-                           algorithms=encryption_engine.get_supported_algorithms())
+                           algorithms=encryption_engine.get_supported_algorithms(),
+                           compression_profiles=encryption_engine.get_compression_profiles(),
+                           default_profile=Config.DEFAULT_COMPRESSION_PROFILE,
+                           algorithm_stats=encryption_engine.get_algorithm_stats())
 
 
 @app.route('/decrypt', methods=['GET', 'POST'])
@@ -284,8 +266,9 @@ def decrypt_config():
     session_id, session = get_session()
 
     if request.method == 'POST':
-        # 检查文件上传
-        if 'encrypted_files' not in request.files:
+        # 检查文件上传（大文件可能已通过分块上传接口上传）
+        encrypted_upload_ids = request.form.getlist('encrypted_upload_ids')
+        if 'encrypted_files' not in request.files and not encrypted_upload_ids:
             flash('请选择加密文件', 'error')
             return redirect(request.url)
 
@@ -297,21 +280,6 @@ def decrypt_config():
         password_books = request.files.getlist('password_books')
         decrypt_password = request.form.get('decrypt_password', '')
 
-        # 保存上传的加密文件
-        uploaded_files = []
-        for file in encrypted_files:
-            if file.filename and file.filename != '':
-                success, filepath, filename = file_processor.save_uploaded_file(file)
-                if success:
-                    uploaded_files.append({
-                        'filepath': filepath,
-                        'filename': filename,
-                        'original_name': file.filename
-                    })
-                    logger.debug(f"成功上传加密文件: {file.filename}")
-                else:
-                    flash(f'文件 {file.filename} 上传失败: {filename}', 'error')
-
         # 保存上传的密码本文件
         password_book_data = {}
         password_book_files = {}  # 存储密码本文件名和文件路径的映射
@@ -324,7 +292,7 @@ def decrypt_config():
                     success_load, password_book, error = password_book_manager.load_password_book(filepath)
                     if success_load:
                         # 解密密码本（如果需要）
-                        if password_book.get('encrypted'):
+                        if password_book.encrypted:
                             if not decrypt_password:
                                 flash(f'{pb_file.filename}: 密码本已加密，请输入密码', 'error')
                                 continue
@@ -351,46 +319,81 @@ def decrypt_config():
         # 检查是否有可用的密码本
         if not password_book_data:
             flash('没有可用的密码本文件，请检查文件格式或密码', 'error')
-            # 清理上传的文件
-            file_paths = [file_info['filepath'] for file_info in uploaded_files]
-            file_paths.extend(password_book_files.values())
-            file_processor.cleanup_temp_files(file_paths)
+            # 清理上传的密码本
+            file_paths = list(password_book_files.values())
+            if file_paths:
+                file_processor.cleanup_temp_files(file_paths)
             return redirect(request.url)
 
+        # 构建一次密码本索引，供后续匹配使用
+        password_book_index = PasswordBookIndex(password_book_data)
+
+        # 保存上传的加密文件
+        uploaded_files = []
+        for file in encrypted_files:
+            if file.filename and file.filename != '':
+                # 保存时按各密码本记录的哈希方式计算内容哈希，用于按 final_hash 精确匹配密码本
+                success, filepath, filename, file_hashes = file_processor.save_uploaded_file_hashed(
+                    file, password_book_index.hash_specs
+                )
+                if success:
+                    uploaded_files.append({
+                        'filepath': filepath,
+                        'filename': filename,
+                        'original_name': file.filename,
+                        'hashes': file_hashes
+                    })
+                    logger.debug(f"成功上传加密文件: {file.filename}")
+                else:
+                    flash(f'文件 {file.filename} 上传失败: {filename}', 'error')
+
+        # 通过分块上传接口上传的加密文件
+        for file_info in upload_store.take(encrypted_upload_ids, session_id, 'decrypt'):
+            uploaded_files.append({
+                'filepath': file_info['filepath'],
+                'filename': file_info['filename'],
+                'original_name': file_info['original_name'],
+                'hashes': file_processor.file_hashes(file_info['filepath'], password_book_index.hash_specs)
+            })
+            logger.debug(f"使用分块上传的加密文件: {file_info['original_name']}")
+
         # 检查是否有可用的加密文件
         if not uploaded_files:
             flash('没有可用的加密文件', 'error')
             # 清理上传的密码本
             file_paths = list(password_book_files.values())
-            file_processor.cleanup_temp_files(file_paths)
+            if file_paths:
+                file_processor.cleanup_temp_files(file_paths)
             return redirect(request.url)
 
         logger.debug(f"开始解密处理，加密文件数量: {len(uploaded_files)}, 密码本数量: {len(password_book_data)}")
 
-        # 执行解密
-        results = []
-        for file_info in uploaded_files:
+        # 为每个加密文件匹配密码本
+        results = [None] * len(uploaded_files)
+        jobs = []
+        for position, file_info in enumerate(uploaded_files):
             logger.debug(f"处理加密文件: {file_info['original_name']}")
 
-            # 改进的密码本匹配逻辑
-            matched_pb = None
-            matched_pb_filename = None
+            # 方法1: 按内容哈希精确匹配，不受文件重命名影响
+            matched_pb_filename, matched_pb = password_book_index.lookup_hash(file_info['hashes'])
 
-            # 方法1: 使用增强的匹配逻辑
-            matched_pb_filename, matched_pb = find_matching_password_book(
-                file_info['original_name'], password_book_data
-            )
+            # 方法2: 按文件名索引查找
+            if not matched_pb:
+                matched_pb_filename, matched_pb = password_book_index.lookup(file_info['original_name'])
+
+            # 方法3: 索引未命中时，使用增强的匹配逻辑
+            if not matched_pb:
+                matched_pb_filename, matched_pb = find_matching_password_book(
+                    file_info['original_name'], password_book_data
+                )
 
-            # 方法2: 如果增强匹配失败，使用简单匹配
+            # 方法4: 如果增强匹配失败，使用简单匹配
             if not matched_pb:
-                matched_pb = simple_password_book_match(file_info['original_name'], password_book_data)
-                if matched_pb:
-                    for pb_filename, pb_data in password_book_data.items():
-                        if pb_data == matched_pb:
-                            matched_pb_filename = pb_filename
-                            break
-
-            # 方法3: 单文件单密码本情况
+                matched_pb_filename, matched_pb = simple_password_book_match(
+                    file_info['original_name'], password_book_data
+                )
+
+            # 方法5: 单文件单密码本情况
             if not matched_pb and len(uploaded_files) == 1 and len(password_book_data) == 1:
                 matched_pb_filename = list(password_book_data.keys())[0]
                 matched_pb = password_book_data[matched_pb_filename]
@@ -399,102 +402,251 @@ def decrypt_config():
 
             if not matched_pb:
                 error_msg = f'未找到匹配的密码本。文件: {file_info["original_name"]}，可用密码本: {", ".join(password_book_data.keys())}'
-                results.append({
+                results[position] = {
                     'encrypted_file': file_info['original_name'],
                     'success': False,
                     'error': error_msg
-                })
+                }
                 logger.warning(error_msg)
                 continue
 
             logger.debug(f"匹配成功: {file_info['original_name']} -> {matched_pb_filename}")
+            jobs.append([position, file_info, matched_pb])
 
-            try:
-                # 检查加密文件是否存在
-                if not os.path.exists(file_info['filepath']):
-                    raise Exception(f"加密文件不存在: {file_info['filepath']}")
-
-                # 执行解密
-                success, decrypted_file, error = encryption_engine.multi_round_decrypt(
-                    file_info['filepath'], matched_pb
-                )
-                if success:
-                    # 检查解密后的文件是否存在
-                    if not os.path.exists(decrypted_file):
-                        raise Exception(f"解密后的文件不存在: {decrypted_file}")
-
-                    results.append({
-                        'encrypted_file': file_info['original_name'],
-                        'decrypted_file': os.path.basename(decrypted_file),
-                        'decrypted_filepath': decrypted_file,
-                        'original_filename': matched_pb['metadata']['original_filename'],
-                        'success': True
-                    })
-                    logger.info(f"解密成功: {file_info['original_name']}")
-                else:
-                    results.append({
-                        'encrypted_file': file_info['original_name'],
-                        'success': False,
-                        'error': error
-                    })
-                    logger.error(f"解密失败: {file_info['original_name']} - {error}")
-            except Exception as e:
-                error_msg = f'解密过程异常: {str(e)}'
-                results.append({
-                    'encrypted_file': file_info['original_name'],
-                    'success': False,
-                    'error': error_msg
-                })
-                logger.error(f"解密异常: {file_info['original_name']} - {str(e)}")
-
-        # 清理上传的文件
+        # 提交后台任务并发解密，结果按上传顺序填回，完成后清理上传的文件
         file_paths = [file_info['filepath'] for file_info in uploaded_files]
         file_paths.extend(password_book_files.values())
-        file_processor.cleanup_temp_files(file_paths)
 
-        return render_template('result.html', results=results, operation='decrypt')
+        # 估算任务所需的临时磁盘空间和 CPU 耗时，资源不足时拒绝
+        estimate = estimate_decrypt_job(jobs)
+        admitted, reason = check_admission(job_queue, estimate)
+        if not admitted:
+            flash(reason, 'error')
+            file_processor.cleanup_temp_files(file_paths)
+            return redirect(request.url)
+
+        # 解密后的密码本作为机密参数加密保存，转换为 JSON 格式，由工作进程重新构建
+        job_id = job_queue.submit('decrypt', {
+            'results': results,
+            'cleanup': file_paths,
+            'owner': session_id
+        }, owner=session_id, secrets={
+            'jobs': [[position, file_info, password_book.to_dict()] for position, file_info, password_book in jobs]
+        }, **estimate)
+        start_workers()
+        return redirect(url_for('job_status', job_id=job_id))
 
     return render_template('decrypt.html')
 
 
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """创建分块上传：请求体为 {"filename", "size", "purpose"}，返回上传信息（含分块大小）"""
+    session_id, _ = get_session()
+    data = request.get_json(silent=True) or {}
+    success, upload, error = upload_store.create(session_id, data.get('filename', ''), data.get('size'),
+                                                 data.get('purpose', 'encrypt'))
+    if not success:
+        return jsonify({'error': error}), 400
+    return jsonify(upload), 201
+
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """查询分块上传的状态及已接收的分块，用于中断后继续上传"""
+    session_id, _ = get_session()
+    upload = upload_store.get(upload_id, session_id)
+    if upload is None:
+        return jsonify({'error': '上传不存在或已过期'}), 404
+    return jsonify(upload)
+
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """上传一个分块：?offset= 为分块在文件中的偏移，可选的 X-Chunk-SHA256 请求头用于校验分块数据"""
+    session_id, _ = get_session()
+    if upload_store.get(upload_id, session_id) is None:
+        return jsonify({'error': '上传不存在或已过期'}), 404
+    success, chunk, error = upload_store.write_chunk(
+        upload_id, session_id, request.args.get('offset', type=int), request.stream,
+        request.content_length, request.headers.get('X-Chunk-SHA256')
+    )
+    if not success:
+        # 分块数据不完整或校验失败时客户端应重传该分块
+        return jsonify({'error': error, 'chunk': chunk}), 422 if chunk else 400
+    return jsonify(chunk)
+
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """所有分块上传完成后完成上传，之后可在加密 / 解密表单中通过上传 ID 使用该文件"""
+    session_id, _ = get_session()
+    success, upload, error = upload_store.finalize(upload_id, session_id)
+    if upload is None:
+        return jsonify({'error': error}), 404
+    if not success:
+        return jsonify(dict(upload, error=error)), 409
+    return jsonify(upload)
+
+
+def get_own_job(job_id):
+    """读取当前会话提交的任务；任务不存在或属于其他会话时返回 None"""
+    session_id, _ = get_session()
+    job = job_queue.get(job_id)
+    if job is None or job['owner'] != session_id:
+        return None
+    return job
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """任务页面：完成后按任务记录显示结果，未完成时显示状态并自动刷新"""
+    session_id, session = get_session()
+    job = get_own_job(job_id)
+    if job is None:
+        flash('任务不存在或已过期', 'error')
+        return redirect(url_for('index'))
+
+    if job['status'] == JOB_FINISHED:
+        # 加密任务生成的密码本记入提交任务的会话（每个任务只记一次）
+        if job_id not in session.setdefault('applied_jobs', []):
+            session['password_books'].extend(job['result'].get('session_entries', []))
+            session['applied_jobs'].append(job_id)
+        return render_template('result.html', results=job['result']['results'], operation=job['kind'])
+
+    return render_template('job.html', job=job, failed=job['status'] == JOB_FAILED)
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status_api(job_id):
+    """查询任务状态，完成后附带结果"""
+    job = get_own_job(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+
+    data = {key: job[key] for key in ('id', 'kind', 'status', 'error', 'created_at', 'started_at', 'finished_at')}
+    if job['status'] == JOB_FINISHED:
+        data['results'] = job['result']['results']
+    return jsonify(data)
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """以 Server-Sent Events 推送任务的进度事件，任务结束时推送 status 事件后关闭
+
+    连接超过 SSE_MAX_DURATION 秒后主动关闭，浏览器会携带 Last-Event-ID 重连并从断点继续。
+    """
+    if get_own_job(job_id) is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    last_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('last_event_id', default=0, type=int)
+
+    def stream(last_id):
+        deadline = time.time() + Config.SSE_MAX_DURATION
+        last_sent = time.time()
+        yield f'retry: {int(Config.SSE_POLL_INTERVAL * 4000)}\n\n'
+        while True:
+            # 先读取状态再读取事件：任务结束前的事件都已写入，结束时不会漏发
+            job = job_queue.get(job_id)
+            for event_id, event in job_queue.events(job_id, last_id):
+                last_id = event_id
+                last_sent = time.time()
+                yield f'id: {event_id}\nevent: progress\ndata: {json.dumps(event, ensure_ascii=False)}\n\n'
+
+            if job is None or job['status'] in (JOB_FINISHED, JOB_FAILED):
+                status = {'status': job['status'] if job else JOB_FAILED,
+                          'error': job['error'] if job else '任务不存在或已过期'}
+                yield f'event: status\ndata: {json.dumps(status, ensure_ascii=False)}\n\n'
+                return
+            if time.time() > deadline:
+                return
+            if time.time() - last_sent > Config.SSE_HEARTBEAT_INTERVAL:
+                last_sent = time.time()
+                yield ': keep-alive\n\n'
+            time.sleep(Config.SSE_POLL_INTERVAL)
+
+    return Response(stream(last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/round_plan', methods=['GET'])
+def round_plan():
+    """按文件大小和轮数预览轮次计划及预计耗时"""
+    size = request.args.get('size', default=0, type=int)
+    rounds = encryption_engine.calculate_rounds(manual_rounds=request.args.get('rounds', default=3, type=int))
+    profile = request.args.get('profile', Config.DEFAULT_COMPRESSION_PROFILE)
+    if profile not in Config.COMPRESSION_PROFILES:
+        return jsonify({'error': f'不支持的压缩级别方案: {profile}'}), 400
+    return jsonify(encryption_engine.plan_rounds(size, rounds, profile=profile))
+
+
+@app.route('/api/algorithms', methods=['GET'])
+def algorithm_stats():
+    """各压缩算法在指定压缩级别方案下实测的压缩 / 解压吞吐量"""
+    profile = request.args.get('profile', Config.DEFAULT_COMPRESSION_PROFILE)
+    if profile not in Config.COMPRESSION_PROFILES:
+        return jsonify({'error': f'不支持的压缩级别方案: {profile}'}), 400
+    return jsonify(encryption_engine.get_algorithm_stats(profile))
+
+
 @app.route('/password_books', methods=['GET'])
 def password_books():
-    """密码本管理页面"""
-    success, books, error = password_book_manager.list_password_books()
+    """密码本管理页面：按页显示密码本索引，支持排序和按文件名、原文件名、密码本 ID、哈希搜索"""
+    page = max(request.args.get('page', default=1, type=int), 1)
+    per_page = request.args.get('per_page', default=Config.PASSWORD_BOOKS_PER_PAGE, type=int)
+    per_page = min(max(per_page, 1), Config.PASSWORD_BOOKS_MAX_PER_PAGE)
+    sort = request.args.get('sort', 'modified_time')
+    order = request.args.get('order', 'desc')
+    search = request.args.get('q', '').strip()
+    encrypted = {'1': True, '0': False}.get(request.args.get('encrypted', ''))
+
+    success, result, error = password_book_manager.query_password_books(
+        page, per_page, sort, order != 'asc', search or None, encrypted
+    )
     if not success:
         flash(f'获取密码本列表失败: {error}', 'error')
-        books = []
-    return render_template('password_books.html', password_books=books)
+        result = {'books': [], 'total': 0, 'page': 1, 'pages': 1, 'per_page': per_page}
+
+    query = {'per_page': per_page, 'sort': sort, 'order': order, 'q': search,
+             'encrypted': request.args.get('encrypted', '')}
+
+    def page_url(**changes):
+        """保留当前查询条件、只修改部分参数的页面链接"""
+        args = dict(query, **changes)
+        return url_for('password_books', **{key: value for key, value in args.items() if value not in ('', None)})
+
+    return render_template('password_books.html', password_books=result['books'], pagination=result, query=query,
+                           page_url=page_url)
+
+
+def owns_artifact(artifact):
+    """产物是否由当前会话的任务生成（未记录所有者的产物不限制会话）"""
+    session_id, _ = get_session()
+    return artifact['owner'] is None or artifact['owner'] == session_id
 
 
 @app.route('/download/<file_type>/<filename>')
 def download_file(file_type, filename):
     """文件下载"""
     try:
-        if file_type == 'encrypted':
-            filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
+        if file_type in (ARTIFACT_ENCRYPTED, ARTIFACT_DECRYPTED):
+            # 加密 / 解密文件只按产物登记表定位（不按文件名查找上传目录），只允许生成它的会话下载；
+            # 登记表按文件名查找时不区分类型，类型不符同样视为不存在
+            artifact = artifact_registry.find(os.path.basename(filename))
+            if artifact is None or artifact['kind'] != file_type or not owns_artifact(artifact):
+                flash(f'文件不存在: {filename}', 'error')
+                return redirect(url_for('index'))
+            filepath = artifact['filepath']
         elif file_type == 'password_book':
-            filepath = os.path.join('static/password_books', filename)
-        elif file_type == 'decrypted':
-            # 解密后的文件可能在 UPLOAD_FOLDER 或其中的子目录中
-            filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
-            
-            # 如果文件不存在于根目录，尝试在 _extracted 目录中查找
-            if not os.path.exists(filepath):
-                # 搜索所有可能的解密文件位置
-                for root, dirs, files in os.walk(Config.UPLOAD_FOLDER):
-                    if filename in files:
-                        filepath = os.path.join(root, filename)
-                        break
-                else:
-                    # 如果还是找不到，尝试使用基础名称搜索
-                    base_name = os.path.splitext(filename)[0]
-                    for root, dirs, files in os.walk(Config.UPLOAD_FOLDER):
-                        for file in files:
-                            if base_name in file:
-                                filepath = os.path.join(root, file)
-                                filename = file  # 更新下载的文件名
-                                break
+            filepath = locate(password_book_manager.storage_dir, filename)
+            # ?format=json：二进制格式的密码本导出为 JSON 下载
+            if request.args.get('format') == 'json' and os.path.exists(filepath):
+                success, content, error = password_book_manager.export_password_book_json(filepath)
+                if not success:
+                    flash(error, 'error')
+                    return redirect(url_for('password_books'))
+                download_name = secure_filename(os.path.splitext(os.path.basename(filepath))[0] + '.json')
+                return Response(content, mimetype='application/json',
+                                headers={'Content-Disposition': f'attachment; filename={download_name}'})
         else:
             flash('无效的文件类型', 'error')
             return redirect(url_for('index'))
@@ -518,6 +670,22 @@ def download_file(file_type, filename):
         return redirect(url_for('index'))
 
 
+@app.route('/artifacts/<artifact_id>')
+def download_artifact(artifact_id):
+    """按产物 ID 下载加密 / 解密生成的文件，只允许生成它的会话下载"""
+    artifact = artifact_registry.get(artifact_id)
+    if artifact is None or not owns_artifact(artifact):
+        flash('文件不存在或已过期', 'error')
+        return redirect(url_for('index'))
+
+    logger.debug(f"下载产物: {artifact_id} -> {artifact['filepath']}")
+    return send_file(
+        artifact['filepath'],
+        as_attachment=True,
+        download_name=secure_filename(artifact['filename'])
+    )
+
+
 @app.route('/delete_password_book/<filename>')
 def delete_password_book(filename):
     """删除密码本"""
@@ -12,7 +12,7 @@ class Config:
     DENIED_EXTENSIONS = {'exe', 'sh', 'bat', 'cmd', 'msi'}
 
     # 压缩算法支持
-    COMPRESSION_ALGORITHMS = ['zip', 'tar', 'gzip', 'tar.gz', 'tar.bz2']
+    COMPRESSION_ALGORITHMS = ['zip', 'tar', 'gzip', 'tar.gz', 'tar.bz2', 'tar.xz', 'xz', 'deflate']
     
     # 后缀名池
     EXTENSION_POOL = [
@@ -20,5 +20,141 @@ class Config:
         '.png', '.xlsx', '.zip', '.tar', '.gz'
     ]
 
-    # 临时文件清理时间（秒）
-    TEMP_FILE_CLEANUP_TIME = 3600  # 1小时
\ No newline at end of file
+    # 加密流水线模式：'stream' 所有轮次嵌套成一条流一次完成；
+    # 'memory' 中间轮次在内存缓冲区中完成，只有最终文件落盘；'disk' 每轮都写入上传目录
+    ENCRYPT_PIPELINE = 'stream'
+
+    # 解密流水线模式：'stream' 逐层以数据流方式解开，只写出最终文件；'disk' 每轮解压到独立目录
+    DECRYPT_PIPELINE = 'stream'
+
+    # 流式处理的分块大小
+    STREAM_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+    # 内存缓冲区溢出阈值，超过后中间结果转存到磁盘临时文件
+    SPOOL_MAX_SIZE = 64 * 1024 * 1024  # 64MB
+
+    # 完整性哈希算法：'blake2b' / 'sha256' / 'md5'，使用的算法会记录在密码本中
+    HASH_ALGORITHM = 'blake2b'
+
+    # 分块树哈希：大文件按块在多个线程上并行计算
+    HASH_TREE_MODE = False
+    HASH_TREE_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB
+    HASH_TREE_WORKERS = None
+
+    # 计算文件哈希时的读取块大小
+    HASH_READ_SIZE = 1024 * 1024  # 1MB
+
+    # 文件哈希缓存的最大条目数
+    HASH_CACHE_SIZE = 4096
+
+    # 单个加密任务的时间预算（秒），轮次计划会在预算内随机选择算法；None 表示不限制
+    ROUND_TIME_BUDGET = 20
+
+    # 测量各算法吞吐量时使用的样本大小
+    PLANNER_SAMPLE_SIZE = 1024 * 1024  # 1MB
+
+    # 压缩级别方案：各算法使用的压缩级别（tar 不压缩，没有级别），可在加密页面按任务选择
+    # xz 为预设级别（0-9），9 级压缩时内存占用接近 700MB，最大压缩方案也只用到 6 级
+    COMPRESSION_PROFILES = {
+        'fast': {'zip': 1, 'gzip': 1, 'tar.gz': 1, 'tar.bz2': 1, 'tar.xz': 0, 'xz': 0, 'deflate': 1},
+        'balanced': {'zip': 6, 'gzip': 6, 'tar.gz': 6, 'tar.bz2': 9, 'tar.xz': 3, 'xz': 3, 'deflate': 6},
+        'max': {'zip': 9, 'gzip': 9, 'tar.gz': 9, 'tar.bz2': 9, 'tar.xz': 6, 'xz': 6, 'deflate': 9}
+    }
+    DEFAULT_COMPRESSION_PROFILE = 'balanced'
+
+    # 存储模式：输入已不可压缩时，后续轮次改用不压缩的容器（zip 存储、tar、0 级 gzip）
+    STORE_MODE_ENABLED = True
+    # 原文件抽样字节熵（比特/字节）达到该值时视为不可压缩，第一轮即使用存储模式
+    STORE_ENTROPY_THRESHOLD = 7.5
+    # 熵抽样的块数和每块大小
+    ENTROPY_SAMPLE_COUNT = 8
+    ENTROPY_SAMPLE_SIZE = 64 * 1024  # 64KB
+
+    # gzip / bz2 分块并行压缩：输入按块切分后在线程池中并发压缩，输出为标准的多成员（多流）格式
+    PARALLEL_COMPRESSION = True
+    PARALLEL_COMPRESS_BLOCK_SIZE = 4 * 1024 * 1024  # 4MB
+    # 并行压缩线程数，None 表示使用 CPU 核数；为 1 时使用标准库的单线程写入
+    PARALLEL_COMPRESS_WORKERS = None
+
+    # 多文件批处理的执行方式：'thread' 线程池, 'process' 进程池, 'serial' 逐个处理
+    BATCH_EXECUTOR = 'thread'
+
+    # 批处理并发数，None 表示使用 CPU 核数
+    BATCH_WORKERS = None
+
+    # 存储目录分片：上传目录和密码本目录中的文件按文件名哈希分散到多级子目录（如 3f/a2/文件名），
+    # 避免单个目录中的条目过多；级数为 0 时平铺存放。修改前已有的文件可用 python migrate_storage.py 迁移
+    STORAGE_SHARD_LEVELS = 2
+    STORAGE_SHARD_WIDTH = 2
+
+    # 实例数据目录（任务队列等运行时数据，不随代码发布）
+    INSTANCE_FOLDER = 'instance'
+
+    # 后台任务队列：加密 / 解密任务记录保存在 SQLite 中，由工作进程领取执行
+    JOB_DB_PATH = os.path.join(INSTANCE_FOLDER, 'jobs.sqlite3')
+    # web 进程启动的工作进程数；为 0 时不启动，需要单独运行 worker.py
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    # 工作进程轮询队列的间隔（秒）
+    JOB_POLL_INTERVAL = 0.5
+    # 已结束任务记录的保留时间及清理间隔（秒）
+    JOB_RETENTION = 24 * 3600
+    JOB_PURGE_INTERVAL = 600
+
+    # 任务准入控制：提交时估算任务的峰值临时磁盘占用和 CPU 耗时，资源不足时拒绝或排队
+    # 所有工作进程同时执行的任务数上限，达到上限时新任务排队
+    JOB_MAX_RUNNING = int(os.environ.get('JOB_MAX_RUNNING', 2))
+    # 排队任务数上限，超过时拒绝新任务
+    JOB_MAX_QUEUED = 100
+    # 排队及执行中任务预计 CPU 耗时（按并发数平摊，秒）的上限，超过时拒绝新任务
+    JOB_MAX_BACKLOG_SECONDS = 600
+    # 上传目录所在磁盘始终保留的空间
+    DISK_RESERVE_BYTES = 1024 * 1024 * 1024  # 1GB
+
+    # 产物登记表：生成的加密 / 解密文件按 ID 登记，下载时直接定位文件
+    ARTIFACT_DB_PATH = os.path.join(INSTANCE_FOLDER, 'artifacts.sqlite3')
+
+    # 进度事件：字节进度的最小上报间隔（秒），轮次开始和结束总是立即上报
+    PROGRESS_INTERVAL = 0.5
+    # 进度事件推送（Server-Sent Events）：检查新事件的间隔、心跳间隔，
+    # 以及单个连接的最长时间（秒），超时后浏览器会携带 Last-Event-ID 自动重连。
+    # 连接占用一个 gunicorn 同步 worker，最长时间须小于 worker 超时（默认 30 秒）
+    SSE_POLL_INTERVAL = 0.5
+    SSE_HEARTBEAT_INTERVAL = 15
+    SSE_MAX_DURATION = 25
+
+    # 会话存储：多个 web 进程共享的 SQLite 会话库
+    SESSION_DB_PATH = os.path.join(INSTANCE_FOLDER, 'sessions.sqlite3')
+    # 会话过期时间（秒，按最后访问时间计算）、会话总数上限（超出时淘汰最久未访问的会话）及清理间隔（秒）
+    SESSION_TTL = 24 * 3600
+    SESSION_MAX_ENTRIES = 10000
+    SESSION_PURGE_INTERVAL = 600
+
+    # 可续传的分块上传：上传记录保存在 SQLite 中，大文件按块上传，中断后可继续
+    UPLOAD_DB_PATH = os.path.join(INSTANCE_FOLDER, 'uploads.sqlite3')
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB
+    # 分块上传的单个文件大小上限：每个分块请求远小于 MAX_CONTENT_LENGTH，单个文件仍与表单上传的上限一致
+    CHUNKED_UPLOAD_MAX_SIZE = MAX_CONTENT_LENGTH
+
+    # 临时文件清理时间（秒），超过该时间的上传文件、中间文件和解压目录会被后台清理
+    # （已登记的产物按 JOB_RETENTION 保留，进行中的分块上传按上传记录保留，排队和执行中任务的输入文件不清理）
+    TEMP_FILE_CLEANUP_TIME = 3600  # 1小时
+
+    # 后台清理：web 进程定期清理上传目录和密码本目录，并限制目录总大小
+    JANITOR_ENABLED = True
+    JANITOR_INTERVAL = 300
+    # 最短保留时间（秒），超出配额时也不会删除更新的文件，避免删除正在处理的文件
+    JANITOR_MIN_AGE = 600
+    # 上传目录总大小上限，超出时从最旧的文件开始删除；None 表示不限制
+    UPLOAD_QUOTA_BYTES = 20 * 1024 * 1024 * 1024  # 20GB
+    # 密码本保留时间（秒）及目录总大小上限
+    PASSWORD_BOOK_RETENTION = 30 * 24 * 3600
+    PASSWORD_BOOK_QUOTA_BYTES = 1024 * 1024 * 1024  # 1GB
+
+    # 密码本索引：密码本元数据保存在 SQLite 中，密码本管理页面分页查询
+    PASSWORD_BOOK_CATALOG_DB_PATH = os.path.join(INSTANCE_FOLDER, 'password_books.sqlite3')
+    # 密码本管理页面每页显示的数量及上限
+    PASSWORD_BOOKS_PER_PAGE = 50
+    PASSWORD_BOOKS_MAX_PER_PAGE = 500
+    # 密码本保存格式：'binary' 紧凑二进制格式（.pwb，可只读取元数据），'json' 可读的 JSON 格式（.json）
+    # 两种格式都可以上传解密；二进制密码本可在管理页面导出为 JSON
+    PASSWORD_BOOK_FORMAT = 'binary'
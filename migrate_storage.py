@@ -0,0 +1,21 @@
+import sys
+import logging
+from config import Config
+from utils.storage_layout import migrate
+from utils.password_book import PasswordBookManager
+from utils.artifacts import ArtifactRegistry
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    # 将平铺存放的上传文件、解压目录和密码本移动到分片目录，并更新产物登记表中的路径
+    # 建议在停止 web 进程和工作进程后运行；--dry-run 只列出将要移动的条目
+    dry_run = '--dry-run' in sys.argv
+    registry = ArtifactRegistry()
+    for root in (Config.UPLOAD_FOLDER, PasswordBookManager().storage_dir):
+        for old_path, new_path in migrate(root, dry_run=dry_run):
+            if dry_run:
+                print(f"{old_path} -> {new_path}")
+            else:
+                registry.relocate(old_path, new_path)
@@ -1,5 +1,9 @@
 // 主JavaScript文件 - 文件加密解密系统
 
+// 分块上传：同时上传的分块数及单个分块的最大重试次数
+const UPLOAD_PARALLEL_CHUNKS = 4;
+const UPLOAD_MAX_RETRIES = 5;
+
 document.addEventListener('DOMContentLoaded', function() {
     initializeApp();
 });
@@ -18,9 +22,15 @@ function initializeApp() {
     
     // 初始化表单验证
     initializeFormValidation();
+
+    // 初始化大文件分块上传（在表单验证之后处理提交事件）
+    initializeChunkedUploads();
     
     // 初始化进度条
     initializeProgressBars();
+
+    // 初始化任务进度推送
+    initializeJobProgress();
 }
 
 /**
@@ -126,8 +136,8 @@ function highlightField(field, type) {
  * 初始化进度条
  */
 function initializeProgressBars() {
-    // 模拟进度条更新（实际应用中应该使用真实的上传进度）
-    const progressBars = document.querySelectorAll('.progress-bar');
+    // 模拟进度条更新（带 data-live 的进度条由真实的任务进度驱动）
+    const progressBars = document.querySelectorAll('.progress-bar:not([data-live])');
     
     progressBars.forEach(bar => {
         if (bar.style.width === '0%') {
@@ -161,6 +171,311 @@ function animateProgressBar(bar, target, duration) {
     requestAnimationFrame(updateProgress);
 }
 
+/**
+ * 初始化任务进度：通过 Server-Sent Events 接收各文件的轮次和字节进度，任务结束后刷新页面显示结果
+ */
+function initializeJobProgress() {
+    const container = document.getElementById('job-status');
+    const statusText = document.getElementById('job-status-text');
+    const list = document.getElementById('job-progress');
+    if (!container || !statusText || !list || !container.dataset.eventsUrl) {
+        return;
+    }
+
+    // 不支持 EventSource 的浏览器退回到轮询任务状态
+    if (!window.EventSource) {
+        pollJobStatus(container.dataset.statusUrl, statusText);
+        return;
+    }
+
+    const source = new EventSource(container.dataset.eventsUrl);
+    source.addEventListener('progress', function(e) {
+        statusText.textContent = '正在处理，请稍候…';
+        updateJobProgress(list, JSON.parse(e.data));
+    });
+    source.addEventListener('status', function() {
+        source.close();
+        window.location.reload();
+    });
+    source.addEventListener('error', function() {
+        // 连接被服务器拒绝（如任务已过期）时不会自动重连，刷新页面显示最新状态
+        if (source.readyState === EventSource.CLOSED) {
+            window.location.reload();
+        }
+    });
+}
+
+/**
+ * 轮询任务状态，结束后刷新页面
+ */
+function pollJobStatus(statusUrl, statusText) {
+    fetch(statusUrl)
+        .then(response => response.json())
+        .then(job => {
+            if (job.status === 'finished' || job.status === 'failed') {
+                window.location.reload();
+                return;
+            }
+            statusText.textContent = job.status === 'running' ? '正在处理，请稍候…' : '排队中，请稍候…';
+            setTimeout(() => pollJobStatus(statusUrl, statusText), 1500);
+        })
+        .catch(() => setTimeout(() => pollJobStatus(statusUrl, statusText), 3000));
+}
+
+/**
+ * 按进度事件更新对应文件的进度条
+ */
+function updateJobProgress(list, event) {
+    const row = getProgressRow(list, 'job-file-' + (event.file_index || 0));
+
+    // 逐轮模式按已完成轮数加本轮进度计算，流式模式所有轮次同时进行
+    let fraction = event.total_bytes ? Math.min(event.bytes_processed / event.total_bytes, 1) : 0;
+    if (event.round && event.total_rounds) {
+        const done = event.stage === 'decrypt' ? event.total_rounds - event.round : event.round - 1;
+        fraction = (done + fraction) / event.total_rounds;
+    }
+    if (event.type === 'done') {
+        fraction = 1;
+    }
+
+    const stage = event.stage === 'decrypt' ? '解密' : '加密';
+    let detail;
+    if (event.type === 'done') {
+        detail = `${stage}完成`;
+    } else if (event.round) {
+        detail = `${stage}第 ${event.round}/${event.total_rounds} 轮 · ${event.algorithm}`;
+    } else {
+        detail = `${stage} ${event.total_rounds} 轮（流式）· ${[].concat(event.algorithm || []).join(' → ')}`;
+    }
+    detail += ` · ${formatFileSize(event.bytes_processed)} · ${formatFileSize(event.throughput)}/s`;
+
+    setProgressRow(row, event.file || '', detail, fraction);
+}
+
+/**
+ * 获取或创建一行文件进度（文件名、详情和进度条）
+ */
+function getProgressRow(list, rowId) {
+    let row = document.getElementById(rowId);
+    if (!row) {
+        row = document.createElement('div');
+        row.id = rowId;
+        row.className = 'mb-3';
+        row.innerHTML = `
+            <div class="d-flex justify-content-between">
+                <span class="job-file-name"></span>
+                <small class="text-muted job-file-detail"></small>
+            </div>
+            <div class="progress">
+                <div class="progress-bar" role="progressbar" data-live style="width: 0%"></div>
+            </div>
+        `;
+        list.appendChild(row);
+    }
+    return row;
+}
+
+/**
+ * 更新一行文件进度
+ */
+function setProgressRow(row, name, detail, fraction) {
+    row.querySelector('.job-file-name').textContent = name;
+    row.querySelector('.job-file-detail').textContent = detail;
+    const bar = row.querySelector('.progress-bar');
+    bar.style.width = (fraction * 100).toFixed(1) + '%';
+    bar.setAttribute('aria-valuenow', Math.round(fraction * 100));
+}
+
+/**
+ * 初始化大文件分块上传：带 data-chunked-field 的文件输入框中超过 data-chunked-threshold 的文件
+ * 在表单提交前按块上传到 data-upload-url，表单只提交上传 ID（写入名为 data-chunked-field 的隐藏字段）
+ */
+function initializeChunkedUploads() {
+    if (!window.fetch || !window.DataTransfer) {
+        return;
+    }
+
+    document.querySelectorAll('form').forEach(form => {
+        const inputs = form.querySelectorAll('input[type="file"][data-chunked-field]');
+        if (inputs.length === 0) {
+            return;
+        }
+
+        form.addEventListener('submit', function(e) {
+            if (e.defaultPrevented) {
+                return;
+            }
+            const hasLargeFiles = Array.from(inputs).some(input =>
+                Array.from(input.files).some(file => file.size > parseInt(input.dataset.chunkedThreshold, 10))
+            );
+            if (!hasLargeFiles) {
+                return;
+            }
+            e.preventDefault();
+            submitWithChunkedUploads(form, inputs);
+        });
+    });
+}
+
+/**
+ * 分块上传表单中的大文件后提交表单，小文件仍随表单一起上传
+ */
+async function submitWithChunkedUploads(form, inputs) {
+    const buttons = form.querySelectorAll('button[type="submit"], input[type="submit"]');
+    buttons.forEach(button => { button.disabled = true; });
+
+    try {
+        for (const input of inputs) {
+            const threshold = parseInt(input.dataset.chunkedThreshold, 10);
+            const files = Array.from(input.files);
+            const largeFiles = files.filter(file => file.size > threshold);
+            if (largeFiles.length === 0) {
+                continue;
+            }
+
+            let list = input.parentElement.querySelector('.chunked-upload-progress');
+            if (!list) {
+                list = document.createElement('div');
+                list.className = 'chunked-upload-progress mt-3';
+                input.parentElement.appendChild(list);
+            }
+
+            for (const [index, file] of largeFiles.entries()) {
+                const row = getProgressRow(list, `${input.id}-upload-${index}`);
+                const upload = await uploadFileChunked(file, input.dataset.uploadUrl, input.dataset.uploadPurpose,
+                    loaded => setProgressRow(row, file.name,
+                        `上传中 · ${formatFileSize(loaded)} / ${formatFileSize(file.size)}`, loaded / file.size));
+                setProgressRow(row, file.name, `上传完成 · ${formatFileSize(file.size)}`, 1);
+
+                const field = document.createElement('input');
+                field.type = 'hidden';
+                field.name = input.dataset.chunkedField;
+                field.value = upload.upload_id;
+                form.appendChild(field);
+            }
+
+            // 输入框中只保留小文件；全部为大文件时不再提交该输入框
+            const transfer = new DataTransfer();
+            files.filter(file => file.size <= threshold).forEach(file => transfer.items.add(file));
+            input.files = transfer.files;
+            if (transfer.files.length === 0) {
+                input.required = false;
+                input.disabled = true;
+            }
+        }
+    } catch (error) {
+        showAlert(`文件上传失败：${error.message}`, 'error');
+        buttons.forEach(button => { button.disabled = false; });
+        return;
+    }
+
+    HTMLFormElement.prototype.submit.call(form);
+}
+
+/**
+ * 按块上传单个文件，返回完成的上传信息
+ *
+ * 上传 ID 按文件名、大小和修改时间记录在 localStorage 中，页面刷新或网络中断后重新提交时
+ * 只上传服务器尚未接收的分块；多个分块并行上传，失败的分块自动重试。
+ */
+async function uploadFileChunked(file, uploadUrl, purpose, onProgress) {
+    const resumeKey = `chunked-upload:${purpose}:${file.name}:${file.size}:${file.lastModified}`;
+    let upload = null;
+
+    const savedId = localStorage.getItem(resumeKey);
+    if (savedId) {
+        const response = await fetch(`${uploadUrl}/${savedId}`);
+        if (response.ok) {
+            upload = await response.json();
+        }
+    }
+    if (!upload) {
+        const response = await fetch(uploadUrl, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size, purpose: purpose })
+        });
+        upload = await response.json();
+        if (!response.ok) {
+            throw new Error(`${file.name}: ${upload.error || response.statusText}`);
+        }
+        localStorage.setItem(resumeKey, upload.upload_id);
+    }
+
+    const chunkUrl = `${uploadUrl}/${upload.upload_id}`;
+    const chunkLength = index => Math.min(upload.chunk_size, file.size - index * upload.chunk_size);
+    const received = new Set(upload.received);
+    const pending = [];
+    let loaded = 0;
+    for (let index = 0; index < upload.chunk_count; index++) {
+        if (received.has(index)) {
+            loaded += chunkLength(index);
+        } else {
+            pending.push(index);
+        }
+    }
+    onProgress(loaded);
+
+    if (upload.status !== 'complete') {
+        const worker = async () => {
+            while (pending.length > 0) {
+                const index = pending.shift();
+                try {
+                    await uploadChunk(chunkUrl, file, index * upload.chunk_size, chunkLength(index));
+                } catch (error) {
+                    pending.length = 0;
+                    throw new Error(`${file.name}: ${error.message}`);
+                }
+                loaded += chunkLength(index);
+                onProgress(loaded);
+            }
+        };
+        const workers = Math.min(UPLOAD_PARALLEL_CHUNKS, pending.length);
+        await Promise.all(Array.from({ length: workers }, worker));
+    }
+
+    const response = await fetch(`${chunkUrl}/finalize`, { method: 'POST' });
+    const result = await response.json();
+    if (!response.ok) {
+        throw new Error(`${file.name}: ${result.error || response.statusText}`);
+    }
+    localStorage.removeItem(resumeKey);
+    return result;
+}
+
+/**
+ * 上传一个分块；网络错误、服务器错误或校验失败时重试
+ */
+async function uploadChunk(chunkUrl, file, offset, length) {
+    const blob = file.slice(offset, offset + length);
+    const headers = { 'Content-Type': 'application/octet-stream' };
+    // crypto.subtle 仅在 HTTPS 等安全上下文中可用，不可用时由服务器只校验分块大小
+    if (window.crypto && window.crypto.subtle) {
+        const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        headers['X-Chunk-SHA256'] = Array.from(new Uint8Array(digest))
+            .map(byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    for (let attempt = 1; ; attempt++) {
+        let response = null;
+        try {
+            response = await fetch(`${chunkUrl}?offset=${offset}`, { method: 'PUT', headers: headers, body: blob });
+        } catch (error) {
+            // 网络错误，稍后重试
+        }
+        if (response && response.ok) {
+            return;
+        }
+
+        const retryable = !response || response.status === 422 || response.status >= 500;
+        if (!retryable || attempt >= UPLOAD_MAX_RETRIES) {
+            const data = response ? await response.json().catch(() => ({})) : {};
+            throw new Error(data.error || (response ? response.statusText : '网络错误'));
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+    }
+}
+
 /**
  * 显示提示消息
  */
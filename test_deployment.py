@@ -103,6 +103,413 @@ def test_dependencies():
             
     return all_installed
 
+def test_zip64_layer():
+    """测试 zip 层写入超过 zip64 界限的数据（临时调低界限模拟大于 2GB 的输入）"""
+    print("\n🔍 测试 zip64 流式写入...")
+
+    import io
+    import zipfile
+    from utils.stream_layers import open_layer_writer, open_layer_reader
+
+    data = os.urandom(5000)
+    original_limit = zipfile.ZIP64_LIMIT
+    zipfile.ZIP64_LIMIT = 1000
+    try:
+        # 大小未知（流式模式的内层）及大小已知两种情况
+        for size in (None, len(data)):
+            buffer = io.BytesIO()
+            writer = open_layer_writer('zip', buffer, 'large.bin', size)
+            writer.write(data)
+            writer.close()
+
+            buffer.seek(0)
+            reader = open_layer_reader('zip', buffer, 'large.bin')
+            assert reader.read() == data, "zip64 往返数据不一致"
+            reader.close()
+            print(f"✅ zip64 往返成功（输入大小: {size}）")
+    finally:
+        zipfile.ZIP64_LIMIT = original_limit
+
+    return True
+
+def test_artifact_owner():
+    """测试按文件名下载加密 / 解密文件时只允许生成它的会话下载（类型不符或未登记的文件同样不存在）"""
+    print("\n🔍 测试产物下载权限...")
+
+    from app import app, artifact_registry, SESSION_COOKIE
+    from config import Config
+    from utils.artifacts import ARTIFACT_DECRYPTED
+    from utils.storage_layout import shard_path
+
+    # 测试请求不启动后台清理线程，避免清理工作目录中已有的文件
+    Config.JANITOR_ENABLED = False
+    owner_client, other_client = app.test_client(), app.test_client()
+    owner_client.get('/encrypt')
+    owner = owner_client.get_cookie(SESSION_COOKIE).value
+
+    filename = f'test_secret_report_{os.getpid()}.txt'
+    unregistered = f'test_unregistered_{os.getpid()}.txt'
+    filepath = shard_path(Config.UPLOAD_FOLDER, filename)
+    unregistered_path = shard_path(Config.UPLOAD_FOLDER, unregistered)
+    for path in (filepath, unregistered_path):
+        with open(path, 'wb') as f:
+            f.write(b'plaintext')
+    try:
+        artifact_id = artifact_registry.register(ARTIFACT_DECRYPTED, filepath, owner)
+
+        assert owner_client.get(f'/download/decrypted/{filename}').status_code == 200, "所有者无法下载"
+        assert owner_client.get(f'/artifacts/{artifact_id}').status_code == 200, "所有者无法按产物 ID 下载"
+        for url in (f'/download/decrypted/{filename}', f'/download/encrypted/{filename}',
+                    f'/artifacts/{artifact_id}', f'/download/encrypted/{unregistered}',
+                    f'/download/decrypted/{unregistered}'):
+            response = other_client.get(url)
+            assert response.status_code == 302 and b'plaintext' not in response.data, f"其他会话可以下载: {url}"
+        print("✅ 其他会话无法下载产物（含类型不符及未登记的文件）")
+    finally:
+        for path in (filepath, unregistered_path):
+            os.remove(path)
+
+    return True
+
+def test_stream_scratch_estimate():
+    """测试流式模式的临时磁盘占用估算不低于实际峰值（溢出缓冲区按写入的字节数计入）"""
+    print("\n🔍 测试流式模式临时磁盘占用估算...")
+
+    import shutil
+    import tempfile
+    from config import Config
+    from utils.admission import scratch_bytes
+    from utils.encryption_engine import EncryptionEngine
+
+    work_dir = tempfile.mkdtemp()
+    original_upload_folder = Config.UPLOAD_FOLDER
+    original_spool = tempfile.SpooledTemporaryFile
+    live_spools, peak = set(), [0]
+
+    def sample(exclude):
+        usage = sum(spool.written for spool in live_spools)
+        for root, _, files in os.walk(work_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if path != exclude:
+                    usage += os.path.getsize(path)
+        peak[0] = max(peak[0], usage)
+
+    def measure(exclude, run):
+        """执行 run 并返回输入文件以外的峰值磁盘占用"""
+        class MeasuredSpool(original_spool):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.written = 0
+                live_spools.add(self)
+
+            def write(self, data):
+                written = super().write(data)
+                self.written += len(data)
+                sample(exclude)
+                return written
+
+            def close(self):
+                sample(exclude)
+                live_spools.discard(self)
+                super().close()
+
+        peak[0] = 0
+        tempfile.SpooledTemporaryFile = MeasuredSpool
+        try:
+            result = run()
+        finally:
+            tempfile.SpooledTemporaryFile = original_spool
+        sample(exclude)
+        return result, peak[0]
+
+    size = 4 * 1024 * 1024
+    Config.UPLOAD_FOLDER = work_dir
+    try:
+        engine = EncryptionEngine()
+        # 加密时 tar 层叠在大小未知的压缩输出上需要缓冲；解密时内层 zip 需要缓冲
+        for algorithms in (['tar.gz', 'tar', 'tar', 'tar.gz'], ['zip', 'zip', 'zip']):
+            rounds = len(algorithms)
+            plan = {'algorithms': algorithms, 'levels': [1] * rounds}
+            source = os.path.join(work_dir, 'input.bin')
+            with open(source, 'wb') as f:
+                f.write(os.urandom(size))
+
+            (success, final_file, password_book, error), encrypt_peak = measure(
+                source, lambda: engine.multi_round_encrypt(source, rounds, plan=plan, pipeline='stream'))
+            assert success, f"加密失败: {error}"
+            os.remove(source)
+            encrypt_estimate = scratch_bytes(size, rounds, 'stream')
+            assert encrypt_peak <= encrypt_estimate, f"加密估算偏低: {algorithms} {encrypt_peak} > {encrypt_estimate}"
+
+            (success, plain_file, error), decrypt_peak = measure(
+                final_file, lambda: engine.multi_round_decrypt(final_file, password_book, pipeline='stream'))
+            assert success, f"解密失败: {error}"
+            decrypt_estimate = scratch_bytes(size, rounds, 'stream', algorithms)
+            assert decrypt_peak <= decrypt_estimate, f"解密估算偏低: {algorithms} {decrypt_peak} > {decrypt_estimate}"
+            print(f"✅ {'/'.join(algorithms)}: 加密峰值 {encrypt_peak} <= 估算 {encrypt_estimate}, "
+                  f"解密峰值 {decrypt_peak} <= 估算 {decrypt_estimate}")
+
+            for path in (final_file, plain_file):
+                os.remove(path)
+    finally:
+        Config.UPLOAD_FOLDER = original_upload_folder
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return True
+
+def test_janitor_keep():
+    """测试后台清理跳过使用中的文件（含排队任务的输入文件）及 min_age 内的新文件"""
+    print("\n🔍 测试后台清理规则...")
+
+    import time
+    import shutil
+    import tempfile
+    from utils.janitor import DirectoryQuota
+    from utils.job_queue import JobQueue
+    from utils.storage_layout import shard_path
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        queue = JobQueue(os.path.join(work_dir, 'jobs.sqlite3'))
+        upload_dir = os.path.join(work_dir, 'uploads')
+        paths = {name: shard_path(upload_dir, name) for name in
+                 ('queued_input.bin', 'artifact.bin', 'expired.bin', 'recent.bin')}
+        for path in paths.values():
+            with open(path, 'wb') as f:
+                f.write(b'x' * 1024)
+        old = time.time() - 7200
+        for name in ('queued_input.bin', 'artifact.bin', 'expired.bin'):
+            os.utime(paths[name], (old, old))
+        queue.submit('encrypt', {'files': [{'filepath': paths['queued_input.bin']}]})
+
+        # 超出配额（0 字节）时也只删除过期且未使用的文件
+        quota = DirectoryQuota(upload_dir, 3600, max_bytes=0, min_age=600,
+                               keep=lambda: [paths['artifact.bin']] + queue.input_paths())
+        stats = quota.sweep()
+        remaining = {name for name, path in paths.items() if os.path.exists(path)}
+        assert remaining == {'queued_input.bin', 'artifact.bin', 'recent.bin'}, f"清理结果不符: {remaining}"
+        assert stats['files'] == 1, f"删除数量不符: {stats}"
+        print("✅ 使用中的文件和新文件被保留，过期文件被删除")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return True
+
+def test_job_queue_secrets():
+    """测试任务队列的提交、领取、完成：机密参数加密保存，领取时合并到载荷，结束后清除"""
+    print("\n🔍 测试任务队列...")
+
+    import shutil
+    import sqlite3
+    import tempfile
+    from utils.job_queue import JobQueue, JOB_FINISHED
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(work_dir, 'jobs.sqlite3')
+        queue = JobQueue(db_path)
+        job_id = queue.submit('encrypt', {'rounds': 3}, owner='session-A', secrets={'password': 'test-secret-pw'})
+
+        def stored():
+            conn = sqlite3.connect(db_path)
+            try:
+                return conn.execute('SELECT payload, secrets FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            finally:
+                conn.close()
+
+        assert 'test-secret-pw' not in repr(stored()), "机密参数以明文保存"
+        assert 'password' not in queue.get(job_id)['payload'], "get() 返回了机密参数"
+
+        job = queue.claim('test-worker')
+        assert job['id'] == job_id and job['payload'] == {'rounds': 3, 'password': 'test-secret-pw'}, "领取的载荷不符"
+        queue.finish(job_id, {'results': []})
+        assert queue.get(job_id)['status'] == JOB_FINISHED, "任务状态不符"
+        assert stored() == (None, None), "任务结束后载荷或机密参数未清除"
+        print("✅ 机密参数加密保存，领取后可用，结束后清除")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return True
+
+def test_job_owner():
+    """测试任务状态接口只对提交任务的会话可见"""
+    print("\n🔍 测试任务访问权限...")
+
+    from app import app, job_queue, SESSION_COOKIE
+    from config import Config
+
+    # 测试请求不启动后台清理线程，避免清理工作目录中已有的文件
+    Config.JANITOR_ENABLED = False
+    owner_client, other_client = app.test_client(), app.test_client()
+    owner_client.get('/encrypt')
+    owner = owner_client.get_cookie(SESSION_COOKIE).value
+
+    job_id = job_queue.submit('test', {}, owner=owner)
+    try:
+        assert owner_client.get(f'/api/jobs/{job_id}').status_code == 200, "提交任务的会话无法查询"
+        for url in (f'/api/jobs/{job_id}', f'/api/jobs/{job_id}/events'):
+            assert other_client.get(url).status_code == 404, f"其他会话可以访问: {url}"
+        assert other_client.get(f'/jobs/{job_id}').status_code == 302, "其他会话可以打开任务页面"
+        print("✅ 其他会话无法查询任务")
+    finally:
+        # 测试任务不会被工作进程执行，直接标记为失败
+        job_queue.fail(job_id, '测试任务')
+
+    return True
+
+def test_binary_password_book():
+    """测试二进制密码本（.pwb）编码 / 解码往返，以及截断的文件被拒绝"""
+    print("\n🔍 测试二进制密码本格式...")
+
+    import io
+    from utils.password_book_format import encode_password_book, read_password_book
+
+    password_book = {
+        'metadata': {'encryption_time': '2024-11-02T15:54:50', 'total_rounds': 3, 'original_filename': '报告.pdf',
+                     'original_hash': 'abc123', 'book_id': '0123456789abcdef'},
+        'rounds': {
+            '1': {'extension': '.mp3', 'algorithm': 'tar.gz', 'compresslevel': 6,
+                  'compressed_filename': 'upload_报告.tar.gz', 'encrypted_filename': 'upload_报告.mp3'},
+            # 不在编码表中的算法和后缀名以内联字符串保存，未知字段原样保留
+            '2': {'extension': '.custom', 'algorithm': 'future-algo', 'stored': True, 'note': {'k': [1, 2]}},
+            '3': {'extension': '.zip', 'algorithm': 'zip', 'compresslevel': 'max',
+                  'compressed_filename': 'upload_报告.zip', 'encrypted_filename': None}
+        },
+        'version': '1.0',
+        'generator': 'Flask File Encryption System'
+    }
+    data = encode_password_book(password_book)
+    assert read_password_book(io.BytesIO(data)) == password_book, "二进制密码本往返不一致"
+    assert 'rounds' not in read_password_book(io.BytesIO(data), rounds=False), "只读元数据时解码了轮次"
+    print("✅ 二进制密码本往返一致")
+
+    for length in (len(data) - 1, 10, 20):
+        try:
+            read_password_book(io.BytesIO(data[:length]))
+        except ValueError:
+            continue
+        raise AssertionError(f"截断为 {length} 字节的密码本未被拒绝")
+    print("✅ 截断的密码本被拒绝")
+
+    return True
+
+def test_stream_decrypt_disk_book():
+    """测试流式模式解密磁盘模式加密的文件（覆盖所有轮次算法），明文与原文件一致"""
+    print("\n🔍 测试流式解密磁盘模式的密码本...")
+
+    import shutil
+    import hashlib
+    import tempfile
+    from config import Config
+    from utils.encryption_engine import EncryptionEngine
+
+    work_dir = tempfile.mkdtemp()
+    original_upload_folder = Config.UPLOAD_FOLDER
+    Config.UPLOAD_FOLDER = work_dir
+    try:
+        engine = EncryptionEngine()
+        # 只用一个后缀名，各轮的文件名固定，测试结果不受随机选择影响
+        engine.extension_pool = ['.pdf']
+        algorithms = ['zip', 'tar.gz', 'gzip', 'tar', 'xz', 'deflate', 'tar.bz2', 'tar.xz']
+        data = os.urandom(64 * 1024) + b'a' * 64 * 1024
+        source = os.path.join(work_dir, 'report.txt')
+        with open(source, 'wb') as f:
+            f.write(data)
+
+        success, final_file, password_book, error = engine.multi_round_encrypt(
+            source, len(algorithms), plan={'algorithms': algorithms}, pipeline='disk')
+        assert success, f"磁盘模式加密失败: {error}"
+        success, plain_file, error = engine.multi_round_decrypt(final_file, password_book, pipeline='stream')
+        assert success, f"流式解密失败: {error}"
+        with open(plain_file, 'rb') as f:
+            assert hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest(), "解密结果与原文件不一致"
+        assert os.path.basename(plain_file) == 'report.txt', f"明文文件名不符: {plain_file}"
+        print(f"✅ {len(algorithms)} 轮磁盘模式密码本流式解密成功")
+    finally:
+        Config.UPLOAD_FOLDER = original_upload_folder
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return True
+
+def test_chunked_upload():
+    """测试分块上传：乱序写入分块、校验失败的分块不计入、完成后取出的文件与原数据一致且只能取出一次"""
+    print("\n🔍 测试分块上传...")
+
+    import io
+    import shutil
+    import hashlib
+    import tempfile
+    from config import Config
+    from utils.file_processor import FileProcessor
+    from utils.chunked_upload import ChunkedUploadStore
+
+    work_dir = tempfile.mkdtemp()
+    original_upload_folder, original_chunk_size = Config.UPLOAD_FOLDER, Config.UPLOAD_CHUNK_SIZE
+    Config.UPLOAD_FOLDER, Config.UPLOAD_CHUNK_SIZE = work_dir, 1024
+    try:
+        store = ChunkedUploadStore(FileProcessor(), os.path.join(work_dir, 'uploads.sqlite3'))
+        data = os.urandom(3 * 1024 + 100)
+        success, upload, error = store.create('session-A', 'report.txt', len(data))
+        assert success and upload['chunk_count'] == 4, f"创建上传失败: {error}"
+        upload_id = upload['upload_id']
+
+        def send(index, checksum=None):
+            chunk = data[index * 1024:(index + 1) * 1024]
+            checksum = checksum or hashlib.sha256(chunk).hexdigest()
+            return store.write_chunk(upload_id, 'session-A', index * 1024, io.BytesIO(chunk), len(chunk), checksum)
+
+        for index in (3, 1, 0):
+            assert send(index)[0], f"写入第{index}块失败"
+        assert not send(2, '0' * 64)[0], "校验失败的分块被接受"
+        assert not store.finalize(upload_id, 'session-A')[0], "分块不完整时完成了上传"
+        assert send(2)[0], "重传第2块失败"
+
+        assert not store.finalize(upload_id, 'session-B')[0], "其他会话完成了上传"
+        success, upload, error = store.finalize(upload_id, 'session-A')
+        assert success, f"完成上传失败: {error}"
+        assert store.take([upload_id], 'session-A', 'decrypt') == [], "取出了用途不符的上传"
+        files = store.take([upload_id], 'session-A', 'encrypt')
+        assert len(files) == 1 and files[0]['size'] == len(data), f"取出的上传不符: {files}"
+        with open(files[0]['filepath'], 'rb') as f:
+            assert f.read() == data, "上传文件内容不一致"
+        assert store.take([upload_id], 'session-A', 'encrypt') == [], "上传被取出两次"
+        print("✅ 乱序分块上传完成并取出一次")
+    finally:
+        Config.UPLOAD_FOLDER, Config.UPLOAD_CHUNK_SIZE = original_upload_folder, original_chunk_size
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return True
+
+def test_raw_round_output_name():
+    """测试无容器的单轮（gzip / xz / deflate）加密不会生成与原文件同名的结果"""
+    print("\n🔍 测试加密结果文件名...")
+
+    import shutil
+    import tempfile
+    from utils.encryption_engine import EncryptionEngine
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        engine = EncryptionEngine()
+        # 候选后缀名中只有 .pdf 不会还原出原文件名
+        engine.extension_pool = ['.txt', '.pdf']
+        for algorithm in ('gzip', 'xz', 'deflate'):
+            source = os.path.join(work_dir, 'report.txt')
+            with open(source, 'wb') as f:
+                f.write(os.urandom(4096))
+            success, final_file, _, error = engine.multi_round_encrypt(
+                source, 1, plan={'algorithms': [algorithm]}, pipeline='disk')
+            assert success, f"{algorithm} 加密失败: {error}"
+            assert final_file == os.path.join(work_dir, 'report.pdf'), f"{algorithm} 结果文件名不符: {final_file}"
+            os.remove(final_file)
+            os.remove(source)
+        print("✅ 加密结果不会覆盖原文件名")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return True
+
 def main():
     """主测试函数"""
     print("🚀 开始部署测试...\n")
@@ -111,7 +518,17 @@ def main():
         test_imports,
         test_config, 
         test_directories,
-        test_dependencies
+        test_dependencies,
+        test_zip64_layer,
+        test_artifact_owner,
+        test_stream_scratch_estimate,
+        test_janitor_keep,
+        test_job_queue_secrets,
+        test_job_owner,
+        test_binary_password_book,
+        test_stream_decrypt_disk_book,
+        test_chunked_upload,
+        test_raw_round_output_name
     ]
     
     results = []
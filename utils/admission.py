@@ -0,0 +1,99 @@
+import os
+import shutil
+import logging
+from config import Config
+from utils.round_planner import RoundPlanner
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 容器头、目录项等额外开销：每轮按输入大小的比例加固定字节估算
+_SCRATCH_RATIO = 1.01
+_SCRATCH_SLACK = 64 * 1024
+
+
+def scratch_copies(pipeline, rounds, decrypt_algorithms=None):
+    """处理过程中同时存在于磁盘上的数据副本数（不含上传的输入文件）
+
+    磁盘模式每轮的中间文件在全部轮次完成后才清理；内存模式的缓冲区超过阈值时会溢出到磁盘，
+    最多同时存在输入、输出两个缓冲区。
+
+    流式模式加密时，输入大小未知的 tar 层（上一层为压缩输出）先将整层数据写入溢出缓冲区，关闭时再转写到外层；
+    同一时刻最多存在正在转写的缓冲区及其目标（外层的缓冲区或最终文件）两份数据，多于一轮时按两份估算。
+    流式模式解密时，除最外层以外的 zip 层需要先将上游数据缓冲为可寻址的文件，缓冲区保留到解密结束；
+    decrypt_algorithms 为解密文件各轮的算法（第一轮在前），每个这样的 zip 层加一份。
+    """
+    if pipeline == 'disk':
+        return rounds + 1
+    if pipeline == 'memory':
+        return 2
+    if decrypt_algorithms is not None:
+        return 1 + sum(1 for algorithm in decrypt_algorithms[:-1] if algorithm == 'zip')
+    return 2 if rounds > 1 else 1
+
+
+def scratch_bytes(file_size, rounds, pipeline, decrypt_algorithms=None):
+    """估算单个文件处理时的峰值临时磁盘占用（字节），decrypt_algorithms 见 scratch_copies"""
+    copies = scratch_copies(pipeline, rounds, decrypt_algorithms)
+    return int(file_size * _SCRATCH_RATIO * copies) + _SCRATCH_SLACK * max(rounds, 1)
+
+
+def estimate_encrypt_job(files, rounds, profile=None):
+    """估算加密任务的峰值临时磁盘占用和 CPU 耗时，files 为上传文件信息列表
+
+    批处理中的文件可能同时处理，磁盘占用按所有文件之和估算。
+    """
+    planner = RoundPlanner()
+    estimate = {'scratch_bytes': 0, 'cpu_seconds': 0.0}
+    for file_info in files:
+        size = file_info.get('size') or 0
+        estimate['scratch_bytes'] += scratch_bytes(size, rounds, Config.ENCRYPT_PIPELINE)
+        estimate['cpu_seconds'] += planner.estimate_encrypt_seconds(size, rounds, profile=profile)
+    return estimate
+
+
+def estimate_decrypt_job(jobs):
+    """估算解密任务的峰值临时磁盘占用和 CPU 耗时，jobs 为 [位置, 文件信息, PasswordBook] 列表"""
+    planner = RoundPlanner()
+    estimate = {'scratch_bytes': 0, 'cpu_seconds': 0.0}
+    for _, file_info, password_book in jobs:
+        try:
+            size = os.path.getsize(file_info['filepath'])
+        except OSError:
+            continue
+        variants = [(entry.algorithm, entry.compresslevel) for entry in password_book.rounds]
+        # 缓冲的是解压后的数据，按加密文件和原文件中较大的一个估算
+        scratch_size = max(size, password_book.metadata.get('original_size') or 0)
+        estimate['scratch_bytes'] += scratch_bytes(scratch_size, password_book.total_rounds, Config.DECRYPT_PIPELINE,
+                                                   [algorithm for algorithm, _ in variants])
+        estimate['cpu_seconds'] += planner.estimate_decrypt_seconds(size, variants)
+    return estimate
+
+
+def scratch_budget():
+    """当前可用于任务的磁盘空间（字节）：上传目录所在磁盘的剩余空间减去保留空间"""
+    return shutil.disk_usage(Config.UPLOAD_FOLDER).free - Config.DISK_RESERVE_BYTES
+
+
+def check_admission(job_queue, estimate):
+    """判断是否接受新任务，返回 (是否接受, 拒绝原因)
+
+    已排队和执行中任务预留的磁盘空间也计入占用；执行并发数已满时任务会排队，
+    由工作进程在有空闲名额和足够磁盘空间时领取。
+    """
+    load = job_queue.load()
+
+    if load['queued'] >= Config.JOB_MAX_QUEUED:
+        return False, f"排队任务过多（{load['queued']}个），请稍后再试"
+
+    available = scratch_budget() - load['scratch_bytes']
+    if estimate['scratch_bytes'] > available:
+        logger.warning(f"磁盘空间不足，拒绝任务: 需要{estimate['scratch_bytes']}字节, 可用{available}字节")
+        return False, (f"服务器磁盘空间不足（需要约 {estimate['scratch_bytes'] / 1024 / 1024:.0f}MB 临时空间），"
+                       f"请减少文件数量或稍后再试")
+
+    backlog = (load['cpu_seconds'] + estimate['cpu_seconds']) / max(Config.JOB_MAX_RUNNING, 1)
+    if load['queued'] + load['running'] and backlog > Config.JOB_MAX_BACKLOG_SECONDS:
+        return False, f"服务器繁忙（预计需等待约 {backlog:.0f} 秒），请稍后再试"
+
+    return True, None
@@ -0,0 +1,131 @@
+import os
+import time
+import uuid
+import sqlite3
+import logging
+from contextlib import contextmanager
+from config import Config
+from utils.hashing import default_hash_spec, hash_file, hash_cache
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 产物类型
+ARTIFACT_ENCRYPTED = 'encrypted'
+ARTIFACT_DECRYPTED = 'decrypted'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS artifacts (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    owner TEXT,
+    filepath TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    hash_algorithm TEXT NOT NULL,
+    hash_chunk_size INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_filename ON artifacts (filename, created_at);
+CREATE INDEX IF NOT EXISTS idx_artifacts_created ON artifacts (created_at);
+'''
+
+
+class ArtifactRegistry:
+    """加密 / 解密产物登记表：记录每个生成文件的路径、大小、内容哈希和所属会话
+
+    产物以稳定的 ID 下载，按 ID（或文件名索引）直接定位文件，不需要遍历上传目录。
+    文件被清理或被同名的新文件覆盖（大小不一致）后，登记记录视为失效。
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or Config.ARTIFACT_DB_PATH
+        self._last_purge = 0
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def register(self, kind, filepath, owner=None, hash_spec=None):
+        """登记生成的文件，返回产物 ID
+
+        内容哈希优先取自哈希缓存（加密 / 解密时写出文件的同时已计算），缓存未命中时才读取文件。
+        """
+        hash_spec = tuple(hash_spec or default_hash_spec())
+        digest = hash_cache.get(filepath, hash_spec)
+        if digest is None:
+            digest = hash_file(filepath, hash_spec)
+            hash_cache.put(filepath, hash_spec, digest)
+
+        artifact_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO artifacts (id, kind, owner, filepath, filename, size, hash, hash_algorithm, '
+                'hash_chunk_size, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (artifact_id, kind, owner, filepath, os.path.basename(filepath), os.path.getsize(filepath),
+                 digest, hash_spec[0], hash_spec[1], now)
+            )
+        logger.debug(f"登记产物: {artifact_id} ({kind}, {filepath})")
+
+        if now - self._last_purge > Config.JOB_PURGE_INTERVAL:
+            self.purge()
+        return artifact_id
+
+    def get(self, artifact_id):
+        """按 ID 获取仍然有效的产物记录，不存在或文件已失效时返回 None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM artifacts WHERE id = ?', (artifact_id,)).fetchone()
+        return self._valid(row)
+
+    def find(self, filename):
+        """按文件名获取最近登记的产物记录（不区分类型，兼容按文件名下载的旧链接），最近的记录已失效时返回 None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT * FROM artifacts WHERE filename = ? ORDER BY created_at DESC LIMIT 1', (filename,)
+            ).fetchone()
+        return self._valid(row)
+
+    def paths(self, max_age=None):
+        """登记时间在 max_age 秒内的产物文件路径（任务结果仍可下载，后台清理时保留）"""
+        max_age = max_age if max_age is not None else Config.JOB_RETENTION
+        with self._connect() as conn:
+            rows = conn.execute('SELECT filepath FROM artifacts WHERE created_at >= ?',
+                                (time.time() - max_age,)).fetchall()
+        return [row['filepath'] for row in rows]
+
+    def relocate(self, old_path, new_path):
+        """文件被移动（如迁移到分片目录）后更新登记的路径，返回更新的记录数"""
+        with self._connect() as conn:
+            return conn.execute('UPDATE artifacts SET filepath = ? WHERE filepath = ?', (new_path, old_path)).rowcount
+
+    def _valid(self, row):
+        """文件仍存在且大小与登记时一致时返回记录"""
+        if row is None:
+            return None
+        try:
+            if os.stat(row['filepath']).st_size != row['size']:
+                return None
+        except OSError:
+            return None
+        return dict(row)
+
+    def purge(self, max_age=None):
+        """删除超过 max_age 秒的登记记录（产物所在的任务结果也已过期）"""
+        max_age = max_age if max_age is not None else Config.JOB_RETENTION
+        self._last_purge = time.time()
+        with self._connect() as conn:
+            deleted = conn.execute('DELETE FROM artifacts WHERE created_at < ?', (time.time() - max_age,)).rowcount
+        if deleted:
+            logger.info(f"清理过期的产物记录: {deleted}条")
+        return deleted
@@ -0,0 +1,283 @@
+import os
+import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from config import Config
+from utils.file_processor import FileProcessor
+from utils.encryption_engine import EncryptionEngine
+from utils.password_book import PasswordBookManager
+from utils.password_book_model import PasswordBook, PasswordBookError
+from utils.artifacts import ArtifactRegistry, ARTIFACT_ENCRYPTED, ARTIFACT_DECRYPTED
+from utils.hashing import hash_spec_from_metadata
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 每个进程各自持有的组件与工作池（进程池模式下子进程会重新创建）
+_components = {}
+_executors = {}
+
+
+def _get_components():
+    """获取当前进程的加密引擎和密码本管理器"""
+    if not _components:
+        _components['engine'] = EncryptionEngine()
+        _components['manager'] = PasswordBookManager()
+        _components['file_processor'] = FileProcessor()
+        _components['artifacts'] = ArtifactRegistry()
+    return _components['engine'], _components['manager']
+
+
+def _cleanup_uploads(file_paths):
+    """清理任务的上传文件（空列表时 cleanup_temp_files 会清空整个上传目录，需跳过）"""
+    if file_paths:
+        _get_components()
+        _components['file_processor'].cleanup_temp_files(file_paths)
+
+
+def _register_artifact(result, kind, path_key, owner, hash_spec=None):
+    """登记成功结果中生成的文件，产物 ID 记入结果的 artifact_id
+
+    加密 / 解密文件只能通过登记表下载，登记失败时结果标记为失败。
+    """
+    if not result.get('success'):
+        return
+    _get_components()
+    try:
+        result['artifact_id'] = _components['artifacts'].register(kind, result[path_key], owner, hash_spec)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"登记产物失败: {result[path_key]} - {str(e)}")
+        result.update(success=False, error=f"登记生成的文件失败: {str(e)}")
+
+
+def _job_batch_mode():
+    """任务工作进程是守护进程，不能再创建子进程，进程池模式改用线程池"""
+    return 'thread' if Config.BATCH_EXECUTOR == 'process' else None
+
+
+def _get_executor(mode, workers):
+    """获取（并复用）指定类型的工作池"""
+    key = (mode, workers)
+    if key not in _executors:
+        if mode == 'process':
+            _executors[key] = ProcessPoolExecutor(max_workers=workers)
+        else:
+            _executors[key] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch')
+    return _executors[key]
+
+
+def run_jobs(func, jobs, on_error, mode=None, workers=None):
+    """在工作池中并发执行任务，按输入顺序返回结果
+
+    jobs 为参数元组列表；单个任务失败时调用 on_error(参数, 异常) 生成该任务的结果，
+    不影响其他任务。
+    """
+    if mode is None:
+        mode = Config.BATCH_EXECUTOR
+    if workers is None:
+        workers = Config.BATCH_WORKERS or os.cpu_count() or 1
+
+    if mode == 'serial' or len(jobs) <= 1 or workers <= 1:
+        results = []
+        for args in jobs:
+            try:
+                results.append(func(*args))
+            except Exception as e:
+                results.append(on_error(args, e))
+        return results
+
+    executor = _get_executor(mode, workers)
+    futures = [executor.submit(func, *args) for args in jobs]
+    logger.debug(f"提交{len(futures)}个任务到{mode}工作池，并发数: {workers}")
+
+    results = []
+    for args, future in zip(jobs, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.error(f"任务执行异常: {str(e)}")
+            results.append(on_error(args, e))
+    return results
+
+
+def _file_progress(progress, file_info, file_index, file_count):
+    """为进度事件附加文件信息，progress 为 None 时不上报"""
+    if progress is None:
+        return None
+
+    def report(event):
+        progress(dict(event, file=file_info['original_name'], file_index=file_index, file_count=file_count))
+    return report
+
+
+def encrypt_file_job(file_info, rounds, encrypt_password_book=False, password='', profile=None, progress=None):
+    """加密单个文件并生成、加密、保存密码本
+
+    返回 (结果, 会话密码本记录)，失败时会话密码本记录为 None。
+    """
+    encryption_engine, password_book_manager = _get_components()
+
+    # 执行前生成轮次计划
+    try:
+        plan = encryption_engine.plan_file_rounds(file_info['filepath'], rounds, profile=profile)
+    except (OSError, ValueError) as e:
+        return encrypt_error_result(file_info, f'读取文件失败: {str(e)}'), None
+
+    # 执行加密
+    success, encrypted_file, password_book, error = encryption_engine.multi_round_encrypt(
+        file_info['filepath'],
+        rounds,
+        original_filename=file_info['original_name'],
+        plan=plan,
+        progress=progress
+    )
+    if not success:
+        return encrypt_error_result(file_info, error), None
+
+    # 生成密码本
+    success_pb, password_book_data, book_id = password_book_manager.generate_password_book(password_book)
+    if not success_pb:
+        return encrypt_error_result(file_info, f'生成密码本失败: {book_id}'), None
+
+    # 加密密码本（如果需要）；加密后没有明文元数据，文件名需在加密前生成
+    pb_filename = password_book_manager.book_filename(password_book_data)
+    if encrypt_password_book and password:
+        success_enc, encrypted_pb, error_enc = password_book_manager.encrypt_password_book(
+            password_book_data, password
+        )
+        if success_enc:
+            password_book_data = encrypted_pb
+
+    # 保存密码本
+    success_save, pb_filepath, pb_filename = password_book_manager.save_password_book(password_book_data, pb_filename)
+    if not success_save:
+        return encrypt_error_result(file_info, f'保存密码本失败: {pb_filename}'), None
+
+    result = {
+        'original_file': file_info['original_name'],
+        'encrypted_file': os.path.basename(encrypted_file),
+        'encrypted_filepath': encrypted_file,
+        'password_book': pb_filename,
+        'password_bookpath': pb_filepath,
+        'rounds': rounds,
+        'predicted_seconds': plan['predicted_seconds'],
+        'success': True
+    }
+    session_entry = {
+        'filename': pb_filename,
+        'filepath': pb_filepath,
+        'original_file': file_info['original_name']
+    }
+    return result, session_entry
+
+
+def encrypt_error_result(file_info, error):
+    """生成加密失败的结果"""
+    return {
+        'original_file': file_info['original_name'],
+        'success': False,
+        'error': str(error)
+    }
+
+
+def decrypt_file_job(file_info, password_book, progress=None):
+    """使用匹配到的密码本解密单个文件；任务载荷中的密码本为 JSON 格式，在此构建 PasswordBook"""
+    encryption_engine, _ = _get_components()
+
+    if not isinstance(password_book, PasswordBook):
+        try:
+            password_book = PasswordBook.from_dict(password_book)
+        except PasswordBookError as e:
+            return decrypt_error_result(file_info, f"密码本格式无效: {str(e)}")
+
+    # 检查加密文件是否存在
+    if not os.path.exists(file_info['filepath']):
+        return decrypt_error_result(file_info, f"解密过程异常: 加密文件不存在: {file_info['filepath']}")
+
+    # 执行解密
+    success, decrypted_file, error = encryption_engine.multi_round_decrypt(
+        file_info['filepath'], password_book, progress=progress
+    )
+    if not success:
+        logger.error(f"解密失败: {file_info['original_name']} - {error}")
+        return decrypt_error_result(file_info, error)
+
+    # 检查解密后的文件是否存在
+    if not os.path.exists(decrypted_file):
+        return decrypt_error_result(file_info, f"解密过程异常: 解密后的文件不存在: {decrypted_file}")
+
+    logger.info(f"解密成功: {file_info['original_name']}")
+    return {
+        'encrypted_file': file_info['original_name'],
+        'decrypted_file': os.path.basename(decrypted_file),
+        'decrypted_filepath': decrypted_file,
+        'original_filename': password_book.original_filename,
+        'success': True
+    }
+
+
+def decrypt_error_result(file_info, error):
+    """生成解密失败的结果"""
+    return {
+        'encrypted_file': file_info['original_name'],
+        'success': False,
+        'error': str(error)
+    }
+
+
+def run_encrypt_batch(payload, progress=None):
+    """执行加密任务：并发加密任务中的每个文件，完成后清理上传的原始文件
+
+    progress 为可选的进度回调，事件中附带文件名及其在任务中的序号。
+    生成的加密文件登记到产物登记表（所属会话为 payload['owner']），结果中附带产物 ID。
+    返回 {'results': 按上传顺序的结果, 'session_entries': 会话密码本记录}。
+    """
+    files = payload['files']
+    jobs = [(file_info, payload['rounds'], payload.get('encrypt_password_book', False),
+             payload.get('password', ''), payload.get('profile'),
+             _file_progress(progress, file_info, index, len(files)))
+            for index, file_info in enumerate(files)]
+    try:
+        outcomes = run_jobs(encrypt_file_job, jobs,
+                            on_error=lambda args, e: (encrypt_error_result(args[0], e), None),
+                            mode=_job_batch_mode())
+    finally:
+        _cleanup_uploads([file_info['filepath'] for file_info in payload['files']])
+
+    for result, _ in outcomes:
+        _register_artifact(result, ARTIFACT_ENCRYPTED, 'encrypted_filepath', payload.get('owner'))
+
+    return {
+        'results': [result for result, _ in outcomes],
+        'session_entries': [entry for _, entry in outcomes if entry]
+    }
+
+
+def run_decrypt_batch(payload, progress=None):
+    """执行解密任务：payload['results'] 中已有匹配失败的结果，其余位置由解密结果填入
+
+    payload['jobs'] 为 [位置, 文件信息, JSON 格式的密码本] 列表，完成后清理 payload['cleanup'] 中的上传文件。
+    progress 为可选的进度回调，事件中附带文件名及其在任务中的位置。
+    """
+    results = list(payload['results'])
+    jobs = [(file_info, password_book, _file_progress(progress, file_info, position, len(results)))
+            for position, file_info, password_book in payload['jobs']]
+    try:
+        outcomes = run_jobs(decrypt_file_job, jobs,
+                            on_error=lambda args, e: decrypt_error_result(args[0], f'解密过程异常: {str(e)}'),
+                            mode=_job_batch_mode())
+    finally:
+        _cleanup_uploads(payload.get('cleanup', []))
+
+    for (position, _, password_book), result in zip(payload['jobs'], outcomes):
+        _register_artifact(result, ARTIFACT_DECRYPTED, 'decrypted_filepath', payload.get('owner'),
+                           hash_spec_from_metadata(password_book['metadata']))
+        results[position] = result
+    return {'results': results}
+
+
+# 任务类型对应的处理函数，由任务工作进程调用
+JOB_HANDLERS = {
+    'encrypt': run_encrypt_batch,
+    'decrypt': run_decrypt_batch
+}
@@ -0,0 +1,252 @@
+import os
+import time
+import uuid
+import hashlib
+import sqlite3
+import logging
+from contextlib import contextmanager
+from config import Config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 上传状态
+UPLOAD_ACTIVE = 'active'
+UPLOAD_COMPLETE = 'complete'
+
+# 上传用途，加密上传的文件按文件名校验类型
+UPLOAD_PURPOSES = ('encrypt', 'decrypt')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS uploads (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    purpose TEXT NOT NULL,
+    original_name TEXT NOT NULL,
+    filepath TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS upload_chunks (
+    upload_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    checksum TEXT NOT NULL,
+    PRIMARY KEY (upload_id, idx)
+);
+'''
+
+
+class ChunkedUploadStore:
+    """可续传的分块上传：创建上传、按偏移写入分块、完成后交给加密 / 解密流程使用
+
+    创建时在上传目录中预分配 .part 文件，各分块直接写入其偏移位置，可以并行、乱序上传；
+    已接收的分块记录在 SQLite 中，多个 web 进程共享，中断后客户端查询已接收的分块继续上传。
+    """
+
+    def __init__(self, file_processor=None, db_path=None):
+        self.file_processor = file_processor
+        self.db_path = db_path or Config.UPLOAD_DB_PATH
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _describe(self, conn, row):
+        """上传记录及已接收的分块序号，返回给客户端"""
+        received = [r['idx'] for r in conn.execute(
+            'SELECT idx FROM upload_chunks WHERE upload_id = ? ORDER BY idx', (row['id'],)
+        )]
+        return {
+            'upload_id': row['id'],
+            'filename': row['original_name'],
+            'purpose': row['purpose'],
+            'size': row['size'],
+            'chunk_size': row['chunk_size'],
+            'chunk_count': -(-row['size'] // row['chunk_size']),
+            'status': row['status'],
+            'received': received
+        }
+
+    def _load(self, conn, upload_id, owner):
+        return conn.execute('SELECT * FROM uploads WHERE id = ? AND owner = ?', (upload_id, owner)).fetchone()
+
+    def create(self, owner, original_name, size, purpose='encrypt'):
+        """创建上传并预分配文件，返回 (是否成功, 上传信息, 错误信息)"""
+        from utils.admission import scratch_budget
+
+        if purpose not in UPLOAD_PURPOSES:
+            return False, None, f"不支持的上传用途: {purpose}"
+        if not original_name:
+            return False, None, "文件名不能为空"
+        if purpose == 'encrypt':
+            is_valid, message = self.file_processor.validate_file(original_name)
+            if not is_valid:
+                return False, None, message
+        if not isinstance(size, int) or size <= 0:
+            return False, None, "文件大小无效"
+        if size > Config.CHUNKED_UPLOAD_MAX_SIZE:
+            return False, None, f"文件过大，最大支持 {Config.CHUNKED_UPLOAD_MAX_SIZE // 1024 // 1024}MB"
+        if size > scratch_budget():
+            return False, None, "服务器磁盘空间不足"
+
+        self.purge()
+        upload_id = uuid.uuid4().hex
+        filepath = self.file_processor.upload_path(original_name)
+        try:
+            with open(filepath + '.part', 'wb') as f:
+                try:
+                    os.posix_fallocate(f.fileno(), 0, size)
+                except (AttributeError, OSError):
+                    # 不支持预分配的系统或文件系统，扩展为稀疏文件
+                    f.truncate(size)
+        except OSError as e:
+            logger.error(f"创建上传文件失败: {filepath} - {str(e)}")
+            return False, None, f"创建上传文件失败: {str(e)}"
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO uploads (id, owner, purpose, original_name, filepath, size, chunk_size, status, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (upload_id, owner, purpose, original_name, filepath, size, Config.UPLOAD_CHUNK_SIZE,
+                 UPLOAD_ACTIVE, now, now)
+            )
+            upload = self._describe(conn, self._load(conn, upload_id, owner))
+        logger.debug(f"创建分块上传: {upload_id} ({original_name}, {size}字节)")
+        return True, upload, None
+
+    def get(self, upload_id, owner):
+        """获取上传信息，不存在或不属于该会话时返回 None"""
+        with self._connect() as conn:
+            row = self._load(conn, upload_id, owner)
+            return self._describe(conn, row) if row else None
+
+    def write_chunk(self, upload_id, owner, offset, stream, length, checksum=None):
+        """将分块写入其偏移位置，返回 (是否成功, 分块信息, 错误信息)
+
+        分块必须按 chunk_size 对齐，除最后一块外大小等于 chunk_size；
+        提供 checksum（SHA-256）时校验写入的数据，不一致的分块不计入已接收。
+        数据不完整或校验失败时分块信息不为 None，客户端可以重传该分块。
+        """
+        with self._connect() as conn:
+            row = self._load(conn, upload_id, owner)
+        if row is None:
+            return False, None, "上传不存在或已过期"
+        if row['status'] != UPLOAD_ACTIVE:
+            return False, None, "上传已完成"
+        chunk_size = row['chunk_size']
+        if offset is None or offset < 0 or offset >= row['size'] or offset % chunk_size:
+            return False, None, f"分块偏移无效: {offset}"
+        expected = min(chunk_size, row['size'] - offset)
+        if length != expected:
+            return False, None, f"分块大小无效: {length}，应为 {expected}"
+
+        hasher = hashlib.sha256()
+        written = 0
+        try:
+            with open(row['filepath'] + '.part', 'r+b') as f:
+                f.seek(offset)
+                while written < expected:
+                    data = stream.read(min(Config.STREAM_CHUNK_SIZE, expected - written))
+                    if not data:
+                        break
+                    hasher.update(data)
+                    f.write(data)
+                    written += len(data)
+        except OSError as e:
+            logger.error(f"写入分块失败: {upload_id}@{offset} - {str(e)}")
+            return False, None, f"写入分块失败: {str(e)}"
+
+        index = offset // chunk_size
+        digest = hasher.hexdigest()
+        if written != expected:
+            return False, {'index': index, 'checksum': digest}, f"分块数据不完整: {written}/{expected}"
+        if checksum and checksum.lower() != digest:
+            logger.warning(f"分块校验失败: {upload_id}@{offset}")
+            return False, {'index': index, 'checksum': digest}, "分块校验失败"
+
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO upload_chunks (upload_id, idx, checksum) VALUES (?, ?, ?)',
+                         (upload_id, index, digest))
+            conn.execute('UPDATE uploads SET updated_at = ? WHERE id = ?', (time.time(), upload_id))
+        return True, {'index': index, 'checksum': digest}, None
+
+    def finalize(self, upload_id, owner):
+        """所有分块都已接收时完成上传，返回 (是否成功, 上传信息, 错误信息)"""
+        with self._connect() as conn:
+            row = self._load(conn, upload_id, owner)
+            if row is None:
+                return False, None, "上传不存在或已过期"
+            upload = self._describe(conn, row)
+            if row['status'] == UPLOAD_COMPLETE:
+                return True, upload, None
+
+            missing = upload['chunk_count'] - len(upload['received'])
+            if missing:
+                return False, upload, f"还有 {missing} 个分块未上传"
+            try:
+                os.replace(row['filepath'] + '.part', row['filepath'])
+            except OSError as e:
+                return False, upload, f"完成上传失败: {str(e)}"
+            conn.execute('UPDATE uploads SET status = ?, updated_at = ? WHERE id = ?',
+                         (UPLOAD_COMPLETE, time.time(), upload_id))
+            upload['status'] = UPLOAD_COMPLETE
+        logger.debug(f"分块上传完成: {upload_id} ({row['original_name']})")
+        return True, upload, None
+
+    def take(self, upload_ids, owner, purpose):
+        """取出已完成的上传交给加密 / 解密流程，返回上传文件信息列表（与表单上传的格式相同）
+
+        取出后删除上传记录，每个上传只能使用一次。
+        """
+        files = []
+        with self._connect() as conn:
+            for upload_id in upload_ids:
+                row = self._load(conn, upload_id, owner)
+                if row is None or row['status'] != UPLOAD_COMPLETE or row['purpose'] != purpose:
+                    continue
+                conn.execute('DELETE FROM upload_chunks WHERE upload_id = ?', (upload_id,))
+                conn.execute('DELETE FROM uploads WHERE id = ?', (upload_id,))
+                if not os.path.exists(row['filepath']):
+                    continue
+                files.append({
+                    'filepath': row['filepath'],
+                    'filename': os.path.basename(row['filepath']),
+                    'original_name': row['original_name'],
+                    'size': row['size']
+                })
+        return files
+
+    def paths(self, max_age=None):
+        """未过期的上传记录对应的文件路径（未完成的上传为 .part 文件），后台清理时保留"""
+        max_age = max_age if max_age is not None else Config.TEMP_FILE_CLEANUP_TIME
+        with self._connect() as conn:
+            rows = conn.execute('SELECT filepath, status FROM uploads WHERE updated_at >= ?',
+                                (time.time() - max_age,)).fetchall()
+        return [row['filepath'] + '.part' if row['status'] == UPLOAD_ACTIVE else row['filepath'] for row in rows]
+
+    def purge(self, max_age=None):
+        """删除超过 max_age 秒未更新的上传记录及其未完成的文件"""
+        max_age = max_age if max_age is not None else Config.TEMP_FILE_CLEANUP_TIME
+        with self._connect() as conn:
+            rows = conn.execute('SELECT id, filepath, status FROM uploads WHERE updated_at < ?',
+                                (time.time() - max_age,)).fetchall()
+            for row in rows:
+                part = row['filepath'] + '.part'
+                if row['status'] == UPLOAD_ACTIVE and os.path.exists(part):
+                    os.remove(part)
+                conn.execute('DELETE FROM upload_chunks WHERE upload_id = ?', (row['id'],))
+                conn.execute('DELETE FROM uploads WHERE id = ?', (row['id'],))
+        return len(rows)
@@ -3,8 +3,17 @@ import random
 import hashlib
 import shutil
 import logging
+import tempfile
 from datetime import datetime
 from utils.file_processor import FileProcessor
+from utils.round_planner import RoundPlanner
+from utils.entropy import sample_file_entropy
+from utils.progress import ProgressReporter, ProgressReader
+from utils.stream_layers import open_layer_writer, open_layer_reader, layer_output_size, copy_into
+from utils.hashing import (HashingReader, HashingWriter, hash_cache, new_hasher, hash_file,
+                           default_hash_spec, hash_spec_from_metadata, record_hash_spec)
+from utils.storage_layout import shard_path
+from utils.password_book_model import PasswordBook, RoundEntry
 from config import Config
 
 
@@ -15,6 +24,7 @@ logger = logging.getLogger(__name__)
 class EncryptionEngine:
     def __init__(self):
         self.file_processor = FileProcessor()
+        self.round_planner = RoundPlanner()
         self.compression_algorithms = Config.COMPRESSION_ALGORITHMS
         self.extension_pool = Config.EXTENSION_POOL
 
@@ -32,21 +42,86 @@ class EncryptionEngine:
             logger.debug(f"使用手动设置轮数: {rounds}")
             return rounds
 
-    def multi_round_encrypt(self, file_path, rounds, algorithms=None, original_filename=None):
-        """多轮加密主函数"""
+    def plan_rounds(self, file_size, rounds, algorithms=None, entropy=None, profile=None):
+        """在执行前生成轮次计划（每轮算法和压缩级别）及预计耗时"""
+        return self.round_planner.plan(file_size, rounds, algorithms or self.compression_algorithms, entropy,
+                                       profile)
+
+    def plan_file_rounds(self, file_path, rounds, algorithms=None, profile=None):
+        """按文件大小和抽样熵生成轮次计划"""
+        entropy = sample_file_entropy(file_path) if Config.STORE_MODE_ENABLED else None
+        return self.plan_rounds(os.path.getsize(file_path), rounds, algorithms, entropy, profile)
+
+    def get_algorithm_stats(self, profile=None):
+        """获取各算法实测的压缩 / 解压吞吐量"""
+        return self.round_planner.algorithm_stats(self.compression_algorithms, profile)
+
+    def get_compression_profiles(self):
+        """获取可选的压缩级别方案"""
+        return list(Config.COMPRESSION_PROFILES)
+
+    def _plan_round(self, plan, round_num):
+        """读取计划中某一轮的 (算法, 压缩级别, 是否存储模式)"""
+        index = round_num - 1
+        levels = plan.get('levels') or [None] * len(plan['algorithms'])
+        stored = plan.get('stored') or [False] * len(plan['algorithms'])
+        return plan['algorithms'][index], levels[index], stored[index]
+
+    def _pick_extension(self, compressed_file, original_file):
+        """随机选择后缀名，避开与原文件同名的结果（原文件在加密后会被清理）"""
+        base_name = os.path.splitext(compressed_file)[0]
+        candidates = [ext for ext in self.extension_pool if base_name + ext != original_file]
+        return random.choice(candidates or self.extension_pool)
+
+    def _round_entry(self, new_extension, algorithm, level, stored, compressed_file, encrypted_file):
+        """生成密码本中的一轮记录"""
+        return RoundEntry(new_extension, algorithm, stored, level, os.path.basename(compressed_file),
+                          os.path.basename(encrypted_file))
+
+    def multi_round_encrypt(self, file_path, rounds, algorithms=None, original_filename=None, pipeline=None,
+                            plan=None, profile=None, progress=None):
+        """多轮加密主函数，返回 (是否成功, 最终文件, PasswordBook, 错误信息)
+
+        progress 为可选的回调，接收 ProgressReporter 生成的进度事件。
+        """
         if algorithms is None:
             algorithms = self.compression_algorithms
+        if pipeline is None:
+            pipeline = Config.ENCRYPT_PIPELINE
+
+        # 未传入计划时按文件大小和时间预算生成
+        try:
+            if plan is None:
+                plan = self.plan_file_rounds(file_path, rounds, algorithms, profile)
+            if len(plan['algorithms']) != rounds:
+                raise Exception(f"轮次计划与轮数不一致: {len(plan['algorithms'])} != {rounds}")
+        except Exception as e:
+            logger.error(f"生成轮次计划失败: {file_path} - {str(e)}")
+            return False, None, None, str(e)
+        logger.debug(f"轮次计划: {plan['algorithms']}, 存储模式: {plan.get('stored')}, "
+                     f"预计耗时: {plan.get('predicted_seconds')}秒")
 
         current_file = file_path
-        password_book = {
-            'metadata': {
-                'encryption_time': datetime.now().isoformat(),
-                'total_rounds': rounds,
-                'original_filename': original_filename or os.path.basename(file_path),
-                'original_hash': self._calculate_file_hash(file_path)
-            },
-            'rounds': {}
-        }
+        password_book = PasswordBook({
+            'encryption_time': datetime.now().isoformat(),
+            'total_rounds': rounds,
+            'original_filename': original_filename or os.path.basename(file_path),
+            'original_hash': None,
+            'original_size': os.path.getsize(file_path),
+            'compression_profile': plan.get('profile')
+        })
+        hash_spec = default_hash_spec()
+        record_hash_spec(password_book.metadata, hash_spec)
+
+        reporter = ProgressReporter(progress, 'encrypt', rounds)
+
+        # 流式和内存模式在读取原文件、写出最终文件时顺带计算哈希
+        if pipeline == 'stream':
+            return self._multi_round_encrypt_streaming(file_path, rounds, plan, password_book, reporter)
+        if pipeline == 'memory':
+            return self._multi_round_encrypt_in_memory(file_path, rounds, plan, password_book, reporter)
+
+        password_book.metadata['original_hash'] = self._calculate_file_hash(file_path, hash_spec)
 
         temp_files = []  # 记录中间文件用于清理
         temp_dirs = []  # 记录临时目录用于清理
@@ -56,39 +131,40 @@ class EncryptionEngine:
                 logger.debug(f"第{round_num}轮加密，当前文件: {current_file}")
 
                 # 1. 压缩
-                algorithm = random.choice(algorithms)
-                success, compressed_file, error = self.file_processor.compress_file(current_file, algorithm)
+                algorithm, level, stored = self._plan_round(plan, round_num)
+                round_size = os.path.getsize(current_file)
+                reporter.start_round(round_num, algorithm, round_size)
+                success, compressed_file, error = self.file_processor.compress_file(current_file, algorithm, level)
                 if not success:
                     raise Exception(f"第{round_num}轮压缩失败: {error}")
+                reporter.advance(round_size)
 
                 # 记录中间文件用于清理
                 if current_file != file_path and current_file not in temp_files:
                     temp_files.append(current_file)
 
                 # 2. 修改后缀名
-                new_extension = random.choice(self.extension_pool)
+                new_extension = self._pick_extension(compressed_file, file_path)
                 success, encrypted_file, error = self.file_processor.change_extension(compressed_file, new_extension)
                 if not success:
                     raise Exception(f"第{round_num}轮修改后缀名失败: {error}")
 
                 # 记录到密码本
-                password_book['rounds'][str(round_num)] = {
-                    'extension': new_extension,
-                    'algorithm': algorithm,
-                    'compressed_filename': os.path.basename(compressed_file),
-                    'encrypted_filename': os.path.basename(encrypted_file)
-                }
+                password_book.rounds.append(self._round_entry(
+                    new_extension, algorithm, level, stored, compressed_file, encrypted_file
+                ))
 
                 current_file = encrypted_file
 
             # 记录最终加密文件
             final_file = current_file
-            password_book['metadata']['final_filename'] = os.path.basename(final_file)
-            password_book['metadata']['final_hash'] = self._calculate_file_hash(final_file)
+            password_book.metadata['final_filename'] = os.path.basename(final_file)
+            password_book.metadata['final_hash'] = self._calculate_file_hash(final_file, hash_spec)
 
             # 清理中间文件（保留最终文件）
             self._cleanup_temp_resources(temp_files, temp_dirs)
 
+            reporter.finish()
             logger.info(f"加密完成: {file_path} -> {final_file}, 轮数: {rounds}")
             return True, final_file, password_book, None
 
@@ -98,30 +174,183 @@ class EncryptionEngine:
             logger.error(f"加密失败: {file_path} - {str(e)}")
             return False, None, None, str(e)
 
-    def multi_round_decrypt(self, file_path, password_book):
-        """多轮解密主函数"""
-        if not self._validate_password_book(password_book):
-            return False, None, "密码本格式无效"
+    def _multi_round_encrypt_streaming(self, file_path, rounds, plan, password_book, reporter):
+        """将所有轮次嵌套为层写入器，输入数据一次读取即流经全部轮次"""
+        # 预先确定每轮的算法和后缀名，并按磁盘模式的规则推算文件名
+        layers = []
+        current_file = file_path
+        for round_num in range(1, rounds + 1):
+            algorithm, level, stored = self._plan_round(plan, round_num)
+            compressed_file = os.path.splitext(current_file)[0] + self._get_compressed_extension(algorithm)
+            new_extension = self._pick_extension(compressed_file, file_path)
+            encrypted_file = os.path.splitext(compressed_file)[0] + new_extension
+            layers.append((algorithm, os.path.basename(current_file), level))
+
+            password_book.rounds.append(self._round_entry(
+                new_extension, algorithm, level, stored, compressed_file, encrypted_file
+            ))
+            current_file = encrypted_file
+
+        final_file = current_file
+        temp_output = final_file + '.part'
+        output = None
+
+        try:
+            # 能预先确定输入大小的层（第一轮及未压缩 tar 之后的层）无需缓冲
+            input_sizes = [os.path.getsize(file_path)]
+            for algorithm, arcname, _ in layers[:-1]:
+                input_sizes.append(layer_output_size(algorithm, arcname, input_sizes[-1]))
+
+            hash_spec = hash_spec_from_metadata(password_book.metadata)
+            output = open(temp_output, 'wb')
+            final_writer = HashingWriter(output, new_hasher(hash_spec))
+            writers = []
+            downstream = final_writer
+            for (algorithm, arcname, level), size in reversed(list(zip(layers, input_sizes))):
+                downstream = open_layer_writer(algorithm, downstream, arcname, size, level)
+                writers.append(downstream)
+            writers.reverse()
+
+            # 所有轮次同时进行，按读取原文件的字节数上报进度
+            reporter.start_round(None, [algorithm for algorithm, _, _ in layers], input_sizes[0])
+            with open(file_path, 'rb') as f_in:
+                original_reader = HashingReader(f_in, new_hasher(hash_spec))
+                copy_into(ProgressReader(original_reader, reporter), writers[0])
+
+            # 由内向外依次结束各层，内层的收尾数据会流入外层
+            for writer in writers:
+                writer.close()
+            output.close()
+            output = None
+            os.replace(temp_output, final_file)
+
+            password_book.metadata['original_hash'] = original_reader.hasher.hexdigest()
+            password_book.metadata['final_filename'] = os.path.basename(final_file)
+            password_book.metadata['final_hash'] = final_writer.hasher.hexdigest()
+            hash_cache.put(final_file, hash_spec, final_writer.hasher.hexdigest())
+
+            reporter.finish()
+            logger.info(f"加密完成（流式模式）: {file_path} -> {final_file}, 轮数: {rounds}")
+            return True, final_file, password_book, None
+
+        except Exception as e:
+            if output is not None:
+                output.close()
+            if os.path.exists(temp_output):
+                os.remove(temp_output)
+            logger.error(f"加密失败: {file_path} - {str(e)}")
+            return False, None, None, str(e)
+
+    def _multi_round_encrypt_in_memory(self, file_path, rounds, plan, password_book, reporter):
+        """中间轮次在内存缓冲区中完成，只有最终文件写入磁盘"""
+        # 按磁盘模式的规则推算每轮的文件名，保证压缩包内的文件名与密码本记录一致
+        current_file = file_path
+        current_buffer = None
+        temp_output = None
+
+        try:
+            hash_spec = hash_spec_from_metadata(password_book.metadata)
+            current_buffer = open(file_path, 'rb')
+            original_reader = HashingReader(current_buffer, new_hasher(hash_spec))
+            final_writer = None
+
+            for round_num in range(1, rounds + 1):
+                logger.debug(f"第{round_num}轮加密（内存模式），当前文件: {current_file}")
+
+                algorithm, level, stored = self._plan_round(plan, round_num)
+                compressed_file = os.path.splitext(current_file)[0] + self._get_compressed_extension(algorithm)
+                new_extension = self._pick_extension(compressed_file, file_path)
+                encrypted_file = os.path.splitext(compressed_file)[0] + new_extension
+
+                # 最后一轮直接写入磁盘，其余轮次写入缓冲区（超过阈值时自动溢出到临时文件）
+                if round_num == rounds:
+                    temp_output = encrypted_file + '.part'
+                    output = open(temp_output, 'wb')
+                    final_writer = HashingWriter(output, new_hasher(hash_spec))
+                    destination = final_writer
+                else:
+                    output = tempfile.SpooledTemporaryFile(
+                        max_size=Config.SPOOL_MAX_SIZE, dir=self.file_processor.upload_folder
+                    )
+                    destination = output
+
+                # 第一轮读取原文件时计算原始哈希
+                if round_num == 1:
+                    source = original_reader
+                    size = os.path.getsize(file_path)
+                else:
+                    source = current_buffer
+                    size = current_buffer.seek(0, os.SEEK_END)
+                    current_buffer.seek(0)
+                reporter.start_round(round_num, algorithm, size)
+                success, error = self.file_processor.compress_fileobj(
+                    ProgressReader(source, reporter), os.path.basename(current_file), algorithm, destination, size,
+                    level
+                )
+                current_buffer.close()
+                current_buffer = output
+                if not success:
+                    raise Exception(f"第{round_num}轮压缩失败: {error}")
+
+                password_book.rounds.append(self._round_entry(
+                    new_extension, algorithm, level, stored, compressed_file, encrypted_file
+                ))
+
+                current_file = encrypted_file
+
+            current_buffer.close()
+            current_buffer = None
+            os.replace(temp_output, current_file)
+            temp_output = None
+
+            final_file = current_file
+            password_book.metadata['original_hash'] = original_reader.hasher.hexdigest()
+            password_book.metadata['final_filename'] = os.path.basename(final_file)
+            password_book.metadata['final_hash'] = final_writer.hasher.hexdigest()
+            hash_cache.put(final_file, hash_spec, final_writer.hasher.hexdigest())
+
+            reporter.finish()
+            logger.info(f"加密完成（内存模式）: {file_path} -> {final_file}, 轮数: {rounds}")
+            return True, final_file, password_book, None
+
+        except Exception as e:
+            if current_buffer is not None:
+                current_buffer.close()
+            if temp_output and os.path.exists(temp_output):
+                os.remove(temp_output)
+            logger.error(f"加密失败: {file_path} - {str(e)}")
+            return False, None, None, str(e)
+
+    def multi_round_decrypt(self, file_path, password_book, pipeline=None, progress=None):
+        """多轮解密主函数
+
+        password_book 为 PasswordBook（构建时已校验格式）；progress 为可选的回调，接收 ProgressReporter 生成的进度事件。
+        """
+        reporter = ProgressReporter(progress, 'decrypt', password_book.total_rounds)
+        if pipeline is None:
+            pipeline = Config.DECRYPT_PIPELINE
+        if pipeline == 'stream':
+            return self._multi_round_decrypt_streaming(file_path, password_book, reporter)
 
         current_file = file_path
         temp_files = []  # 记录中间文件用于清理
         temp_dirs = []   # 记录临时目录用于清理
 
         try:
-            total_rounds = password_book['metadata']['total_rounds']
+            total_rounds = password_book.total_rounds
             logger.debug(f"开始解密，总轮数: {total_rounds}, 初始文件: {current_file}")
 
             # 反向解密（从最后一轮到第一轮）
             for round_num in range(total_rounds, 0, -1):
-                round_info = password_book['rounds'][str(round_num)]
-                logger.debug(f"第{round_num}轮解密: {round_info}")
+                round_info = password_book.round(round_num)
+                logger.debug(f"第{round_num}轮解密: {round_info.to_dict()}")
 
                 # 1. 检查当前文件是否存在
                 if not os.path.exists(current_file):
                     raise Exception(f"第{round_num}轮文件不存在: {current_file}")
 
                 # 2. 还原后缀名（从加密后缀名还原为压缩文件后缀名）
-                expected_extension = round_info['extension']
+                expected_extension = round_info.extension
                 current_extension = os.path.splitext(current_file)[1]
 
                 if current_extension != expected_extension:
@@ -136,7 +365,7 @@ class EncryptionEngine:
                         logger.warning(f"第{round_num}轮后缀名不匹配但继续处理: 期望{expected_extension}, 实际{current_extension}")
 
                 # 3. 还原为压缩文件
-                algorithm = round_info['algorithm']
+                algorithm = round_info.algorithm
                 compressed_extension = self._get_compressed_extension(algorithm)
                 
                 # 创建新的压缩文件名
@@ -157,9 +386,12 @@ class EncryptionEngine:
 
                 # 4. 解压文件
                 logger.debug(f"开始解压: {current_file} 使用算法: {algorithm}")
+                round_size = os.path.getsize(current_file)
+                reporter.start_round(round_num, algorithm, round_size)
                 success, extracted_file, error = self.file_processor.extract_file(current_file, algorithm)
                 if not success:
                     raise Exception(f"第{round_num}轮解压失败: {error}")
+                reporter.advance(round_size)
 
                 logger.debug(f"解压成功: {current_file} -> {extracted_file}")
 
@@ -185,7 +417,7 @@ class EncryptionEngine:
             final_filename = os.path.basename(current_file)
             if 'extracted_' in current_file:
                 # 创建目标路径
-                target_path = os.path.join(Config.UPLOAD_FOLDER, final_filename)
+                target_path = shard_path(Config.UPLOAD_FOLDER, final_filename)
                 
                 # 如果目标文件已存在，先删除
                 if os.path.exists(target_path):
@@ -199,7 +431,7 @@ class EncryptionEngine:
                 elif os.path.isdir(current_file):
                     # 如果是目录，将其压缩为zip文件
                     zip_filename = final_filename + '.zip'
-                    zip_path = os.path.join(Config.UPLOAD_FOLDER, zip_filename)
+                    zip_path = shard_path(Config.UPLOAD_FOLDER, zip_filename)
                     
                     # 创建zip文件
                     import zipfile
@@ -215,13 +447,16 @@ class EncryptionEngine:
                     logger.debug(f"将解密目录压缩为: {current_file}")
 
             # 验证原始文件哈希
-            original_hash = password_book['metadata']['original_hash']
+            original_hash = password_book.original_hash
             if original_hash != "unknown":  # 只有计算了哈希时才验证
-                current_hash = self._calculate_file_hash(current_file)
+                current_hash = self._calculate_file_hash(
+                    current_file, hash_spec_from_metadata(password_book.metadata)
+                )
                 if original_hash != current_hash:
                     logger.warning(f"文件哈希不匹配但继续: 期望{original_hash}, 实际{current_hash}")
                     # 不因为哈希不匹配而失败，只记录警告
 
+            reporter.finish()
             logger.info(f"解密完成，最终文件: {current_file}")
             return True, current_file, None
 
@@ -231,6 +466,81 @@ class EncryptionEngine:
             logger.error(f"解密过程异常: {str(e)}")
             return False, None, str(e)
 
+    def _multi_round_decrypt_streaming(self, file_path, password_book, reporter):
+        """逐层在上一层的数据流上打开，只写出最终明文文件"""
+        readers = []
+        temp_output = None
+
+        try:
+            total_rounds = password_book.total_rounds
+            logger.debug(f"开始流式解密，总轮数: {total_rounds}, 初始文件: {file_path}")
+
+            if not os.path.exists(file_path):
+                raise Exception(f"加密文件不存在: {file_path}")
+
+            stream = open(file_path, 'rb')
+            readers.append(stream)
+
+            # 反向打开各层（从最后一轮到第一轮），上一轮加密后的文件名即本层包内的文件名
+            for round_num in range(total_rounds, 0, -1):
+                round_info = password_book.round(round_num)
+                expected_name = None
+                if round_num > 1:
+                    expected_name = password_book.round(round_num - 1).encrypted_filename
+                try:
+                    stream = open_layer_reader(round_info.algorithm, stream, expected_name)
+                except Exception as e:
+                    raise Exception(f"第{round_num}轮解压失败: {str(e)}")
+                readers.append(stream)
+
+            final_filename = os.path.basename(stream.arcname or '') or self._guess_plain_filename(password_book)
+            target_path = shard_path(Config.UPLOAD_FOLDER, final_filename)
+            temp_output = target_path + '.part'
+
+            # 写出明文的同时计算哈希，无需解密后再读取一遍；按写出的明文字节数上报进度
+            hash_spec = hash_spec_from_metadata(password_book.metadata)
+            algorithms = [entry.algorithm for entry in reversed(password_book.rounds)]
+            reporter.start_round(None, algorithms, password_book.metadata.get('original_size'))
+            with open(temp_output, 'wb') as f_out:
+                plain_writer = HashingWriter(f_out, new_hasher(hash_spec))
+                shutil.copyfileobj(ProgressReader(stream, reporter), plain_writer, Config.STREAM_CHUNK_SIZE)
+
+            os.replace(temp_output, target_path)
+            temp_output = None
+            current_hash = plain_writer.hasher.hexdigest()
+            hash_cache.put(target_path, hash_spec, current_hash)
+
+        except Exception as e:
+            if temp_output and os.path.exists(temp_output):
+                os.remove(temp_output)
+            logger.error(f"解密过程异常: {str(e)}")
+            return False, None, str(e)
+
+        finally:
+            for reader in reversed(readers):
+                try:
+                    reader.close()
+                except Exception as e:
+                    logger.warning(f"关闭数据流失败: {str(e)}")
+
+        # 验证原始文件哈希
+        original_hash = password_book.original_hash
+        if original_hash != "unknown":
+            if original_hash != current_hash:
+                logger.warning(f"文件哈希不匹配但继续: 期望{original_hash}, 实际{current_hash}")
+
+        reporter.finish()
+        logger.info(f"解密完成（流式模式），最终文件: {target_path}")
+        return True, target_path, None
+
+    def _guess_plain_filename(self, password_book):
+        """第一轮为 gzip 时包内没有文件名，按第一轮记录的文件名和原始后缀名推算"""
+        original_filename = password_book.original_filename
+        compressed_filename = password_book.round(1).compressed_filename
+        if not compressed_filename:
+            return os.path.basename(original_filename)
+        return os.path.splitext(compressed_filename)[0] + os.path.splitext(original_filename)[1]
+
     def _cleanup_temp_resources(self, temp_files, temp_dirs):
         """清理临时文件和目录"""
         for temp_file in temp_files:
@@ -250,38 +560,6 @@ class EncryptionEngine:
                 except Exception as e:
                     logger.warning(f"清理临时目录失败 {temp_dir}: {str(e)}")
 
-    def _validate_password_book(self, password_book):
-        """验证密码本格式"""
-        try:
-            required_metadata = ['encryption_time', 'total_rounds', 'original_filename', 'original_hash']
-            required_round_keys = ['extension', 'algorithm']
-
-            if 'metadata' not in password_book or 'rounds' not in password_book:
-                return False
-
-            # 检查元数据
-            for key in required_metadata:
-                if key not in password_book['metadata']:
-                    return False
-
-            # 检查轮次信息
-            total_rounds = password_book['metadata']['total_rounds']
-            if len(password_book['rounds']) != total_rounds:
-                return False
-
-            for round_num in range(1, total_rounds + 1):
-                if str(round_num) not in password_book['rounds']:
-                    return False
-                for key in required_round_keys:
-                    if key not in password_book['rounds'][str(round_num)]:
-                        return False
-
-            return True
-
-        except Exception as e:
-            logger.error(f"密码本验证失败: {str(e)}")
-            return False
-
     def _get_compressed_extension(self, algorithm):
         """根据压缩算法获取对应的文件扩展名"""
         extension_map = {
@@ -289,19 +567,25 @@ class EncryptionEngine:
             'tar': '.tar',
             'gzip': '.gz',
             'tar.gz': '.tar.gz',
-            'tar.bz2': '.tar.bz2'
+            'tar.bz2': '.tar.bz2',
+            'tar.xz': '.tar.xz',
+            'xz': '.xz',
+            'deflate': '.deflate'
         }
 
         return extension_map.get(algorithm, '.zip')
 
-    def _calculate_file_hash(self, file_path):
-        """计算文件哈希值"""
+    def _calculate_file_hash(self, file_path, hash_spec=None):
+        """计算文件哈希值（文件未变化时直接使用缓存）"""
         try:
-            hasher = hashlib.md5()
-            with open(file_path, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hasher.update(chunk)
-            return hasher.hexdigest()
+            hash_spec = hash_spec or default_hash_spec()
+            cached = hash_cache.get(file_path, hash_spec)
+            if cached is not None:
+                return cached
+
+            digest = hash_file(file_path, hash_spec)
+            hash_cache.put(file_path, hash_spec, digest)
+            return digest
         except Exception as e:
             logger.warning(f"计算文件哈希失败: {file_path} - {str(e)}")
             return "unknown"
@@ -0,0 +1,44 @@
+import os
+import math
+import logging
+from collections import Counter
+from config import Config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def byte_entropy(data):
+    """计算数据的字节熵（比特/字节），0 表示完全重复，8 表示完全随机"""
+    if not data:
+        return 0.0
+    total = len(data)
+    # Counter 对 bytes 的计数在 C 层完成，相当于一次字节直方图统计
+    return -sum(count / total * math.log2(count / total) for count in Counter(data).values())
+
+
+def sample_file_entropy(file_path, sample_count=None, sample_size=None):
+    """在文件中均匀抽取若干块估算字节熵，小文件直接整体计算"""
+    sample_count = sample_count or Config.ENTROPY_SAMPLE_COUNT
+    sample_size = sample_size or Config.ENTROPY_SAMPLE_SIZE
+
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        if file_size <= sample_count * sample_size:
+            data = f.read()
+        else:
+            step = (file_size - sample_size) // (sample_count - 1) if sample_count > 1 else 0
+            blocks = []
+            for i in range(sample_count):
+                f.seek(i * step)
+                blocks.append(f.read(sample_size))
+            data = b''.join(blocks)
+
+    entropy = byte_entropy(data)
+    logger.debug(f"抽样字节熵: {file_path} -> {entropy:.3f}")
+    return entropy
+
+
+def is_incompressible(entropy):
+    """按配置的阈值判断数据是否已不可压缩"""
+    return entropy is not None and entropy >= Config.STORE_ENTROPY_THRESHOLD
@@ -5,8 +5,13 @@ import gzip
 import shutil
 import hashlib
 import logging
+import time
 from datetime import datetime
 from config import Config
+from utils.stream_layers import open_layer_writer, open_compressor, open_decompressor, copy_into
+from utils.hashing import hash_cache, new_hasher, hash_file, default_hash_spec
+from utils.uploads import UploadSink
+from utils.storage_layout import shard_path, iter_entries
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -39,14 +44,43 @@ class FileProcessor:
 
         return True, "文件验证通过"
 
+    def _generate_upload_filename(self, original_filename):
+        """生成唯一的上传文件名"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_hash = hashlib.md5(original_filename.encode()).hexdigest()[:8]
+        return f"{timestamp}_{file_hash}_{original_filename}"
+
+    def upload_path(self, original_filename):
+        """上传文件在上传目录（分片目录）中的保存路径"""
+        return shard_path(self.upload_folder, self._generate_upload_filename(original_filename))
+
+    def open_upload_sink(self, original_filename):
+        """在上传目录中创建接收上传数据的文件，写入时按默认哈希方式计算内容哈希"""
+        return UploadSink(self.upload_path(original_filename), default_hash_spec())
+
+    def file_hashes(self, file_path, hash_specs=None):
+        """按给定的各哈希方式计算已保存文件的内容哈希（优先使用哈希缓存）"""
+        digests = []
+        for hash_spec in hash_specs or [default_hash_spec()]:
+            digest = hash_cache.get(file_path, hash_spec)
+            if digest is None:
+                digest = hash_file(file_path, hash_spec)
+                hash_cache.put(file_path, hash_spec, digest)
+            digests.append(digest)
+        return digests
+
     def save_uploaded_file(self, file):
         """保存上传文件到临时目录"""
         try:
+            # 已由 UploadRequest 直接写入上传目录
+            if isinstance(file.stream, UploadSink):
+                filepath, _ = file.stream.claim()
+                logger.debug(f"文件保存成功: {filepath}")
+                return True, filepath, os.path.basename(filepath)
+
             # 生成唯一文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_hash = hashlib.md5(file.filename.encode()).hexdigest()[:8]
-            filename = f"{timestamp}_{file_hash}_{file.filename}"
-            filepath = os.path.join(self.upload_folder, filename)
+            filepath = self.upload_path(file.filename)
+            filename = os.path.basename(filepath)
 
             # 保存文件
             file.save(filepath)
@@ -56,15 +90,48 @@ class FileProcessor:
             logger.error(f"文件保存失败: {str(e)}")
             return False, None, f"文件保存失败: {str(e)}"
 
-    def compress_file(self, file_path, algorithm):
-        """使用指定算法压缩文件"""
+    def save_uploaded_file_hashed(self, file, hash_specs=None):
+        """保存上传文件的同时按给定的各哈希方式计算内容哈希，避免保存后再次读取文件"""
+        try:
+            hash_specs = list(hash_specs or [default_hash_spec()])
+
+            # 已由 UploadRequest 直接写入上传目录并计算了默认哈希（记录在哈希缓存中），其他哈希方式才需要再读取文件
+            if isinstance(file.stream, UploadSink):
+                filepath, _ = file.stream.claim()
+                logger.debug(f"文件保存成功: {filepath}")
+                return True, filepath, os.path.basename(filepath), self.file_hashes(filepath, hash_specs)
+
+            filepath = self.upload_path(file.filename)
+            filename = os.path.basename(filepath)
+            hashers = [new_hasher(hash_spec) for hash_spec in hash_specs]
+            with open(filepath, 'wb') as f_out:
+                for chunk in iter(lambda: file.stream.read(Config.STREAM_CHUNK_SIZE), b""):
+                    for hasher in hashers:
+                        hasher.update(chunk)
+                    f_out.write(chunk)
+
+            digests = []
+            for hash_spec, hasher in zip(hash_specs, hashers):
+                digest = hasher.hexdigest()
+                hash_cache.put(filepath, hash_spec, digest)
+                digests.append(digest)
+
+            logger.debug(f"文件保存成功: {filepath}")
+            return True, filepath, filename, digests
+        except Exception as e:
+            logger.error(f"文件保存失败: {str(e)}")
+            return False, None, f"文件保存失败: {str(e)}", None
+
+    def compress_file(self, file_path, algorithm, level=None):
+        """使用指定算法压缩文件，level 为 0 时只打包不压缩"""
         try:
             base_name = os.path.splitext(file_path)[0]
             logger.debug(f"开始压缩文件: {file_path}, 算法: {algorithm}")
 
             if algorithm == 'zip':
                 output_path = base_name + '.zip'
-                with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                compression = zipfile.ZIP_STORED if level == 0 else zipfile.ZIP_DEFLATED
+                with zipfile.ZipFile(output_path, 'w', compression, compresslevel=level or None) as zipf:
                     zipf.write(file_path, os.path.basename(file_path))
 
             elif algorithm == 'tar':
@@ -74,19 +141,27 @@ class FileProcessor:
 
             elif algorithm == 'gzip':
                 output_path = base_name + '.gz'
-                with open(file_path, 'rb') as f_in:
-                    with gzip.open(output_path, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
+                self._write_compressed_raw(file_path, output_path, 'gz', level)
 
             elif algorithm == 'tar.gz':
                 output_path = base_name + '.tar.gz'
-                with tarfile.open(output_path, 'w:gz') as tar:
-                    tar.add(file_path, arcname=os.path.basename(file_path))
+                self._write_compressed_tar(file_path, output_path, 'gz', level)
 
             elif algorithm == 'tar.bz2':
                 output_path = base_name + '.tar.bz2'
-                with tarfile.open(output_path, 'w:bz2') as tar:
-                    tar.add(file_path, arcname=os.path.basename(file_path))
+                self._write_compressed_tar(file_path, output_path, 'bz2', level)
+
+            elif algorithm == 'tar.xz':
+                output_path = base_name + '.tar.xz'
+                self._write_compressed_tar(file_path, output_path, 'xz', level)
+
+            elif algorithm == 'xz':
+                output_path = base_name + '.xz'
+                self._write_compressed_raw(file_path, output_path, 'xz', level)
+
+            elif algorithm == 'deflate':
+                output_path = base_name + '.deflate'
+                self._write_compressed_raw(file_path, output_path, 'deflate', level)
 
             else:
                 return False, None, f"不支持的压缩算法: {algorithm}"
@@ -98,16 +173,46 @@ class FileProcessor:
             logger.error(f"压缩失败: {file_path} - {str(e)}")
             return False, None, f"压缩失败: {str(e)}"
 
+    def _write_compressed_raw(self, file_path, output_path, compression, level=None):
+        """不打包，直接将文件内容压缩写入（gzip 头部记录文件名）"""
+        with open(file_path, 'rb') as f_in:
+            with open(output_path, 'wb') as f_out:
+                compressor = open_compressor(compression, f_out, level, filename=os.path.basename(file_path))
+                shutil.copyfileobj(f_in, compressor, Config.STREAM_CHUNK_SIZE)
+                compressor.close()
+
+    def _write_compressed_tar(self, file_path, output_path, compression, level=None):
+        """以流模式写入 tar，再经 gz / bz2 压缩写入器（可能按块并行）压缩"""
+        with open(output_path, 'wb') as f_out:
+            compressor = open_compressor(compression, f_out, level)
+            with tarfile.open(fileobj=compressor, mode='w|') as tar:
+                tar.add(file_path, arcname=os.path.basename(file_path))
+            compressor.close()
+
+    def compress_fileobj(self, src, arcname, algorithm, dst, size, level=None):
+        """将文件对象按指定算法压缩写入目标文件对象（不经过上传目录）"""
+        try:
+            logger.debug(f"开始压缩数据流: {arcname}, 算法: {algorithm}")
+
+            writer = open_layer_writer(algorithm, dst, arcname, size, level)
+            copy_into(src, writer)
+            writer.close()
+
+            return True, None
+
+        except Exception as e:
+            logger.error(f"压缩数据流失败: {arcname} - {str(e)}")
+            return False, f"压缩失败: {str(e)}"
+
     def extract_file(self, file_path, algorithm):
         """使用指定算法解压文件"""
         try:
             # 创建唯一的解压目录，避免路径冲突
-            import time
             base_name = os.path.splitext(file_path)[0]
             timestamp = str(int(time.time() * 1000))
             
             # 使用更短的目录名，避免Windows路径过长问题
-            extract_dir = os.path.join(self.upload_folder, f"extracted_{timestamp}")
+            extract_dir = shard_path(self.upload_folder, f"extracted_{timestamp}")
             
             # 确保目录不存在，避免冲突
             if os.path.exists(extract_dir):
@@ -125,12 +230,14 @@ class FileProcessor:
                 # 查找解压后的文件
                 output_path = self._find_extracted_file(extract_dir, file_path)
 
-            elif algorithm in ['tar', 'tar.gz', 'tar.bz2']:
+            elif algorithm in ['tar', 'tar.gz', 'tar.bz2', 'tar.xz']:
                 mode = 'r'
                 if algorithm == 'tar.gz':
                     mode = 'r:gz'
                 elif algorithm == 'tar.bz2':
                     mode = 'r:bz2'
+                elif algorithm == 'tar.xz':
+                    mode = 'r:xz'
 
                 with tarfile.open(file_path, mode) as tar:
                     tar.extractall(extract_dir)
@@ -144,6 +251,15 @@ class FileProcessor:
                 with gzip.open(file_path, 'rb') as f_in:
                     with open(output_path, 'wb') as f_out:
                         shutil.copyfileobj(f_in, f_out)
+
+            elif algorithm in ['xz', 'deflate']:
+                # 与 gzip 相同，解压后是单个文件
+                output_path = os.path.join(extract_dir, os.path.basename(base_name))
+                with open(file_path, 'rb') as f_in:
+                    decompressor = open_decompressor(algorithm, f_in)
+                    with open(output_path, 'wb') as f_out:
+                        shutil.copyfileobj(decompressor, f_out, Config.STREAM_CHUNK_SIZE)
+                    decompressor.close()
             else:
                 return False, None, f"不支持的解压算法: {algorithm}"
 
@@ -201,6 +317,10 @@ class FileProcessor:
             base_name = os.path.splitext(file_path)[0]
             new_file_path = base_name + new_extension
 
+            # 后缀名相同时无需重命名
+            if new_file_path == file_path:
+                return True, new_file_path, None
+
             # 如果目标文件已存在，先删除
             if os.path.exists(new_file_path):
                 os.remove(new_file_path)
@@ -252,12 +372,11 @@ class FileProcessor:
             else:
                 # 清理整个上传目录
                 if os.path.exists(self.upload_folder):
-                    for filename in os.listdir(self.upload_folder):
-                        file_path = os.path.join(self.upload_folder, filename)
-                        if os.path.isfile(file_path):
-                            os.remove(file_path)
-                        elif os.path.isdir(file_path) and '_extracted' in filename:
-                            shutil.rmtree(file_path)
+                    for entry in iter_entries(self.upload_folder):
+                        if entry.is_file():
+                            os.remove(entry.path)
+                        elif entry.is_dir() and '_extracted' in entry.name:
+                            shutil.rmtree(entry.path)
                     logger.debug("清理上传目录完成")
                 return True, "清理完成"
         except Exception as e:
@@ -0,0 +1,190 @@
+import os
+import hashlib
+import threading
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 支持的完整性哈希算法；旧密码本没有记录算法时按 md5 处理
+SUPPORTED_HASH_ALGORITHMS = ('md5', 'sha256', 'blake2b')
+LEGACY_HASH_ALGORITHM = 'md5'
+
+# 树哈希共用的线程池（hashlib 计算大块数据时会释放 GIL）
+_tree_executor = None
+_tree_executor_lock = threading.Lock()
+
+
+def _get_tree_executor():
+    global _tree_executor
+    with _tree_executor_lock:
+        if _tree_executor is None:
+            workers = Config.HASH_TREE_WORKERS or os.cpu_count() or 1
+            _tree_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tree-hash')
+        return _tree_executor
+
+
+def _digest_chunk(algorithm, chunk):
+    return hashlib.new(algorithm, chunk).digest()
+
+
+class TreeHasher:
+    """分块树哈希：按固定大小切分数据，各块在线程池中并行计算，根哈希为各块摘要拼接后的哈希
+
+    接口与 hashlib 对象一致，可以直接用于 HashingReader / HashingWriter。
+    """
+
+    def __init__(self, algorithm, chunk_size):
+        self.algorithm = algorithm
+        self.chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._leaves = []
+        self._max_pending = (Config.HASH_TREE_WORKERS or os.cpu_count() or 1) * 2
+        self._hexdigest = None
+
+    def _submit(self, chunk):
+        # 限制排队中的块数，避免数据读取快于哈希计算时占用过多内存
+        while len(self._pending) >= self._max_pending:
+            self._leaves.append(self._pending.popleft().result())
+        self._pending.append(_get_tree_executor().submit(_digest_chunk, self.algorithm, chunk))
+
+    def update(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self.chunk_size:
+            self._submit(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+
+    def hexdigest(self):
+        if self._hexdigest is None:
+            if self._buffer or not (self._pending or self._leaves):
+                self._submit(bytes(self._buffer))
+                self._buffer = bytearray()
+            while self._pending:
+                self._leaves.append(self._pending.popleft().result())
+            self._hexdigest = hashlib.new(self.algorithm, b''.join(self._leaves)).hexdigest()
+        return self._hexdigest
+
+
+def default_hash_spec():
+    """当前配置的哈希方式：(算法, 树哈希块大小)，块大小为 None 表示整体哈希"""
+    chunk_size = Config.HASH_TREE_CHUNK_SIZE if Config.HASH_TREE_MODE else None
+    return Config.HASH_ALGORITHM, chunk_size
+
+
+def hash_spec_from_metadata(metadata):
+    """读取密码本元数据中记录的哈希方式，旧密码本默认为 md5 整体哈希"""
+    algorithm = metadata.get('hash_algorithm') or LEGACY_HASH_ALGORITHM
+    chunk_size = metadata.get('hash_chunk_size') or None
+    return algorithm, chunk_size
+
+
+def record_hash_spec(metadata, hash_spec):
+    """将哈希方式写入密码本元数据"""
+    algorithm, chunk_size = hash_spec
+    metadata['hash_algorithm'] = algorithm
+    if chunk_size:
+        metadata['hash_chunk_size'] = chunk_size
+
+
+def new_hasher(hash_spec=None):
+    """按哈希方式创建哈希对象"""
+    algorithm, chunk_size = hash_spec or default_hash_spec()
+    if algorithm not in SUPPORTED_HASH_ALGORITHMS:
+        raise ValueError(f"不支持的哈希算法: {algorithm}")
+    if chunk_size:
+        return TreeHasher(algorithm, chunk_size)
+    return hashlib.new(algorithm)
+
+
+def hash_file(file_path, hash_spec=None):
+    """使用大块读取计算文件哈希"""
+    hasher = new_hasher(hash_spec)
+    read_size = max(Config.HASH_READ_SIZE, (hash_spec or default_hash_spec())[1] or 0)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(read_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class HashingReader:
+    """读取时同步更新哈希的文件包装，用于在压缩读取原文件的同时计算哈希"""
+
+    def __init__(self, fileobj, hasher):
+        self._fileobj = fileobj
+        self.hasher = hasher
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self.hasher.update(data)
+        self.bytes_read += len(data)
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+
+class HashingWriter:
+    """写入时同步更新哈希的文件包装，用于在写出最终文件的同时计算哈希"""
+
+    def __init__(self, fileobj, hasher):
+        self._fileobj = fileobj
+        self.hasher = hasher
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.bytes_written += len(data)
+        return self._fileobj.write(data)
+
+    def flush(self):
+        self._fileobj.flush()
+
+
+class FileHashCache:
+    """文件哈希缓存，以 (路径, inode, 大小, 修改时间, 哈希方式) 为键，文件变化后自动失效"""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or Config.HASH_CACHE_SIZE
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, file_path, hash_spec):
+        stat = os.stat(file_path)
+        return os.path.realpath(file_path), stat.st_ino, stat.st_size, stat.st_mtime_ns, tuple(hash_spec)
+
+    def get(self, file_path, hash_spec):
+        """获取缓存的哈希值，文件不存在或已变化时返回 None"""
+        try:
+            key = self._key(file_path, hash_spec)
+        except OSError:
+            return None
+        with self._lock:
+            digest = self._entries.get(key)
+            if digest is not None:
+                self._entries.move_to_end(key)
+            return digest
+
+    def put(self, file_path, hash_spec, digest):
+        """记录文件当前状态对应的哈希值"""
+        try:
+            key = self._key(file_path, hash_spec)
+        except OSError as e:
+            logger.debug(f"记录哈希缓存失败: {file_path} - {str(e)}")
+            return
+        with self._lock:
+            self._entries[key] = digest
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# 进程内共享的哈希缓存
+hash_cache = FileHashCache()
@@ -0,0 +1,237 @@
+import os
+import time
+import shutil
+import sqlite3
+import logging
+import threading
+from config import Config
+from utils.storage_layout import is_shard_name
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def _tree_size(path):
+    """目录下所有文件的总大小"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class DirectoryQuota:
+    """单个目录的清理规则：超过 max_age 秒的条目以及超出 max_bytes 的最旧条目会被删除
+
+    目录按分片布局存放（levels 级分片子目录），清理的是分片目录中的条目（以及尚未迁移的平铺条目）。
+    目录清单在内存中增量维护：各级目录的修改时间不变（没有增删条目）时沿用上次的清单，
+    子目录的大小按其修改时间缓存。dir_pattern 为 None 时不删除子目录，
+    否则只删除名称包含 dir_pattern 的子目录。修改时间在 min_age 秒内的条目始终保留。
+    keep 为返回仍在使用的文件路径的函数（如已登记的产物、进行中的上传），这些文件及包含它们的子目录不会被删除。
+    """
+
+    def __init__(self, path, max_age, max_bytes=None, min_age=None, dir_pattern=None, levels=None, keep=None):
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.min_age = min_age if min_age is not None else Config.JANITOR_MIN_AGE
+        self.dir_pattern = dir_pattern
+        self.levels = levels if levels is not None else Config.STORAGE_SHARD_LEVELS
+        self.keep = keep
+        self._listings = {}  # 相对目录 -> (目录修改时间, 分片子目录列表, {名称: (大小, 修改时间, 是否目录)})
+        self._entries = {}   # 相对路径 -> (大小, 修改时间, 是否目录)
+
+    def _scan(self, rel_dir, depth, listings):
+        """列出一级目录：目录修改时间未变时沿用缓存的清单，返回 (分片子目录列表, 条目)"""
+        path = os.path.join(self.path, rel_dir)
+        try:
+            dir_mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return [], {}
+        cached = self._listings.get(rel_dir)
+        if cached and cached[0] == dir_mtime:
+            listings[rel_dir] = cached
+            return cached[1], cached[2]
+
+        shards, entries = [], {}
+        previous = cached[2] if cached else {}
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if is_dir and depth < self.levels and is_shard_name(entry.name):
+                        shards.append(entry.name)
+                        continue
+                    if is_dir and (self.dir_pattern is None or self.dir_pattern not in entry.name):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                size = stat.st_size
+                if is_dir:
+                    old = previous.get(entry.name)
+                    size = old[0] if old and old[1] == stat.st_mtime else _tree_size(entry.path)
+                entries[entry.name] = (size, stat.st_mtime, is_dir)
+        listings[rel_dir] = (dir_mtime, shards, entries)
+        return shards, entries
+
+    def _refresh(self):
+        """重新汇总各级目录的条目，只重新列出有变化的目录"""
+        listings, entries = {}, {}
+        pending = [('', 0)]
+        while pending:
+            rel_dir, depth = pending.pop()
+            shards, dir_entries = self._scan(rel_dir, depth, listings)
+            for name, info in dir_entries.items():
+                entries[os.path.join(rel_dir, name)] = info
+            pending.extend((os.path.join(rel_dir, name), depth + 1) for name in shards)
+        self._listings = listings
+        self._entries = entries
+
+    def _kept(self):
+        """仍在使用的条目（相对路径，含各级上级目录）"""
+        kept = set()
+        if self.keep is None:
+            return kept
+        root = os.path.abspath(self.path)
+        for path in self.keep():
+            rel = os.path.relpath(os.path.abspath(path), root)
+            while rel and rel != '.' and not rel.startswith('..'):
+                kept.add(rel)
+                rel = os.path.dirname(rel)
+        return kept
+
+    def _remove(self, name, mtime):
+        """删除条目；删除前确认条目在扫描后没有被修改"""
+        path = os.path.join(self.path, name)
+        try:
+            if os.lstat(path).st_mtime != mtime:
+                return False
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            # 已被其他进程删除
+            pass
+        except OSError as e:
+            logger.warning(f"清理失败: {path} - {str(e)}")
+            return False
+        self._entries.pop(name, None)
+        return True
+
+    def sweep(self, now=None):
+        """执行一次清理，返回 {'files': 删除的条目数, 'bytes': 回收的字节数, 'remaining_bytes': 剩余总大小}"""
+        now = now if now is not None else time.time()
+        # 先取得使用中的文件再列目录：列目录时新登记的文件修改时间在 min_age 内，不会被删除
+        kept = self._kept()
+        self._refresh()
+
+        total = sum(size for size, _, _ in self._entries.values())
+        removed = reclaimed = 0
+        # 从最旧的条目开始，先删除过期条目，再删除超出配额的部分
+        for name, (size, mtime, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            age = now - mtime
+            if age < self.min_age:
+                break
+            if name in kept:
+                continue
+            over_quota = self.max_bytes is not None and total > self.max_bytes
+            if (age > self.max_age or over_quota) and self._remove(name, mtime):
+                removed += 1
+                reclaimed += size
+                total -= size
+
+        return {'files': removed, 'bytes': reclaimed, 'remaining_bytes': total}
+
+
+def default_quotas():
+    """上传目录（含解压目录）和密码本目录的清理规则
+
+    上传目录中的临时文件保留 TEMP_FILE_CLEANUP_TIME；已登记的产物（保留 JOB_RETENTION）、进行中的分块上传
+    以及排队和执行中任务的输入文件不清理。
+    """
+    from utils.password_book import PasswordBookManager
+    from utils.artifacts import ArtifactRegistry
+    from utils.chunked_upload import ChunkedUploadStore
+    from utils.job_queue import JobQueue
+
+    artifacts, uploads, jobs = ArtifactRegistry(), ChunkedUploadStore(), JobQueue()
+    return [
+        DirectoryQuota(Config.UPLOAD_FOLDER, Config.TEMP_FILE_CLEANUP_TIME, Config.UPLOAD_QUOTA_BYTES,
+                       dir_pattern='extracted', keep=lambda: artifacts.paths() + uploads.paths() + jobs.input_paths()),
+        DirectoryQuota(PasswordBookManager().storage_dir, Config.PASSWORD_BOOK_RETENTION,
+                       Config.PASSWORD_BOOK_QUOTA_BYTES)
+    ]
+
+
+class Janitor:
+    """定期按各目录的规则清理文件，累计回收的空间，清理后增量同步密码本索引"""
+
+    def __init__(self, quotas=None, catalogs=None):
+        from utils.password_book import PasswordBookManager
+
+        self.quotas = quotas if quotas is not None else default_quotas()
+        self.catalogs = catalogs if catalogs is not None else [PasswordBookManager().catalog]
+        self.reclaimed_files = 0
+        self.reclaimed_bytes = 0
+        self.last_sweep = None
+
+    def sweep(self):
+        """清理所有目录，返回每个目录的清理结果"""
+        report = {}
+        for quota in self.quotas:
+            try:
+                report[quota.path] = stats = quota.sweep()
+            except (OSError, sqlite3.Error) as e:
+                # 无法确定使用中的文件时跳过本次清理
+                logger.error(f"清理目录失败: {quota.path} - {str(e)}")
+                continue
+            self.reclaimed_files += stats['files']
+            self.reclaimed_bytes += stats['bytes']
+            if stats['files']:
+                logger.info(f"清理 {quota.path}: 删除{stats['files']}项, 回收{stats['bytes']}字节, "
+                            f"剩余{stats['remaining_bytes']}字节")
+        for catalog in self.catalogs:
+            try:
+                catalog.reconcile()
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"同步密码本索引失败: {str(e)}")
+        self.last_sweep = time.time()
+        return report
+
+    def run(self, stop_event=None, interval=None):
+        """按间隔循环清理，直到 stop_event 被设置"""
+        interval = interval if interval is not None else Config.JANITOR_INTERVAL
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"后台清理异常: {str(e)}")
+            stop_event.wait(interval)
+
+
+# 当前进程的后台清理线程
+_janitor = None
+_janitor_pid = None
+_janitor_lock = threading.Lock()
+
+
+def start_janitor():
+    """在当前进程中启动后台清理线程（每个进程只启动一次），返回 Janitor"""
+    global _janitor, _janitor_pid
+    if not Config.JANITOR_ENABLED:
+        return None
+
+    with _janitor_lock:
+        if _janitor_pid != os.getpid():
+            _janitor = Janitor()
+            thread = threading.Thread(target=_janitor.run, name='janitor', daemon=True)
+            thread.start()
+            _janitor_pid = os.getpid()
+            logger.info("后台清理线程已启动")
+        return _janitor
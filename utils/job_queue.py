@@ -0,0 +1,361 @@
+import os
+import json
+import base64
+import functools
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from config import Config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_FINISHED = 'finished'
+JOB_FAILED = 'failed'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    payload TEXT,
+    secrets BLOB,
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    scratch_bytes INTEGER NOT NULL DEFAULT 0,
+    cpu_seconds REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, id);
+'''
+
+# 旧版本数据库缺少的列
+_MIGRATIONS = {
+    'scratch_bytes': 'ALTER TABLE jobs ADD COLUMN scratch_bytes INTEGER NOT NULL DEFAULT 0',
+    'cpu_seconds': 'ALTER TABLE jobs ADD COLUMN cpu_seconds REAL NOT NULL DEFAULT 0',
+    'secrets': 'ALTER TABLE jobs ADD COLUMN secrets BLOB'
+}
+
+
+def _secrets_cipher():
+    """加密任务机密参数的 Fernet：密钥由 SECRET_KEY 派生，web 进程和工作进程相同，不写入数据库"""
+    key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'job-queue-secrets').derive(
+        Config.SECRET_KEY.encode('utf-8')
+    )
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+class JobQueue:
+    """基于 SQLite 的持久化任务队列，web 进程提交任务，工作进程领取并执行
+
+    每次操作使用独立的连接，可以在多个线程和进程中同时使用。
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or Config.JOB_DB_PATH
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, statement in _MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(statement)
+
+    @contextmanager
+    def _connect(self):
+        # 自动提交模式，需要事务时显式 BEGIN
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _row_to_job(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        # 机密参数只在工作进程领取任务时解密（见 claim）
+        job.pop('secrets', None)
+        for key in ('payload', 'result'):
+            job[key] = json.loads(job[key]) if job[key] else None
+        return job
+
+    def submit(self, kind, payload, owner=None, secrets=None, scratch_bytes=0, cpu_seconds=0.0):
+        """提交任务，返回任务ID
+
+        secrets 为机密参数（密码、解密后的密码本等），加密后单独保存，工作进程领取时合并到 payload 中；
+        任务结束时与 payload 一起清除。
+        scratch_bytes / cpu_seconds 为任务预计的峰值临时磁盘占用和 CPU 耗时，用于准入控制。
+        """
+        job_id = uuid.uuid4().hex
+        sealed = None
+        if secrets:
+            sealed = _secrets_cipher().encrypt(json.dumps(secrets, ensure_ascii=False).encode('utf-8'))
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, status, owner, payload, secrets, scratch_bytes, cpu_seconds, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, JOB_QUEUED, owner, json.dumps(payload, ensure_ascii=False), sealed,
+                 int(scratch_bytes), float(cpu_seconds), time.time())
+            )
+        logger.debug(f"提交任务: {job_id} ({kind})")
+        return job_id
+
+    def claim(self, worker_id, max_running=None, scratch_budget=None):
+        """领取最早提交的排队任务，没有可执行的任务时返回 None
+
+        执行中任务数达到 max_running，或最早的任务预计磁盘占用超过 scratch_budget
+        减去执行中任务的预留时不领取，任务继续排队（按提交顺序，不跳过）。
+        没有执行中的任务时仍放不下的任务会直接失败，避免阻塞队列。
+        """
+        with self._connect() as conn:
+            # IMMEDIATE 事务保证同一任务只会被一个工作进程领取，并发数检查与领取是原子的
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                running, reserved = conn.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(scratch_bytes), 0) FROM jobs WHERE status = ?', (JOB_RUNNING,)
+                ).fetchone()
+                row = None
+                if max_running is None or running < max_running:
+                    row = conn.execute(
+                        'SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1', (JOB_QUEUED,)
+                    ).fetchone()
+                started_at = time.time()
+                if row is not None and scratch_budget is not None and row['scratch_bytes'] > scratch_budget - reserved:
+                    if running == 0:
+                        conn.execute(
+                            'UPDATE jobs SET status = ?, error = ?, payload = NULL, secrets = NULL, finished_at = ? '
+                            'WHERE id = ?',
+                            (JOB_FAILED, '服务器磁盘空间不足，任务无法执行', started_at, row['id'])
+                        )
+                        logger.warning(f"磁盘空间不足，任务失败: {row['id']}")
+                    row = None
+                if row is not None:
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, worker = ?, started_at = ? WHERE id = ?',
+                        (JOB_RUNNING, worker_id, started_at, row['id'])
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        if row is None:
+            return None
+
+        job = self._row_to_job(row)
+        job.update(status=JOB_RUNNING, worker=worker_id, started_at=started_at)
+        if row['secrets']:
+            job['payload'].update(json.loads(_secrets_cipher().decrypt(row['secrets'])))
+        return job
+
+    def finish(self, job_id, result):
+        """记录任务结果；任务参数和机密参数结束后即清除"""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, payload = NULL, secrets = NULL, finished_at = ? WHERE id = ?',
+                (JOB_FINISHED, json.dumps(result, ensure_ascii=False), time.time(), job_id)
+            )
+
+    def fail(self, job_id, error):
+        """记录任务失败"""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, payload = NULL, secrets = NULL, finished_at = ? WHERE id = ?',
+                (JOB_FAILED, str(error), time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        """获取任务记录，不存在时返回 None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def load(self):
+        """当前负载：排队和执行中的任务数，及这些任务预计的磁盘占用和 CPU 耗时之和"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT status, COUNT(*) AS count, COALESCE(SUM(scratch_bytes), 0) AS scratch_bytes, '
+                'COALESCE(SUM(cpu_seconds), 0) AS cpu_seconds FROM jobs WHERE status IN (?, ?) GROUP BY status',
+                (JOB_QUEUED, JOB_RUNNING)
+            ).fetchall()
+        load = {JOB_QUEUED: 0, JOB_RUNNING: 0, 'scratch_bytes': 0, 'cpu_seconds': 0.0}
+        for row in rows:
+            load[row['status']] = row['count']
+            load['scratch_bytes'] += row['scratch_bytes']
+            load['cpu_seconds'] += row['cpu_seconds']
+        return load
+
+    def input_paths(self):
+        """排队及执行中任务的输入文件路径（后台清理时保留）
+
+        输入文件取自任务载荷：files 中各项的 filepath（加密任务）及 cleanup 列表（解密任务）。
+        """
+        with self._connect() as conn:
+            rows = conn.execute('SELECT payload FROM jobs WHERE status IN (?, ?) AND payload IS NOT NULL',
+                                (JOB_QUEUED, JOB_RUNNING)).fetchall()
+        paths = []
+        for row in rows:
+            payload = json.loads(row['payload'])
+            paths.extend(file_info['filepath'] for file_info in payload.get('files', []))
+            paths.extend(payload.get('cleanup', []))
+        return paths
+
+    def add_event(self, job_id, event):
+        """记录任务的进度事件"""
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO job_events (job_id, data, created_at) VALUES (?, ?, ?)',
+                (job_id, json.dumps(event, ensure_ascii=False), time.time())
+            )
+
+    def events(self, job_id, after_id=0):
+        """获取任务中编号大于 after_id 的进度事件，返回 [(事件编号, 事件)]"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT id, data FROM job_events WHERE job_id = ? AND id > ? ORDER BY id', (job_id, after_id)
+            ).fetchall()
+        return [(row['id'], json.loads(row['data'])) for row in rows]
+
+    def fail_orphaned(self):
+        """将本机已退出的工作进程遗留的运行中任务标记为失败
+
+        任务的输入文件可能已被部分处理或清理，不自动重试。
+        """
+        host = socket.gethostname()
+        with self._connect() as conn:
+            rows = conn.execute('SELECT id, worker FROM jobs WHERE status = ?', (JOB_RUNNING,)).fetchall()
+            for row in rows:
+                worker_host, _, pid = (row['worker'] or '').rpartition(':')
+                if worker_host != host or not pid.isdigit() or _pid_alive(int(pid)):
+                    continue
+                conn.execute(
+                    'UPDATE jobs SET status = ?, error = ?, payload = NULL, secrets = NULL, finished_at = ? '
+                    'WHERE id = ?',
+                    (JOB_FAILED, '工作进程已退出，任务中断', time.time(), row['id'])
+                )
+                logger.warning(f"任务中断: {row['id']} ({row['worker']})")
+
+    def purge(self, max_age=None):
+        """删除结束时间早于 max_age 秒前的任务记录"""
+        max_age = max_age if max_age is not None else Config.JOB_RETENTION
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?',
+                (JOB_FINISHED, JOB_FAILED, time.time() - max_age)
+            )
+            conn.execute('DELETE FROM job_events WHERE job_id NOT IN (SELECT id FROM jobs)')
+        return cursor.rowcount
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def worker_id():
+    """当前工作进程的标识：主机名:进程号"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(db_path=None, stop_event=None):
+    """工作进程主循环：领取任务并交给对应的处理函数执行"""
+    # 处理函数依赖加密引擎等组件，只在工作进程中导入
+    from utils.batch_runner import JOB_HANDLERS
+    from utils.admission import scratch_budget
+    from utils.round_planner import RoundPlanner
+
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO)
+
+    queue = JobQueue(db_path)
+    current = worker_id()
+    last_purge = 0
+    logger.info(f"任务工作进程启动: {current}")
+    # 启动时在后台测量各算法吞吐量，测量完成前的轮次计划使用静态估计
+    RoundPlanner().warm_up(wait=False)
+
+    while stop_event is None or not stop_event.is_set():
+        if time.time() - last_purge > Config.JOB_PURGE_INTERVAL:
+            queue.purge()
+            last_purge = time.time()
+
+        job = queue.claim(current, Config.JOB_MAX_RUNNING, scratch_budget())
+        if job is None:
+            time.sleep(Config.JOB_POLL_INTERVAL)
+            continue
+
+        handler = JOB_HANDLERS.get(job['kind'])
+        logger.info(f"开始执行任务: {job['id']} ({job['kind']})")
+        try:
+            if handler is None:
+                raise ValueError(f"未知的任务类型: {job['kind']}")
+            progress = functools.partial(queue.add_event, job['id'])
+            queue.finish(job['id'], handler(job['payload'], progress))
+            logger.info(f"任务完成: {job['id']}")
+        except Exception as e:
+            logger.error(f"任务失败: {job['id']} - {str(e)}")
+            queue.fail(job['id'], str(e))
+
+
+# 当前进程启动的工作进程
+_workers = []
+_workers_pid = None
+_workers_lock = threading.Lock()
+
+
+def start_workers(count=None, db_path=None):
+    """在当前进程中启动工作进程池（每个进程只启动一次）"""
+    global _workers_pid
+    count = Config.JOB_WORKERS if count is None else count
+    if count <= 0:
+        return []
+
+    with _workers_lock:
+        # fork 出的子进程（如 gunicorn 的 worker）需要启动自己的工作进程
+        if _workers_pid == os.getpid() and all(p.is_alive() for p in _workers):
+            return list(_workers)
+
+        queue = JobQueue(db_path)
+        queue.fail_orphaned()
+
+        _workers[:] = [p for p in _workers if _workers_pid == os.getpid() and p.is_alive()]
+        # 使用 spawn，避免在已有线程池的 web 进程中 fork
+        context = multiprocessing.get_context('spawn')
+        while len(_workers) < count:
+            process = context.Process(target=run_worker, args=(queue.db_path,), daemon=True,
+                                      name=f'job-worker-{len(_workers) + 1}')
+            process.start()
+            _workers.append(process)
+        _workers_pid = os.getpid()
+        logger.info(f"已启动{len(_workers)}个任务工作进程")
+        return list(_workers)
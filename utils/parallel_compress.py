@@ -0,0 +1,128 @@
+import io
+import os
+import bz2
+import gzip
+import lzma
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 分块压缩共用的线程池（zlib / bz2 / lzma 压缩时会释放 GIL）
+_compress_executor = None
+_compress_executor_lock = threading.Lock()
+
+
+def parallel_workers():
+    """并行压缩使用的线程数"""
+    return Config.PARALLEL_COMPRESS_WORKERS or os.cpu_count() or 1
+
+
+def _get_compress_executor():
+    global _compress_executor
+    with _compress_executor_lock:
+        if _compress_executor is None:
+            _compress_executor = ThreadPoolExecutor(max_workers=parallel_workers(),
+                                                    thread_name_prefix='compress')
+        return _compress_executor
+
+
+def _gzip_block(data, level, filename):
+    """将一块数据压缩为一个完整的 gzip 成员"""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(filename=filename, mode='wb', fileobj=buffer, compresslevel=level) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+
+def _bz2_block(data, level):
+    """将一块数据压缩为一个完整的 bz2 流"""
+    return bz2.compress(data, level)
+
+
+class ParallelBlockWriter:
+    """分块并行压缩写入器：每块独立压缩后按顺序写入下游
+
+    多个 gzip 成员 / bz2 流 / xz 流首尾相接仍是标准格式，gzip.GzipFile、bz2.BZ2File、
+    lzma.LZMAFile 和 tarfile 都可以直接读取。关闭时不会关闭下游，与 GzipFile(fileobj=...) 的行为一致。
+    """
+
+    def __init__(self, downstream, block_size=None):
+        self._downstream = downstream
+        self.block_size = block_size or Config.PARALLEL_COMPRESS_BLOCK_SIZE
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._max_pending = parallel_workers() * 2
+        self._blocks = 0
+        self._closed = False
+
+    def _compress_block(self, data, index):
+        raise NotImplementedError
+
+    def _submit(self, data):
+        # 限制排队中的块数，按提交顺序写出已完成的块
+        while len(self._pending) >= self._max_pending:
+            self._downstream.write(self._pending.popleft().result())
+        self._pending.append(_get_compress_executor().submit(self._compress_block, data, self._blocks))
+        self._blocks += 1
+
+    def write(self, data):
+        if self._closed:
+            raise ValueError("写入已关闭的压缩流")
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._closed:
+            return
+        # 没有任何数据时也输出一个空成员，保证结果是合法的压缩流
+        if self._buffer or not self._blocks:
+            self._submit(bytes(self._buffer))
+            self._buffer = bytearray()
+        while self._pending:
+            self._downstream.write(self._pending.popleft().result())
+        self._closed = True
+
+
+class ParallelGzipWriter(ParallelBlockWriter):
+    """gzip 分块并行写入器，文件名只写入第一个成员的头部"""
+
+    def __init__(self, downstream, level=9, filename='', block_size=None):
+        super().__init__(downstream, block_size)
+        self.level = level
+        self.filename = filename
+
+    def _compress_block(self, data, index):
+        return _gzip_block(data, self.level, self.filename if index == 0 else '')
+
+
+class ParallelBz2Writer(ParallelBlockWriter):
+    """bz2 分块并行写入器"""
+
+    def __init__(self, downstream, level=9, block_size=None):
+        super().__init__(downstream, block_size)
+        self.level = level
+
+    def _compress_block(self, data, index):
+        return _bz2_block(data, self.level)
+
+
+class ParallelXzWriter(ParallelBlockWriter):
+    """xz 分块并行写入器"""
+
+    def __init__(self, downstream, preset=6, block_size=None):
+        super().__init__(downstream, block_size)
+        self.preset = preset
+
+    def _compress_block(self, data, index):
+        return lzma.compress(data, preset=self.preset)
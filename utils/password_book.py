@@ -1,70 +1,186 @@
 import json
 import os
+import re
 import hashlib
 from datetime import datetime
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
+import sqlite3
+import logging
+from utils.hashing import hash_spec_from_metadata
+from utils.storage_layout import shard_path, locate, iter_entries
+from utils.password_book_catalog import PasswordBookCatalog
+from utils.password_book_format import (BINARY_EXTENSION, JSON_EXTENSION, encode_password_book,
+                                        load_password_book_file, export_json)
+from utils.password_book_model import (PasswordBook, EncryptedPasswordBook, PasswordBookError, password_book_from_dict,
+                                       PASSWORD_BOOK_VERSION, PASSWORD_BOOK_GENERATOR)
+from config import Config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def remove_timestamp_prefix(filename):
+    """移除时间戳前缀"""
+    # 匹配常见的时间戳格式：20241102_143000_ 或 20241102143000_
+    pattern = r'^\d{8}_\d{6}_|\d{14}_'
+    return re.sub(pattern, '', filename)
+
+
+class PasswordBookIndex:
+    """密码本查找索引：每次请求构建一次，按内容哈希及文件名的多种形式做 O(1) 查找"""
+
+    def __init__(self, password_books_dict):
+        """password_books_dict 为 {密码本文件名: PasswordBook}"""
+        self.by_final_hash = {}
+        self.hash_specs = set()
+        self.by_final_filename = {}
+        self.by_final_base = {}
+        self.by_book_id = {}
+        self.by_original_base = {}
+
+        for pb_filename, pb_data in password_books_dict.items():
+            metadata = pb_data.metadata
+            entry = (pb_filename, pb_data)
+
+            final_hash = metadata.get('final_hash', '')
+            if final_hash and final_hash != 'unknown':
+                self.by_final_hash.setdefault(final_hash, entry)
+                self.hash_specs.add(hash_spec_from_metadata(metadata))
+
+            final_filename = metadata.get('final_filename', '')
+            if final_filename:
+                self.by_final_filename.setdefault(final_filename, entry)
+                self.by_final_base.setdefault(os.path.splitext(final_filename)[0], entry)
+
+            book_id = metadata.get('book_id', '')
+            if book_id:
+                self.by_book_id.setdefault(book_id, entry)
+                self.by_book_id.setdefault(book_id[:8], entry)
+
+            original_filename = metadata.get('original_filename', '')
+            if original_filename:
+                original_base = remove_timestamp_prefix(os.path.splitext(original_filename)[0])
+                self.by_original_base.setdefault(original_base, entry)
+
+    def lookup_hash(self, file_hashes):
+        """按加密文件的内容哈希查找密码本，与文件名无关
+
+        file_hashes 为按 hash_specs 中各哈希方式计算出的摘要列表，不同算法的摘要长度不同，不会混淆。
+        """
+        for file_hash in file_hashes or []:
+            if file_hash in self.by_final_hash:
+                return self.by_final_hash[file_hash]
+        return None, None
+
+    def lookup(self, encrypted_filename):
+        """按加密文件名查找密码本，返回 (密码本文件名, 密码本)，未找到时返回 (None, None)"""
+        encrypted_base = os.path.splitext(encrypted_filename)[0]
+        encrypted_clean = remove_timestamp_prefix(encrypted_base)
+
+        for table, key in ((self.by_final_filename, encrypted_filename),
+                           (self.by_final_base, encrypted_base),
+                           (self.by_final_base, encrypted_clean),
+                           (self.by_book_id, encrypted_base),
+                           (self.by_original_base, encrypted_clean)):
+            if key in table:
+                return table[key]
+
+        return None, None
+
 
 class PasswordBookManager:
     def __init__(self):
         self.storage_dir = 'static/password_books'
         os.makedirs(self.storage_dir, exist_ok=True)
+        self.catalog = PasswordBookCatalog(self.storage_dir)
 
-    def generate_password_book(self, encryption_data):
-        """生成密码本"""
+    def _update_catalog(self, update, *args):
+        """更新密码本索引；失败时只记录日志，下次同步目录时会修正"""
         try:
-            password_book = {
-                'metadata': encryption_data['metadata'], 
-                'rounds': encryption_data['rounds'], 
-                'version': '1.0', 
-                'generator': 'Flask File Encryption System' 
-            }
+            update(*args)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"更新密码本索引失败: {str(e)}")
+
+    def generate_password_book(self, password_book):
+        """为加密引擎生成的 PasswordBook 补充版本信息和密码本 ID"""
+        try:
+            password_book.version = PASSWORD_BOOK_VERSION
+            password_book.generator = PASSWORD_BOOK_GENERATOR
 
             # 生成密码本ID
             book_id = self._generate_book_id(password_book)
-            password_book['metadata']['book_id'] = book_id
+            password_book.metadata['book_id'] = book_id
 
             return True, password_book, book_id
 
         except Exception as e:
             return False, None, f"生成密码本失败: {str(e)}"
 
+    def book_filename(self, password_book):
+        """按原文件名和密码本 ID 生成密码本文件名（需要未加密的密码本），后缀名取决于 PASSWORD_BOOK_FORMAT"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        original_name = password_book.original_filename
+        book_id = password_book.book_id
+        extension = BINARY_EXTENSION if Config.PASSWORD_BOOK_FORMAT == 'binary' else JSON_EXTENSION
+        return f"{timestamp}_{original_name}_{book_id[:8]}{extension}"
+
     def save_password_book(self, password_book, filename=None):
-        """保存密码本到文件"""
+        """保存密码本到文件；保存加密的密码本时需指定文件名
+
+        文件名以 .pwb 结尾时保存为紧凑二进制格式，否则保存为 JSON。
+        """
         try:
             if filename is None:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                original_name = password_book['metadata']['original_filename']
-                book_id = password_book['metadata']['book_id']
-                filename = f"{timestamp}_{original_name}_{book_id[:8]}.json"
+                filename = self.book_filename(password_book)
 
-            filepath = os.path.join(self.storage_dir, filename)
+            filepath = shard_path(self.storage_dir, filename)
 
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(password_book, f, ensure_ascii=False, indent=2)
+            if filename.endswith(BINARY_EXTENSION):
+                with open(filepath, 'wb') as f:
+                    f.write(encode_password_book(password_book.to_dict()))
+            else:
+                with open(filepath, 'w', encoding='utf-8') as f:
+                    f.write(export_json(password_book.to_dict()))
 
+            self._update_catalog(self.catalog.add, filepath, password_book)
             return True, filepath, filename
 
         except Exception as e:
             return False, None, f"保存密码本失败: {str(e)}"
 
     def load_password_book(self, file_path):
-        """从文件加载密码本"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                password_book = json.load(f)
-
-            # 验证密码本格式
-            if not self._validate_password_book_format(password_book):
-                return False, None, "密码本格式无效"
+        """从文件加载密码本（二进制或 JSON 格式），返回 PasswordBook 或 EncryptedPasswordBook
 
+        构建 PasswordBook 时校验格式；加密的密码本在解密后才校验。
+        """
+        try:
+            password_book = password_book_from_dict(load_password_book_file(file_path))
             return True, password_book, None
 
+        except PasswordBookError as e:
+            return False, None, f"密码本格式无效: {str(e)}"
         except Exception as e:
             return False, None, f"加载密码本失败: {str(e)}"
 
+    def read_metadata(self, file_path):
+        """只读取密码本的元数据；二进制格式不解码轮次，加密的密码本返回不含 data 的外层信息"""
+        try:
+            return True, load_password_book_file(file_path, rounds=False), None
+
+        except Exception as e:
+            return False, None, f"读取密码本失败: {str(e)}"
+
+    def export_password_book_json(self, file_path):
+        """将密码本文件导出为 JSON 文本（供用户下载查看或在其他环境中导入）"""
+        try:
+            return True, export_json(load_password_book_file(file_path)), None
+
+        except Exception as e:
+            return False, None, f"导出密码本失败: {str(e)}"
+
     def encrypt_password_book(self, password_book, password):
         """加密密码本"""
         try:
@@ -80,29 +196,27 @@ class PasswordBookManager:
             fernet = Fernet(key)
 
             # 加密密码本数据
-            password_book_str = json.dumps(password_book)
+            password_book_str = json.dumps(password_book.to_dict())
             encrypted_data = fernet.encrypt(password_book_str.encode())
 
             # 创建加密后的密码本
-            encrypted_book = {
-                'encrypted': True,
-                'salt': base64.urlsafe_b64encode(salt).decode(),
-                'data': base64.urlsafe_b64encode(encrypted_data).decode(),
-                'version': '1.0'
-            }
+            encrypted_book = EncryptedPasswordBook(
+                base64.urlsafe_b64encode(salt).decode(),
+                base64.urlsafe_b64encode(encrypted_data).decode()
+            )
             return True, encrypted_book, None
 
         except Exception as e:
             return False, None, f"加密密码本失败: {str(e)}"
 
     def decrypt_password_book(self, encrypted_book, password):
-        """解密密码本"""
+        """解密 EncryptedPasswordBook，返回校验过的 PasswordBook"""
         try:
-            if not encrypted_book.get('encrypted'):
+            if not encrypted_book.encrypted:
                 return False, None, "密码本未加密"
 
             # 还原盐值
-            salt = base64.urlsafe_b64decode(encrypted_book['salt'])
+            salt = base64.urlsafe_b64decode(encrypted_book.salt)
 
             # 生成密钥
             kdf = PBKDF2HMAC(
@@ -115,12 +229,14 @@ class PasswordBookManager:
             fernet = Fernet(key)
 
             # 解密数据
-            encrypted_data = base64.urlsafe_b64decode(encrypted_book['data'])
+            encrypted_data = base64.urlsafe_b64decode(encrypted_book.data)
             decrypted_data = fernet.decrypt(encrypted_data)
-            password_book = json.loads(decrypted_data.decode())
+            password_book = PasswordBook.from_dict(json.loads(decrypted_data.decode()))
 
             return True, password_book, None
 
+        except PasswordBookError as e:
+            return False, None, f"密码本格式无效: {str(e)}"
         except Exception as e:
             return False, None, f"解密密码本失败: 密码可能错误"
 
@@ -137,13 +253,13 @@ class PasswordBookManager:
             }
 
             for filename, password_book in books_dict.items():
-                book_id = password_book["metadata"]['book_id']
+                book_id = password_book.book_id
                 merged_book['books'][book_id] = {
                     'filename': filename,
-                    'original_filename': password_book["metadata"]['original_filename'],
-                    'encryption_time': password_book["metadata"]['encryption_time'], 
-                    'total_rounds': password_book["metadata"]['total_rounds'], 
-                    'rounds': password_book["rounds"]
+                    'original_filename': password_book.original_filename,
+                    'encryption_time': password_book.metadata['encryption_time'], 
+                    'total_rounds': password_book.total_rounds, 
+                    'rounds': password_book.rounds_to_dict()
                 }
                 merged_book["metadata"]['files'][book_id] = filename
 
@@ -154,21 +270,22 @@ class PasswordBookManager:
 
     def list_password_books(self):
         """列出所有密码本文件"""
+        success, result, error = self.query_password_books(per_page=None)
+        return success, result['books'] if success else None, error
+
+    def query_password_books(self, page=1, per_page=None, sort='modified_time', descending=True, search=None,
+                             encrypted=None):
+        """按页查询密码本索引，参数含义见 PasswordBookCatalog.query
+
+        索引由后台清理线程定期与密码本目录同步；未启用后台清理时查询前同步。
+        返回 (是否成功, {'books', 'total', 'page', 'pages', 'per_page'}, 错误信息)。
+        """
         try:
-            books = []
-            for filename in os.listdir(self.storage_dir):
-                if filename.endswith('.json'):
-                    filepath = os.path.join(self.storage_dir, filename)
-                    stat = os.stat(filepath)
-
-                    books.append({
-                        'filename': filename,
-                        'filepath': filepath,
-                        'size': stat.st_size,
-                        'modified_time': datetime.fromtimestamp(stat.st_mtime),
-                        'created_time': datetime.fromtimestamp(stat.st_ctime)
-                    })
-            return True, books, None
+            if not Config.JANITOR_ENABLED:
+                self.catalog.reconcile()
+            books, total = self.catalog.query(page, per_page, sort, descending, search, encrypted)
+            pages = max(-(-total // per_page), 1) if per_page else 1
+            return True, {'books': books, 'total': total, 'page': page, 'pages': pages, 'per_page': per_page}, None
 
         except Exception as e:
             return False, None, f"列出密码本失败: {str(e)}"
@@ -176,7 +293,8 @@ class PasswordBookManager:
     def delete_password_book(self, filename):
         """删除密码本文件"""
         try:
-            filepath = os.path.join(self.storage_dir, filename)
+            filepath = locate(self.storage_dir, filename)
+            self._update_catalog(self.catalog.remove, filepath)
             if os.path.exists(filepath):
                 os.remove(filepath)
                 return True, "删除成功"
@@ -188,47 +306,21 @@ class PasswordBookManager:
 
     def _generate_book_id(self, password_book):
         """生成密码本唯一ID"""
-        data_str = json.dumps(password_book, sort_keys=True)
+        data_str = json.dumps(password_book.to_dict(), sort_keys=True)
         return hashlib.md5(data_str.encode()).hexdigest()
 
-    def _validate_password_book_format(self, password_book):
-        """验证密码本格式"""
-        try:
-            required_keys = ['metadata', 'rounds', 'version']
-            required_metadata = ['encryption_time', 'total_rounds', 'original_filename', 'original_hash']
-
-            # 检查必需键
-            for key in required_keys:
-                if key not in password_book:
-                    return False
-
-            # 检查元数据
-            for key in required_metadata:
-                if key not in password_book['metadata']:
-                    return False
-
-            # 检查轮次信息
-            total_rounds = password_book['metadata']['total_rounds']
-            if len(password_book['rounds']) != total_rounds:
-                return False
-
-            return True
-
-        except:
-            return False
-
     def cleanup_old_books(self, hours=24):
         """清理旧的密码本文件"""
         try:
             cutoff_time = datetime.now().timestamp() - (hours * 3600)
             deleted_count = 0
 
-            for filename in os.listdir(self.storage_dir):
-                filepath = os.path.join(self.storage_dir, filename)
-                if os.path.isfile(filepath):
-                    stat = os.stat(filepath)
+            for entry in iter_entries(self.storage_dir):
+                if entry.is_file():
+                    stat = entry.stat()
                     if stat.st_mtime < cutoff_time:
-                        os.remove(filepath)
+                        os.remove(entry.path)
+                        self._update_catalog(self.catalog.remove, entry.path)
                         deleted_count += 1
 
             return True, f"清理了 {deleted_count} 个旧密码本"
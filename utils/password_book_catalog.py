@@ -0,0 +1,231 @@
+import os
+import sqlite3
+import logging
+from datetime import datetime
+from contextlib import contextmanager
+from config import Config
+from utils.storage_layout import is_shard_name
+from utils.password_book_format import BOOK_EXTENSIONS, load_password_book_file
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS password_books (
+    path TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    filepath TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    book_id TEXT,
+    original_filename TEXT,
+    final_filename TEXT,
+    final_hash TEXT,
+    total_rounds INTEGER,
+    encrypted INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL,
+    encryption_time TEXT,
+    created_at REAL NOT NULL,
+    modified_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_password_books_filename ON password_books (filename);
+CREATE INDEX IF NOT EXISTS idx_password_books_modified ON password_books (modified_at);
+CREATE INDEX IF NOT EXISTS idx_password_books_original ON password_books (original_filename);
+CREATE INDEX IF NOT EXISTS idx_password_books_book_id ON password_books (book_id);
+CREATE INDEX IF NOT EXISTS idx_password_books_final_hash ON password_books (final_hash);
+CREATE INDEX IF NOT EXISTS idx_password_books_dir ON password_books (dir);
+CREATE TABLE IF NOT EXISTS catalog_dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+'''
+
+# 可排序的列（页面参数 -> 数据库列）
+SORT_COLUMNS = {
+    'modified_time': 'modified_at',
+    'filename': 'filename',
+    'original_filename': 'original_filename',
+    'size': 'size',
+    'rounds': 'total_rounds'
+}
+
+
+class PasswordBookCatalog:
+    """密码本目录的 SQLite 索引：记录每个密码本的元数据，支持分页、排序和筛选查询
+
+    记录以相对于密码本目录的路径为键，不同目录中的同名文件各自索引。
+    保存 / 删除密码本时同步更新；其他途径（后台清理、手工复制）造成的变化由 reconcile() 增量同步：
+    只重新列出修改时间发生变化的分片目录。
+    """
+
+    def __init__(self, storage_dir, db_path=None):
+        self.storage_dir = storage_dir
+        self.db_path = db_path or Config.PASSWORD_BOOK_CATALOG_DB_PATH
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            # 旧版本的索引以文件名为键：索引可由密码本目录重建，直接删除后重新同步
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(password_books)')}
+            if columns and 'path' not in columns:
+                conn.executescript('DROP TABLE password_books; DROP TABLE IF EXISTS catalog_dirs;')
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _relpath(self, filepath):
+        """索引的键：相对于密码本目录的路径"""
+        return os.path.relpath(filepath, self.storage_dir)
+
+    def _describe(self, filepath, metadata, encrypted, stat):
+        """密码本的索引记录；加密的密码本只记录文件信息"""
+        return (
+            self._relpath(filepath), os.path.basename(filepath), filepath,
+            os.path.relpath(os.path.dirname(filepath), self.storage_dir),
+            metadata.get('book_id'), metadata.get('original_filename'), metadata.get('final_filename'),
+            metadata.get('final_hash'), metadata.get('total_rounds'), int(encrypted), stat.st_size,
+            metadata.get('encryption_time'), stat.st_ctime, stat.st_mtime
+        )
+
+    def add(self, filepath, password_book=None, conn=None):
+        """索引（或重新索引）一个密码本文件
+
+        password_book 为刚保存的 PasswordBook / EncryptedPasswordBook，为 None 时读取文件（二进制格式只读取元数据块）。
+        """
+        stat = os.stat(filepath)
+        metadata, encrypted = {}, False
+        if password_book is not None:
+            encrypted = password_book.encrypted
+            metadata = {} if encrypted else password_book.metadata
+        else:
+            try:
+                header = load_password_book_file(filepath, rounds=False)
+                encrypted = bool(header.get('encrypted'))
+                metadata = {} if encrypted else header.get('metadata') or {}
+            except (OSError, ValueError, AttributeError) as e:
+                # 无法解析的文件仍然列出，只是没有元数据
+                logger.warning(f"读取密码本失败: {filepath} - {str(e)}")
+
+        record = self._describe(filepath, metadata, encrypted, stat)
+        sql = ('INSERT OR REPLACE INTO password_books (path, filename, filepath, dir, book_id, original_filename, '
+               'final_filename, final_hash, total_rounds, encrypted, size, encryption_time, created_at, '
+               'modified_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+        if conn is not None:
+            conn.execute(sql, record)
+            return
+        with self._connect() as conn:
+            conn.execute(sql, record)
+
+    def remove(self, filepath):
+        """从索引中删除密码本文件"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM password_books WHERE path = ?', (self._relpath(filepath),))
+
+    def query(self, page=1, per_page=None, sort='modified_time', descending=True, search=None, encrypted=None):
+        """分页查询密码本，返回 (当前页的记录列表, 符合条件的总数)
+
+        search 匹配文件名、原文件名（包含）或密码本 ID、最终哈希（前缀）；
+        encrypted 为 True / False 时只返回加密 / 未加密的密码本；per_page 为 None 时返回全部。
+        """
+        where, params = [], []
+        if search:
+            escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            like, prefix = f'%{escaped}%', f'{escaped}%'
+            where.append("(filename LIKE ? ESCAPE '\\' OR original_filename LIKE ? ESCAPE '\\' "
+                         "OR book_id LIKE ? ESCAPE '\\' OR final_hash LIKE ? ESCAPE '\\')")
+            params.extend([like, like, prefix, prefix])
+        if encrypted is not None:
+            where.append('encrypted = ?')
+            params.append(int(encrypted))
+        clause = f" WHERE {' AND '.join(where)}" if where else ''
+
+        column = SORT_COLUMNS.get(sort, 'modified_at')
+        order = f" ORDER BY {column} {'DESC' if descending else 'ASC'}, path"
+        limit = ''
+        if per_page:
+            limit = ' LIMIT ? OFFSET ?'
+            params_page = params + [per_page, (max(page, 1) - 1) * per_page]
+        else:
+            params_page = params
+
+        with self._connect() as conn:
+            total = conn.execute(f'SELECT COUNT(*) FROM password_books{clause}', params).fetchone()[0]
+            rows = conn.execute(f'SELECT * FROM password_books{clause}{order}{limit}', params_page).fetchall()
+        return [self._row_to_book(row) for row in rows], total
+
+    def _row_to_book(self, row):
+        book = dict(row)
+        book['encrypted'] = bool(book['encrypted'])
+        book['modified_time'] = datetime.fromtimestamp(book.pop('modified_at'))
+        book['created_time'] = datetime.fromtimestamp(book.pop('created_at'))
+        book.pop('dir')
+        return book
+
+    def reconcile(self):
+        """与密码本目录增量同步，返回新增 / 更新及删除的记录数
+
+        需要读取每个分片目录的修改时间，由后台清理线程定期调用，不在页面请求中执行。
+        目录的修改时间在列出之前读取，列出过程中发生的变化会在下一次同步时处理。
+        """
+        added = removed = 0
+        with self._connect() as conn:
+            known_dirs = {row['path']: row['mtime_ns'] for row in conn.execute('SELECT path, mtime_ns FROM catalog_dirs')}
+            seen_dirs = set()
+            pending = [('.', 0)]
+            while pending:
+                rel_dir, depth = pending.pop()
+                path = os.path.normpath(os.path.join(self.storage_dir, rel_dir))
+                try:
+                    dir_mtime = os.stat(path).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                seen_dirs.add(rel_dir)
+                changed = known_dirs.get(rel_dir) != dir_mtime
+                # 末级分片目录未变化时无需列出；上级目录总要列出，以找到其中的分片目录
+                if not changed and depth >= Config.STORAGE_SHARD_LEVELS:
+                    continue
+
+                files = {}
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if depth < Config.STORAGE_SHARD_LEVELS and is_shard_name(entry.name):
+                                pending.append((os.path.normpath(os.path.join(rel_dir, entry.name)), depth + 1))
+                        elif changed and entry.name.endswith(BOOK_EXTENSIONS):
+                            files[entry.name] = entry
+                if not changed:
+                    continue
+
+                # 每个目录的变更在一个事务中提交
+                conn.execute('BEGIN')
+                indexed = {row['filename']: row for row in conn.execute(
+                    'SELECT path, filename, size, modified_at FROM password_books WHERE dir = ?', (rel_dir,)
+                )}
+                for name, entry in files.items():
+                    row = indexed.get(name)
+                    try:
+                        stat = entry.stat()
+                        if row is None or row['size'] != stat.st_size or row['modified_at'] != stat.st_mtime:
+                            self.add(entry.path, conn=conn)
+                            added += 1
+                    except FileNotFoundError:
+                        continue
+                for name in indexed.keys() - files.keys():
+                    conn.execute('DELETE FROM password_books WHERE path = ?', (indexed[name]['path'],))
+                    removed += 1
+                conn.execute('INSERT OR REPLACE INTO catalog_dirs (path, mtime_ns) VALUES (?, ?)', (rel_dir, dir_mtime))
+                conn.execute('COMMIT')
+
+            # 已被删除的分片目录
+            for rel_dir in known_dirs.keys() - seen_dirs:
+                removed += conn.execute('DELETE FROM password_books WHERE dir = ?', (rel_dir,)).rowcount
+                conn.execute('DELETE FROM catalog_dirs WHERE path = ?', (rel_dir,))
+
+        if added or removed:
+            logger.info(f"密码本索引同步: 新增/更新{added}个, 删除{removed}个")
+        return added, removed
@@ -0,0 +1,253 @@
+import os
+import json
+import base64
+import struct
+
+# 紧凑二进制密码本格式（.pwb）
+#
+#   头部（固定 14 字节，大端）：魔数 b'PWBK' | 格式版本 u8 | 标志 u8 | 元数据块长度 u32 | 轮次块长度 u32
+#   元数据块：紧凑 JSON，密码本除 rounds 以外的全部内容（加密的密码本为除 data 以外的内容）
+#   轮次块：未加密时为二进制编码的各轮记录；加密时为 Fernet 令牌（加密的是 JSON 格式的密码本）
+#
+# 只读取头部和元数据块即可获得元数据，无需解码轮次。
+# 轮次块中算法和后缀名编码为下列表中的序号（只能在末尾追加），所有文件名的公共前缀只保存一次。
+
+MAGIC = b'PWBK'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('>4sBBII')
+
+# 头部标志
+FLAG_ENCRYPTED = 0x01
+
+# 密码本文件后缀名
+BINARY_EXTENSION = '.pwb'
+JSON_EXTENSION = '.json'
+BOOK_EXTENSIONS = (BINARY_EXTENSION, JSON_EXTENSION)
+
+ALGORITHM_CODES = ('zip', 'tar', 'gzip', 'tar.gz', 'tar.bz2', 'tar.xz', 'xz', 'deflate')
+EXTENSION_CODES = ('.txt', '.jpg', '.pdf', '.docx', '.mp3', '.mp4', '.png', '.xlsx', '.zip', '.tar', '.gz',
+                   '.tar.gz', '.tar.bz2', '.tar.xz', '.xz', '.deflate')
+# 不在表中的值以内联字符串保存
+_INLINE = 0xFF
+
+# 轮次记录标志
+_HAS_STORED = 0x01
+_STORED = 0x02
+_HAS_LEVEL = 0x04
+_HAS_COMPRESSED_NAME = 0x08
+_HAS_ENCRYPTED_NAME = 0x10
+_HAS_EXTRA = 0x20
+
+_ROUND_KEYS = {'algorithm', 'extension', 'stored', 'compresslevel', 'compressed_filename', 'encrypted_filename'}
+
+
+def _compact_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _write_uvarint(buffer, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            buffer.append(byte | 0x80)
+        else:
+            buffer.append(byte)
+            return
+
+
+def _write_string(buffer, value):
+    data = value.encode('utf-8')
+    _write_uvarint(buffer, len(data))
+    buffer += data
+
+
+def _write_code(buffer, table, value):
+    if value in table:
+        buffer.append(table.index(value))
+    else:
+        buffer.append(_INLINE)
+        _write_string(buffer, value)
+
+
+class _Reader:
+    """轮次块的顺序读取器，数据不完整时抛出 ValueError"""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def byte(self):
+        if self.pos >= len(self.data):
+            raise ValueError("密码本数据不完整")
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def uvarint(self):
+        value = shift = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+
+    def string(self):
+        length = self.uvarint()
+        if self.pos + length > len(self.data):
+            raise ValueError("密码本数据不完整")
+        self.pos += length
+        return self.data[self.pos - length:self.pos].decode('utf-8')
+
+    def code(self, table):
+        code = self.byte()
+        if code == _INLINE:
+            return self.string()
+        if code >= len(table):
+            raise ValueError(f"未知的编码: {code}")
+        return table[code]
+
+
+def _encode_rounds(rounds):
+    """将各轮记录编码为轮次块；轮次编号必须为 1..n"""
+    count = len(rounds)
+    if set(rounds) != {str(n) for n in range(1, count + 1)}:
+        raise ValueError("轮次编号不连续")
+    ordered = [rounds[str(n)] for n in range(1, count + 1)]
+
+    names = [entry[key] for entry in ordered for key in ('compressed_filename', 'encrypted_filename')
+             if isinstance(entry.get(key), str)]
+    stem = os.path.commonprefix(names) if names else ''
+
+    buffer = bytearray()
+    _write_uvarint(buffer, count)
+    _write_string(buffer, stem)
+    for entry in ordered:
+        extra = {key: value for key, value in entry.items() if key not in _ROUND_KEYS}
+        level = entry.get('compresslevel')
+        if level is not None and not (isinstance(level, int) and 0 <= level <= 255):
+            extra['compresslevel'] = level
+            level = None
+
+        flags = 0
+        if 'stored' in entry:
+            flags |= _HAS_STORED | (_STORED if entry['stored'] else 0)
+        if level is not None:
+            flags |= _HAS_LEVEL
+        if isinstance(entry.get('compressed_filename'), str):
+            flags |= _HAS_COMPRESSED_NAME
+        elif 'compressed_filename' in entry:
+            extra['compressed_filename'] = entry['compressed_filename']
+        if isinstance(entry.get('encrypted_filename'), str):
+            flags |= _HAS_ENCRYPTED_NAME
+        elif 'encrypted_filename' in entry:
+            extra['encrypted_filename'] = entry['encrypted_filename']
+        if extra:
+            flags |= _HAS_EXTRA
+
+        buffer.append(flags)
+        _write_code(buffer, ALGORITHM_CODES, entry['algorithm'])
+        _write_code(buffer, EXTENSION_CODES, entry['extension'])
+        if flags & _HAS_LEVEL:
+            buffer.append(level)
+        if flags & _HAS_COMPRESSED_NAME:
+            _write_string(buffer, entry['compressed_filename'][len(stem):])
+        if flags & _HAS_ENCRYPTED_NAME:
+            _write_string(buffer, entry['encrypted_filename'][len(stem):])
+        if flags & _HAS_EXTRA:
+            _write_string(buffer, _compact_json(extra).decode('utf-8'))
+    return bytes(buffer)
+
+
+def _decode_rounds(data):
+    """解码轮次块，返回与 JSON 格式相同的 {'1': {...}, ...}"""
+    reader = _Reader(data)
+    count = reader.uvarint()
+    stem = reader.string()
+    rounds = {}
+    for round_num in range(1, count + 1):
+        flags = reader.byte()
+        algorithm = reader.code(ALGORITHM_CODES)
+        entry = {'extension': reader.code(EXTENSION_CODES), 'algorithm': algorithm}
+        if flags & _HAS_STORED:
+            entry['stored'] = bool(flags & _STORED)
+        if flags & _HAS_LEVEL:
+            entry['compresslevel'] = reader.byte()
+        if flags & _HAS_COMPRESSED_NAME:
+            entry['compressed_filename'] = stem + reader.string()
+        if flags & _HAS_ENCRYPTED_NAME:
+            entry['encrypted_filename'] = stem + reader.string()
+        if flags & _HAS_EXTRA:
+            entry.update(json.loads(reader.string()))
+        rounds[str(round_num)] = entry
+    return rounds
+
+
+def encode_password_book(password_book):
+    """将密码本（或加密的密码本）编码为二进制格式；无法编码时抛出 ValueError"""
+    if password_book.get('encrypted'):
+        header = {key: value for key, value in password_book.items() if key != 'data'}
+        payload = base64.urlsafe_b64decode(password_book['data'])
+        flags = FLAG_ENCRYPTED
+    else:
+        header = {key: value for key, value in password_book.items() if key != 'rounds'}
+        payload = _encode_rounds(password_book['rounds'])
+        flags = 0
+
+    metadata = _compact_json(header)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(metadata), len(payload)) + metadata + payload
+
+
+def _read_header(f):
+    """读取并校验头部，返回 (标志, 元数据块长度, 轮次块长度)"""
+    head = f.read(_HEADER.size)
+    if len(head) < _HEADER.size:
+        raise ValueError("密码本数据不完整")
+    magic, version, flags, metadata_length, payload_length = _HEADER.unpack(head)
+    if magic != MAGIC:
+        raise ValueError("不是二进制密码本")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"不支持的密码本格式版本: {version}")
+    return flags, metadata_length, payload_length
+
+
+def _read_exact(f, length):
+    data = f.read(length)
+    if len(data) < length:
+        raise ValueError("密码本数据不完整")
+    return data
+
+
+def read_password_book(f, rounds=True):
+    """从二进制文件对象读取密码本；rounds 为 False 时只读取头部和元数据块，不解码轮次"""
+    flags, metadata_length, payload_length = _read_header(f)
+    password_book = json.loads(_read_exact(f, metadata_length).decode('utf-8'))
+    if not rounds:
+        return password_book
+
+    payload = _read_exact(f, payload_length)
+    if flags & FLAG_ENCRYPTED:
+        password_book['data'] = base64.urlsafe_b64encode(payload).decode()
+    else:
+        password_book['rounds'] = _decode_rounds(payload)
+    return password_book
+
+
+def is_binary_book(head):
+    """按文件开头的字节判断是否为二进制密码本"""
+    return head[:len(MAGIC)] == MAGIC
+
+
+def load_password_book_file(file_path, rounds=True):
+    """读取密码本文件（二进制或 JSON 格式自动识别）；rounds 为 False 时二进制格式只读取元数据"""
+    with open(file_path, 'rb') as f:
+        if is_binary_book(f.read(len(MAGIC))):
+            f.seek(0)
+            return read_password_book(f, rounds)
+        f.seek(0)
+        return json.loads(f.read().decode('utf-8'))
+
+
+def export_json(password_book):
+    """导出为可读的 JSON 文本（与旧版本保存的格式相同）"""
+    return json.dumps(password_book, ensure_ascii=False, indent=2)
@@ -0,0 +1,184 @@
+PASSWORD_BOOK_VERSION = '1.0'
+PASSWORD_BOOK_GENERATOR = 'Flask File Encryption System'
+
+# 密码本必须包含的元数据
+REQUIRED_METADATA = ('encryption_time', 'total_rounds', 'original_filename', 'original_hash')
+
+
+class PasswordBookError(ValueError):
+    """密码本格式无效"""
+
+
+class RoundEntry:
+    """密码本中的一轮记录：本轮使用的压缩算法、修改后的后缀名及推算出的文件名"""
+
+    __slots__ = ('extension', 'algorithm', 'stored', 'compresslevel', 'compressed_filename', 'encrypted_filename',
+                 'extra')
+
+    def __init__(self, extension, algorithm, stored=None, compresslevel=None, compressed_filename=None,
+                 encrypted_filename=None, extra=None):
+        self.extension = extension
+        self.algorithm = algorithm
+        self.stored = stored
+        # tar 不压缩，没有压缩级别
+        self.compresslevel = compresslevel
+        self.compressed_filename = compressed_filename
+        self.encrypted_filename = encrypted_filename
+        # 其他版本写入的未知字段，导出时原样保留
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 JSON 格式的轮次记录构建，缺少算法或后缀名时抛出 PasswordBookError"""
+        if not isinstance(data, dict) or 'extension' not in data or 'algorithm' not in data:
+            raise PasswordBookError("轮次记录缺少算法或后缀名")
+        extra = {key: value for key, value in data.items() if key not in cls.__slots__}
+        return cls(data['extension'], data['algorithm'], data.get('stored'), data.get('compresslevel'),
+                   data.get('compressed_filename'), data.get('encrypted_filename'), extra or None)
+
+    def to_dict(self):
+        """转换为 JSON 格式的轮次记录，未设置的可选字段不输出"""
+        data = {'extension': self.extension, 'algorithm': self.algorithm}
+        for key in ('stored', 'compresslevel', 'compressed_filename', 'encrypted_filename'):
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __repr__(self):
+        return f"RoundEntry({self.algorithm!r}, {self.extension!r})"
+
+
+class PasswordBook:
+    """未加密的密码本：元数据及按轮次顺序排列的记录（rounds[0] 为第一轮）
+
+    由 from_dict 构建时校验一次格式，之后各处直接使用，无需重复校验。
+    """
+
+    __slots__ = ('metadata', 'rounds', 'version', 'generator', 'extra')
+
+    encrypted = False
+
+    def __init__(self, metadata, rounds=None, version=None, generator=None, extra=None):
+        self.metadata = metadata
+        self.rounds = rounds if rounds is not None else []
+        self.version = version
+        self.generator = generator
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 JSON 格式的密码本构建并校验，格式无效时抛出 PasswordBookError"""
+        if not isinstance(data, dict):
+            raise PasswordBookError("密码本格式无效")
+        for key in ('metadata', 'rounds', 'version'):
+            if key not in data:
+                raise PasswordBookError(f"密码本缺少 {key}")
+
+        metadata = data['metadata']
+        if not isinstance(metadata, dict):
+            raise PasswordBookError("密码本元数据无效")
+        for key in REQUIRED_METADATA:
+            if key not in metadata:
+                raise PasswordBookError(f"密码本元数据缺少 {key}")
+
+        # 轮次以 "1".."n" 为键，数量与 total_rounds 一致
+        rounds_data = data['rounds']
+        total_rounds = metadata['total_rounds']
+        if not isinstance(rounds_data, dict) or not isinstance(total_rounds, int) or len(rounds_data) != total_rounds:
+            raise PasswordBookError("密码本轮次数量与 total_rounds 不一致")
+        try:
+            rounds = [RoundEntry.from_dict(rounds_data[str(n)]) for n in range(1, total_rounds + 1)]
+        except KeyError as e:
+            raise PasswordBookError(f"密码本缺少第{e.args[0]}轮记录")
+
+        extra = {key: value for key, value in data.items()
+                 if key not in ('metadata', 'rounds', 'version', 'generator')}
+        return cls(metadata, rounds, data['version'], data.get('generator'), extra or None)
+
+    def to_dict(self):
+        """转换为 JSON 格式的密码本（轮次以 "1".."n" 为键）"""
+        data = {'metadata': self.metadata, 'rounds': self.rounds_to_dict()}
+        if self.version is not None:
+            data['version'] = self.version
+        if self.generator is not None:
+            data['generator'] = self.generator
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def rounds_to_dict(self):
+        """JSON 格式的轮次记录"""
+        return {str(round_num): entry.to_dict() for round_num, entry in enumerate(self.rounds, 1)}
+
+    def round(self, round_num):
+        """第 round_num 轮（从 1 开始）的记录"""
+        return self.rounds[round_num - 1]
+
+    @property
+    def total_rounds(self):
+        return len(self.rounds)
+
+    @property
+    def book_id(self):
+        return self.metadata.get('book_id')
+
+    @property
+    def original_filename(self):
+        return self.metadata.get('original_filename')
+
+    @property
+    def original_hash(self):
+        return self.metadata.get('original_hash')
+
+    @property
+    def final_filename(self):
+        return self.metadata.get('final_filename')
+
+    @property
+    def final_hash(self):
+        return self.metadata.get('final_hash')
+
+    def __repr__(self):
+        return f"PasswordBook({self.original_filename!r}, rounds={self.total_rounds})"
+
+
+class EncryptedPasswordBook:
+    """加密的密码本：盐值和加密的 JSON 密码本，解密后才能得到 PasswordBook"""
+
+    __slots__ = ('salt', 'data', 'version', 'extra')
+
+    encrypted = True
+
+    def __init__(self, salt, data, version=PASSWORD_BOOK_VERSION, extra=None):
+        self.salt = salt
+        self.data = data
+        self.version = version
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        if 'salt' not in data or 'data' not in data:
+            raise PasswordBookError("加密的密码本缺少盐值或数据")
+        extra = {key: value for key, value in data.items() if key not in ('encrypted', 'salt', 'data', 'version')}
+        return cls(data['salt'], data['data'], data.get('version'), extra or None)
+
+    def to_dict(self):
+        data = {'encrypted': True, 'salt': self.salt, 'data': self.data}
+        if self.version is not None:
+            data['version'] = self.version
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __repr__(self):
+        return "EncryptedPasswordBook()"
+
+
+def password_book_from_dict(data):
+    """按 encrypted 标记构建 PasswordBook 或 EncryptedPasswordBook"""
+    if isinstance(data, dict) and data.get('encrypted'):
+        return EncryptedPasswordBook.from_dict(data)
+    return PasswordBook.from_dict(data)
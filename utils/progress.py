@@ -0,0 +1,90 @@
+import time
+import logging
+from config import Config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class ProgressReporter:
+    """进度事件发送器：轮次事件立即发送，字节进度按 PROGRESS_INTERVAL 节流
+
+    事件为字典，type 为 'round'（开始一轮）、'bytes'（处理进度）或 'done'（完成）。
+    流式模式所有轮次同时进行，round 为 None，algorithm 为各轮算法列表。
+    没有回调时所有方法都不做任何事。
+    """
+
+    def __init__(self, callback=None, stage='encrypt', total_rounds=0, interval=None):
+        self.callback = callback
+        self.stage = stage
+        self.total_rounds = total_rounds
+        self.interval = interval if interval is not None else Config.PROGRESS_INTERVAL
+        self.round_num = None
+        self.algorithm = None
+        self.total_bytes = None
+        self.bytes_processed = 0
+        self._started = time.perf_counter()
+        self._last_emit = 0
+
+    def _emit(self, event_type):
+        elapsed = max(time.perf_counter() - self._started, 1e-6)
+        event = {
+            'type': event_type,
+            'stage': self.stage,
+            'round': self.round_num,
+            'total_rounds': self.total_rounds,
+            'algorithm': self.algorithm,
+            'bytes_processed': self.bytes_processed,
+            'total_bytes': self.total_bytes,
+            'throughput': round(self.bytes_processed / elapsed)
+        }
+        try:
+            self.callback(event)
+        except Exception as e:
+            # 进度上报失败不影响加密 / 解密本身
+            logger.warning(f"发送进度事件失败: {str(e)}")
+        self._last_emit = time.perf_counter()
+
+    def start_round(self, round_num, algorithm, total_bytes=None):
+        """开始一轮（流式模式下为开始全部轮次），字节计数从零开始"""
+        if self.callback is None:
+            return
+        self.round_num = round_num
+        self.algorithm = algorithm
+        self.total_bytes = total_bytes
+        self.bytes_processed = 0
+        self._started = time.perf_counter()
+        self._emit('round')
+
+    def advance(self, nbytes):
+        """记录已处理的字节数"""
+        if self.callback is None:
+            return
+        self.bytes_processed += nbytes
+        if time.perf_counter() - self._last_emit >= self.interval:
+            self._emit('bytes')
+
+    def finish(self):
+        """发送完成事件"""
+        if self.callback is None:
+            return
+        self._emit('done')
+
+
+class ProgressReader:
+    """读取时上报进度的文件包装"""
+
+    def __init__(self, fileobj, reporter):
+        self._fileobj = fileobj
+        self.reporter = reporter
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self.reporter.advance(len(data))
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
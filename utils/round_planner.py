@@ -0,0 +1,250 @@
+import io
+import os
+import time
+import random
+import logging
+import threading
+from config import Config
+from utils.stream_layers import open_layer_writer, open_layer_reader, STORED_VARIANTS
+from utils.entropy import is_incompressible
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 测量完成前使用的静态吞吐量估计（MB/s，压缩 / 解压），按算法取值；不压缩的变体（tar、0 级）另计
+_DEFAULT_THROUGHPUT_MBPS = {
+    'zip': (40, 300),
+    'gzip': (40, 300),
+    'tar.gz': (40, 300),
+    'deflate': (40, 300),
+    'tar.bz2': (10, 30),
+    'tar.xz': (5, 80),
+    'xz': (5, 80)
+}
+_STORED_THROUGHPUT_MBPS = (500, 800)
+
+
+class RoundPlanner:
+    """按本机实测吞吐量估算各算法耗时，生成满足时间预算的随机轮次计划
+
+    启用存储模式时，输入已不可压缩的轮次改用对应的存储变体（见 STORED_VARIANTS）。
+    """
+
+    # 各进程共享的测量结果：{(算法, 压缩级别): 压缩 / 解压吞吐量（字节/秒，按原始数据大小计）}
+    _throughput = {}
+    _decompress_throughput = {}
+    _lock = threading.Lock()
+    # 等待后台测量的变体及测量线程
+    _pending = set()
+    _measure_thread = None
+
+    def __init__(self, time_budget=None):
+        self.time_budget = time_budget if time_budget is not None else Config.ROUND_TIME_BUDGET
+
+    def _sample_data(self):
+        """生成测量用样本：一半随机数据、一半重复文本，接近实际上传文件的混合情况"""
+        size = Config.PLANNER_SAMPLE_SIZE
+        text = b'The quick brown fox jumps over the lazy dog. 0123456789\n'
+        return os.urandom(size // 2) + (text * (size // 2 // len(text) + 1))[:size - size // 2]
+
+    def _measure(self, variant, sample):
+        """测量单个算法（及压缩级别）的压缩和解压吞吐量"""
+        algorithm, level = variant
+        output = io.BytesIO()
+        start = time.perf_counter()
+        writer = open_layer_writer(algorithm, output, 'sample', len(sample), level)
+        writer.write(sample)
+        writer.close()
+        compress_elapsed = max(time.perf_counter() - start, 1e-6)
+
+        output.seek(0)
+        start = time.perf_counter()
+        reader = open_layer_reader(algorithm, output, 'sample')
+        while reader.read(Config.STREAM_CHUNK_SIZE):
+            pass
+        reader.close()
+        decompress_elapsed = max(time.perf_counter() - start, 1e-6)
+        return len(sample) / compress_elapsed, len(sample) / decompress_elapsed
+
+    def _default_throughput(self, variant):
+        """测量完成前使用的静态估计：(压缩, 解压) 吞吐量（字节/秒）"""
+        algorithm, level = variant
+        if algorithm == 'tar' or level == 0:
+            compress, decompress = _STORED_THROUGHPUT_MBPS
+        else:
+            compress, decompress = _DEFAULT_THROUGHPUT_MBPS.get(algorithm, _STORED_THROUGHPUT_MBPS)
+        return compress * 1024 * 1024, decompress * 1024 * 1024
+
+    def _measure_missing(self, variants):
+        """测量 variants 中的各变体，结果写入共享表；测量过程中不持有锁"""
+        sample = self._sample_data()
+        for variant in variants:
+            try:
+                result = self._measure(variant, sample)
+            except Exception as e:
+                logger.warning(f"测量算法吞吐量失败: {variant} - {str(e)}")
+                result = None
+            with self._lock:
+                if result is not None:
+                    self._throughput[variant], self._decompress_throughput[variant] = result
+                self._pending.discard(variant)
+        logger.debug(f"算法吞吐量（MB/s）: "
+                     f"{ {v: round(t / 1024 / 1024, 1) for v, t in self._throughput.items()} }")
+
+    def _run_pending(self):
+        """后台测量线程：依次测量等待中的变体，直到没有新的变体"""
+        while True:
+            with self._lock:
+                variants = sorted(self._pending, key=str)
+                if not variants:
+                    type(self)._measure_thread = None
+                    return
+            self._measure_missing(variants)
+
+    def _schedule(self, variants):
+        """将尚未测量的变体交给后台线程测量（调用方需持有锁）"""
+        self._pending.update(variants)
+        if self._measure_thread is None:
+            thread = threading.Thread(target=self._run_pending, name='throughput-benchmark', daemon=True)
+            type(self)._measure_thread = thread
+            thread.start()
+
+    def measure_throughput(self, variants, force=False, wait=False):
+        """获取各 (算法, 压缩级别) 的压缩吞吐量（字节/秒）
+
+        未测量的变体在后台线程中测量，测量完成前使用静态估计，调用方（如 web 请求）不会被阻塞；
+        wait 为 True 时在当前线程中测量完再返回（工作进程启动时预热使用）。
+        """
+        with self._lock:
+            missing = [v for v in variants if force or v not in self._throughput]
+            if missing and not wait:
+                self._schedule(missing)
+        if missing and wait:
+            self._measure_missing(missing)
+        with self._lock:
+            return {v: self._throughput.get(v) or self._default_throughput(v)[0] for v in variants}
+
+    def decompress_throughput(self, variants):
+        """各变体的解压吞吐量（字节/秒），未测量时使用静态估计"""
+        with self._lock:
+            return {v: self._decompress_throughput.get(v) or self._default_throughput(v)[1] for v in variants}
+
+    def warm_up(self, wait=True):
+        """测量所有压缩级别方案及存储变体的吞吐量，在工作进程启动时调用"""
+        variants = set()
+        for levels in Config.COMPRESSION_PROFILES.values():
+            for algorithm in Config.COMPRESSION_ALGORITHMS:
+                variants.add((algorithm, levels.get(algorithm)))
+                variants.add(STORED_VARIANTS[algorithm])
+        self.measure_throughput(sorted(variants, key=str), wait=wait)
+
+    def algorithm_stats(self, algorithms=None, profile=None):
+        """各算法在指定压缩级别方案下的压缩 / 解压吞吐量（MB/s），供页面展示和选择"""
+        algorithms = list(algorithms or Config.COMPRESSION_ALGORITHMS)
+        levels = Config.COMPRESSION_PROFILES[profile or Config.DEFAULT_COMPRESSION_PROFILE]
+        variants = [(a, levels.get(a)) for a in algorithms]
+        compress = self.measure_throughput(variants)
+        decompress = self.decompress_throughput(variants)
+
+        stats = []
+        for variant in variants:
+            stats.append({
+                'algorithm': variant[0],
+                'level': variant[1],
+                'compress_mbps': round(compress[variant] / 1024 / 1024, 1),
+                'decompress_mbps': round(decompress[variant] / 1024 / 1024, 1),
+                'measured': variant in self._throughput
+            })
+        return stats
+
+    def estimate_cost(self, variant, file_size, throughput):
+        """估算单轮耗时（秒）
+
+        第一轮之后的数据基本不可再压缩，各轮输入大小按原文件大小估算（上界）。
+        """
+        return file_size / throughput[variant]
+
+    def estimate_encrypt_seconds(self, file_size, rounds, algorithms=None, profile=None):
+        """估算加密单个文件耗时的上界（秒），用于提交任务前的准入控制
+
+        计划会在时间预算内选择算法，预算不足时改用最便宜的算法，因此上界为
+        “全部使用最慢算法”与时间预算中的较小者，但不低于全部使用最快算法的耗时。
+        """
+        algorithms = list(algorithms or Config.COMPRESSION_ALGORITHMS)
+        levels = Config.COMPRESSION_PROFILES[profile or Config.DEFAULT_COMPRESSION_PROFILE]
+        throughput = self.measure_throughput([(a, levels.get(a)) for a in algorithms])
+        if not throughput:
+            return 0.0
+
+        cheapest = rounds * file_size / max(throughput.values())
+        slowest = rounds * file_size / min(throughput.values())
+        if self.time_budget:
+            return max(cheapest, min(slowest, self.time_budget))
+        return slowest
+
+    def estimate_decrypt_seconds(self, file_size, variants):
+        """按密码本各轮的 (算法, 压缩级别) 估算解密单个文件的耗时（秒）"""
+        throughput = self.decompress_throughput(list(set(variants)))
+        return sum(file_size / throughput[v] for v in variants)
+
+    def round_variant(self, algorithm, incompressible, levels):
+        """确定一轮实际使用的 (算法, 压缩级别, 是否存储模式)，levels 为压缩级别方案"""
+        if incompressible and Config.STORE_MODE_ENABLED:
+            stored_algorithm, level = STORED_VARIANTS[algorithm]
+            return stored_algorithm, level, True
+        return algorithm, levels.get(algorithm), False
+
+    def plan(self, file_size, rounds, algorithms=None, entropy=None, profile=None):
+        """生成轮次计划
+
+        每轮仍随机选择算法，但只在“选中后剩余预算仍够后续轮次使用最便宜算法”的候选中选择；
+        没有候选时使用最便宜的算法。原文件抽样熵达到阈值，或前面的轮次已实际压缩过时，
+        该轮输入视为不可压缩，改用存储变体；其余轮次使用 profile 方案中的压缩级别。
+        返回计划和预计耗时，供执行前查看。
+        """
+        algorithms = list(algorithms or Config.COMPRESSION_ALGORITHMS)
+        profile = profile or Config.DEFAULT_COMPRESSION_PROFILE
+        if profile not in Config.COMPRESSION_PROFILES:
+            raise ValueError(f"不支持的压缩级别方案: {profile}")
+        levels = Config.COMPRESSION_PROFILES[profile]
+        variants = [(a, levels.get(a)) for a in algorithms]
+        if Config.STORE_MODE_ENABLED:
+            variants += [STORED_VARIANTS[a] for a in algorithms if STORED_VARIANTS[a] not in variants]
+        throughput = self.measure_throughput(variants)
+
+        incompressible = is_incompressible(entropy)
+        remaining = self.time_budget
+        steps = []
+        for round_num in range(1, rounds + 1):
+            options = {a: self.round_variant(a, incompressible, levels) for a in algorithms}
+            # 可估算耗时的算法：后台测量完成前按静态默认吞吐量估算，测量完成后按实测值估算；
+            # 没有默认吞吐量的算法（未知算法）无法估算，所有算法都无法估算时不按预算选择
+            costed = [a for a in algorithms if options[a][:2] in throughput]
+
+            if not self.time_budget or not costed:
+                choice = random.choice(algorithms)
+            else:
+                costs = {a: self.estimate_cost(options[a][:2], file_size, throughput) for a in costed}
+                reserve = (rounds - round_num) * min(costs.values())
+                candidates = [a for a in costed if costs[a] + reserve <= remaining]
+                choice = random.choice(candidates) if candidates else min(costed, key=lambda a: costs[a])
+                remaining -= costs[choice]
+
+            algorithm, level, stored = options[choice]
+            steps.append((algorithm, level, stored))
+            # 实际压缩过一轮后，后续输入即为压缩输出
+            if not stored and algorithm != 'tar':
+                incompressible = True
+
+        predicted = sum(self.estimate_cost((a, level), file_size, throughput)
+                        for a, level, _ in steps if (a, level) in throughput)
+        return {
+            'algorithms': [a for a, _, _ in steps],
+            'levels': [level for _, level, _ in steps],
+            'stored': [stored for _, _, stored in steps],
+            'profile': profile,
+            'entropy': round(entropy, 3) if entropy is not None else None,
+            'predicted_seconds': round(predicted, 3),
+            'time_budget': self.time_budget,
+            'within_budget': not self.time_budget or predicted <= self.time_budget
+        }
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+from contextlib import contextmanager
+from config import Config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_accessed ON sessions (accessed_at);
+'''
+
+
+def new_session_data():
+    """新会话的初始数据"""
+    return {
+        'uploaded_files': [],
+        'password_books': []
+    }
+
+
+class SessionStore:
+    """基于 SQLite 的会话存储，多个 web 进程共享同一份会话数据
+
+    会话在 ttl 秒内未被访问即过期；总数超过 max_entries 时淘汰最久未访问的会话。
+    进程内不缓存会话，每个请求读取一次、结束时写回一次。
+    """
+
+    def __init__(self, db_path=None, ttl=None, max_entries=None):
+        self.db_path = db_path or Config.SESSION_DB_PATH
+        self.ttl = ttl if ttl is not None else Config.SESSION_TTL
+        self.max_entries = max_entries if max_entries is not None else Config.SESSION_MAX_ENTRIES
+        self._last_purge = 0
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def load(self, session_id):
+        """读取未过期的会话数据，不存在或已过期时返回 None"""
+        if not session_id:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT data FROM sessions WHERE id = ? AND accessed_at >= ?', (session_id, time.time() - self.ttl)
+            ).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def create(self):
+        """创建新会话，返回 (会话ID, 会话数据)；会话在第一次保存时写入"""
+        return str(uuid.uuid4()), new_session_data()
+
+    def save(self, session_id, data):
+        """写回会话数据并刷新访问时间"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO sessions (id, data, created_at, accessed_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET data = excluded.data, accessed_at = excluded.accessed_at',
+                (session_id, json.dumps(data, ensure_ascii=False), now, now)
+            )
+        if now - self._last_purge > Config.SESSION_PURGE_INTERVAL:
+            self.purge()
+
+    def delete(self, session_id):
+        """删除会话"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+    def purge(self):
+        """删除过期会话，并按访问时间淘汰超出数量上限的会话，返回删除的数量"""
+        self._last_purge = time.time()
+        with self._connect() as conn:
+            expired = conn.execute(
+                'DELETE FROM sessions WHERE accessed_at < ?', (time.time() - self.ttl,)
+            ).rowcount
+            evicted = conn.execute(
+                'DELETE FROM sessions WHERE id IN '
+                '(SELECT id FROM sessions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            ).rowcount
+        if expired or evicted:
+            logger.info(f"清理会话: 过期{expired}个, 淘汰{evicted}个")
+        return expired + evicted
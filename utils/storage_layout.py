@@ -0,0 +1,97 @@
+import os
+import hashlib
+import logging
+from config import Config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def shard_key(filename):
+    """分片依据：文件名中第一个点之前的部分
+
+    加密 / 解密过程中的中间文件、加密文件和解密文件只替换后缀名，与上传文件位于同一个分片目录。
+    """
+    return os.path.basename(filename).split('.', 1)[0]
+
+
+def is_shard_name(name, width=None):
+    """是否为分片目录名（固定长度的小写十六进制）"""
+    width = width if width is not None else Config.STORAGE_SHARD_WIDTH
+    return len(name) == width and all(c in '0123456789abcdef' for c in name)
+
+
+def shard_dir(root, filename, levels=None, width=None):
+    """文件所在的分片目录：按文件名哈希的前缀逐级分散，如 root/3f/a2"""
+    levels = levels if levels is not None else Config.STORAGE_SHARD_LEVELS
+    width = width if width is not None else Config.STORAGE_SHARD_WIDTH
+    digest = hashlib.md5(shard_key(filename).encode('utf-8')).hexdigest()
+    return os.path.join(root, *(digest[i * width:(i + 1) * width] for i in range(levels)))
+
+
+def shard_path(root, filename, create=True):
+    """文件在分片布局中的路径，create 为 True 时创建所在的分片目录"""
+    directory = shard_dir(root, filename)
+    if create:
+        os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, os.path.basename(filename))
+
+
+def locate(root, filename):
+    """按文件名定位已存在的文件：先查分片目录，再查迁移前的平铺位置，都不存在时返回分片路径"""
+    filename = os.path.basename(filename)
+    path = shard_path(root, filename, create=False)
+    if not os.path.lexists(path):
+        flat = os.path.join(root, filename)
+        if os.path.lexists(flat):
+            return flat
+    return path
+
+
+def iter_entries(root, levels=None):
+    """遍历存储目录中的条目（分片目录中的文件和子目录，以及尚未迁移的平铺条目），产生 os.DirEntry"""
+    levels = levels if levels is not None else Config.STORAGE_SHARD_LEVELS
+
+    def walk(path, depth):
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if depth < levels and is_shard_name(entry.name) and entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path, depth + 1)
+            else:
+                yield entry
+
+    yield from walk(root, 0)
+
+
+def migrate(root, dry_run=False):
+    """将存储目录顶层平铺存放的文件和子目录移动到分片目录，返回 [(原路径, 新路径)]
+
+    同名的目标已存在时跳过该条目；dry_run 为 True 时只返回将要移动的条目。
+    """
+    moves = []
+    if Config.STORAGE_SHARD_LEVELS <= 0 or not os.path.isdir(root):
+        return moves
+
+    with os.scandir(root) as it:
+        entries = [entry for entry in it
+                   if not (is_shard_name(entry.name) and entry.is_dir(follow_symlinks=False))]
+
+    for entry in entries:
+        target = shard_path(root, entry.name, create=not dry_run)
+        if os.path.lexists(target):
+            logger.warning(f"目标已存在，跳过迁移: {entry.path} -> {target}")
+            continue
+        if not dry_run:
+            try:
+                os.replace(entry.path, target)
+            except OSError as e:
+                logger.error(f"迁移失败: {entry.path} - {str(e)}")
+                continue
+        moves.append((entry.path, target))
+
+    logger.info(f"{root}: {'将迁移' if dry_run else '已迁移'} {len(moves)} 项")
+    return moves
@@ -0,0 +1,402 @@
+import gzip
+import bz2
+import lzma
+import zlib
+import time
+import zipfile
+import tarfile
+import tempfile
+import logging
+from config import Config
+from utils.parallel_compress import ParallelGzipWriter, ParallelBz2Writer, ParallelXzWriter, parallel_workers
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# tar 系列算法对应的压缩方式，空字符串表示不压缩
+TAR_COMPRESSION = {
+    'tar': '',
+    'tar.gz': 'gz',
+    'tar.bz2': 'bz2',
+    'tar.xz': 'xz'
+}
+
+# 不带容器、直接压缩单个文件的算法对应的压缩方式
+RAW_COMPRESSION = {
+    'gzip': 'gz',
+    'xz': 'xz',
+    'deflate': 'deflate'
+}
+
+# 各算法对应的存储（不压缩）变体：(实际使用的算法, 压缩级别)
+# bz2 / xz 没有不压缩的级别，tar 系列改用普通 tar，单文件 xz 改用 0 级 deflate
+STORED_VARIANTS = {
+    'zip': ('zip', 0),
+    'tar': ('tar', None),
+    'gzip': ('gzip', 0),
+    'tar.gz': ('tar.gz', 0),
+    'tar.bz2': ('tar', None),
+    'tar.xz': ('tar', None),
+    'xz': ('deflate', 0),
+    'deflate': ('deflate', 0)
+}
+
+
+class _StreamSink:
+    """只暴露 write 的下游包装，使 zipfile 按不可寻址流的方式写入（数据描述符）"""
+
+    def __init__(self, target):
+        self._target = target
+
+    def write(self, data):
+        return self._target.write(data)
+
+    def flush(self):
+        pass
+
+
+class ZipLayerWriter:
+    """zip 层写入器：写入的数据作为压缩包内唯一的文件，压缩级别为 0 时使用存储模式
+
+    下游不可寻址，写入前必须确定是否使用 zip64：大小未知或可能超过 zip64 界限时强制使用 zip64。
+    """
+
+    def __init__(self, downstream, arcname, level=None, size=None):
+        compression = zipfile.ZIP_STORED if level == 0 else zipfile.ZIP_DEFLATED
+        # 压缩级别通过 ZipFile 的公开参数传入，按名称打开的成员使用该级别
+        self._zip = zipfile.ZipFile(_StreamSink(downstream), 'w', compression, compresslevel=level or None)
+        force_zip64 = size is None or size * 1.05 > zipfile.ZIP64_LIMIT
+        self._member = self._zip.open(arcname, 'w', force_zip64=force_zip64)
+
+    def write(self, data):
+        return self._member.write(data)
+
+    def close(self):
+        self._member.close()
+        self._zip.close()
+
+
+class RawLayerWriter:
+    """gzip / xz / deflate 层写入器：直接压缩数据，没有容器（gzip 头部记录文件名）"""
+
+    def __init__(self, downstream, arcname, compression, level=None):
+        self._out = open_compressor(compression, _StreamSink(downstream), level, filename=arcname)
+
+    def write(self, data):
+        return self._out.write(data)
+
+    def close(self):
+        self._out.close()
+
+
+class RawDeflateWriter:
+    """raw deflate 压缩写入器（wbits=-15，没有头部和校验）"""
+
+    def __init__(self, downstream, level=None):
+        self._downstream = downstream
+        self._compressor = zlib.compressobj(deflate_compresslevel(level), zlib.DEFLATED, -15)
+
+    def write(self, data):
+        self._downstream.write(self._compressor.compress(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._compressor is not None:
+            self._downstream.write(self._compressor.flush())
+            self._compressor = None
+
+
+class RawDeflateReader:
+    """raw deflate 解压读取器，每次解压的输出量受限，避免高压缩比数据占用过多内存"""
+
+    def __init__(self, upstream):
+        self._upstream = upstream
+        self._decompressor = zlib.decompressobj(-15)
+        self._buffer = bytearray()
+        self._eof = False
+
+    def _fill(self):
+        data = self._decompressor.unconsumed_tail
+        if not data:
+            data = self._upstream.read(Config.STREAM_CHUNK_SIZE)
+            if not data:
+                self._buffer += self._decompressor.flush()
+                self._eof = True
+                return
+        self._buffer += self._decompressor.decompress(data, Config.STREAM_CHUNK_SIZE)
+        if self._decompressor.eof:
+            self._eof = True
+
+    def read(self, size=-1):
+        while not self._eof and (size is None or size < 0 or len(self._buffer) < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self._buffer = bytearray()
+
+
+def gzip_compresslevel(level):
+    """gzip 压缩级别，未指定时与 gzip / tarfile 的默认值（9）一致"""
+    return 9 if level is None else level
+
+
+def xz_preset(level):
+    """xz 预设级别（0-9），未指定时与 lzma 的默认值（6）一致"""
+    if level is None:
+        return lzma.PRESET_DEFAULT
+    if not 0 <= level <= 9:
+        raise ValueError(f"xz 不支持压缩级别: {level}")
+    return level
+
+
+def deflate_compresslevel(level):
+    """deflate 压缩级别，未指定时使用 zlib 默认级别"""
+    return zlib.Z_DEFAULT_COMPRESSION if level is None else level
+
+
+def bz2_compresslevel(level):
+    """bz2 压缩级别，bz2 没有存储模式，级别范围为 1-9"""
+    if level is None:
+        return 9
+    if not 1 <= level <= 9:
+        raise ValueError(f"bz2 不支持压缩级别: {level}")
+    return level
+
+
+class TarLayerWriter:
+    """tar / tar.gz / tar.bz2 / tar.xz 层写入器
+
+    tar 头部需要预先知道成员大小；大小未知时（上一层是压缩输出）先写入溢出缓冲区，
+    关闭时再补写头部，这是流水线中唯一需要缓冲的位置。
+    """
+
+    def __init__(self, downstream, arcname, compression='', size=None, level=None):
+        self._sink = _StreamSink(downstream)
+        if compression:
+            self._out = open_compressor(compression, self._sink, level)
+        else:
+            self._out = self._sink
+        self._arcname = arcname
+        self._size = size
+        self._written = 0
+        self._offset = 0
+        self._buffer = None
+
+        if size is None:
+            self._buffer = tempfile.SpooledTemporaryFile(max_size=Config.SPOOL_MAX_SIZE, dir=Config.UPLOAD_FOLDER)
+        else:
+            self._write_raw(tar_header(arcname, size))
+
+    @property
+    def buffered(self):
+        """该层是否需要缓冲"""
+        return self._buffer is not None
+
+    def _write_raw(self, data):
+        self._out.write(data)
+        self._offset += len(data)
+
+    def write(self, data):
+        self._written += len(data)
+        if self._buffer is not None:
+            return self._buffer.write(data)
+        self._write_raw(data)
+        return len(data)
+
+    def close(self):
+        if self._buffer is not None:
+            self._write_raw(tar_header(self._arcname, self._written))
+            self._buffer.seek(0)
+            for chunk in iter(lambda: self._buffer.read(Config.STREAM_CHUNK_SIZE), b""):
+                self._write_raw(chunk)
+            self._buffer.close()
+            self._buffer = None
+        elif self._written != self._size:
+            raise ValueError(f"tar 成员大小不符: 期望{self._size}, 实际{self._written}")
+
+        # 数据块补齐、归档结束标记及记录补齐，与 tarfile 的输出保持一致
+        self._write_raw(tarfile.NUL * _block_padding(self._written))
+        self._write_raw(tarfile.NUL * (tarfile.BLOCKSIZE * 2))
+        remainder = self._offset % tarfile.RECORDSIZE
+        if remainder:
+            self._write_raw(tarfile.NUL * (tarfile.RECORDSIZE - remainder))
+
+        if self._out is not self._sink:
+            self._out.close()
+
+
+def open_compressor(compression, downstream, level=None, filename=''):
+    """创建 gz / bz2 / xz / deflate 压缩写入器
+
+    启用并行压缩且有多个线程时，gz / bz2 / xz 按块并行压缩（raw deflate 不能拼接，始终单线程）。
+
+    关闭写入器时不会关闭 downstream。
+    """
+    parallel = Config.PARALLEL_COMPRESSION and parallel_workers() > 1
+    if compression == 'gz':
+        if parallel:
+            return ParallelGzipWriter(downstream, gzip_compresslevel(level), filename)
+        return gzip.GzipFile(filename=filename, mode='wb', fileobj=downstream,
+                             compresslevel=gzip_compresslevel(level))
+    if compression == 'bz2':
+        if parallel:
+            return ParallelBz2Writer(downstream, bz2_compresslevel(level))
+        return bz2.BZ2File(downstream, 'wb', compresslevel=bz2_compresslevel(level))
+    if compression == 'xz':
+        if parallel:
+            return ParallelXzWriter(downstream, xz_preset(level))
+        return lzma.LZMAFile(downstream, 'wb', preset=xz_preset(level))
+    if compression == 'deflate':
+        return RawDeflateWriter(downstream, level)
+    raise ValueError(f"不支持的压缩方式: {compression}")
+
+
+def open_decompressor(compression, upstream):
+    """创建 gz / bz2 / xz / deflate 解压读取器，多成员（多流）的数据会依次读出"""
+    if compression == 'gz':
+        return gzip.GzipFile(fileobj=upstream, mode='rb')
+    if compression == 'bz2':
+        return bz2.BZ2File(upstream, 'rb')
+    if compression == 'xz':
+        return lzma.LZMAFile(upstream, 'rb')
+    if compression == 'deflate':
+        return RawDeflateReader(upstream)
+    raise ValueError(f"不支持的解压方式: {compression}")
+
+
+def _block_padding(size):
+    """tar 数据块补齐长度"""
+    remainder = size % tarfile.BLOCKSIZE
+    return tarfile.BLOCKSIZE - remainder if remainder else 0
+
+
+def tar_header(arcname, size):
+    """生成单个文件成员的 tar 头部"""
+    tarinfo = tarfile.TarInfo(arcname)
+    tarinfo.size = size
+    tarinfo.mtime = int(time.time())
+    tarinfo.mode = 0o644
+    return tarinfo.tobuf(tarfile.DEFAULT_FORMAT, tarfile.ENCODING, 'surrogateescape')
+
+
+def layer_output_size(algorithm, arcname, size):
+    """预测一层的输出大小，只有未压缩的 tar 可以预先确定，其余返回 None"""
+    if algorithm != 'tar' or size is None:
+        return None
+    total = len(tar_header(arcname, size)) + size + _block_padding(size) + tarfile.BLOCKSIZE * 2
+    remainder = total % tarfile.RECORDSIZE
+    return total + (tarfile.RECORDSIZE - remainder if remainder else 0)
+
+
+def open_layer_writer(algorithm, downstream, arcname, size=None, level=None):
+    """为指定算法创建层写入器，写入的数据经压缩后写入 downstream
+
+    level 为压缩级别，None 表示各算法默认级别，0 表示只打包不压缩（存储模式）。
+    """
+    if algorithm == 'zip':
+        return ZipLayerWriter(downstream, arcname, level, size)
+    if algorithm in RAW_COMPRESSION:
+        return RawLayerWriter(downstream, arcname, RAW_COMPRESSION[algorithm], level)
+    if algorithm in TAR_COMPRESSION:
+        return TarLayerWriter(downstream, arcname, TAR_COMPRESSION[algorithm], size, level)
+    raise ValueError(f"不支持的压缩算法: {algorithm}")
+
+
+def copy_into(src, writer, chunk_size=None):
+    """将文件对象分块写入层写入器"""
+    chunk_size = chunk_size or Config.STREAM_CHUNK_SIZE
+    for chunk in iter(lambda: src.read(chunk_size), b""):
+        writer.write(chunk)
+
+
+class LayerReader:
+    """层读取器：read 返回该层压缩包内文件的数据，arcname 为包内文件名（未知时为 None）"""
+
+    def __init__(self, stream, arcname, resources):
+        self._stream = stream
+        self.arcname = arcname
+        self._resources = resources
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        # 压缩流只能顺序读取，zip 层需要据此决定是否先缓冲
+        return False
+
+    def close(self):
+        for resource in reversed(self._resources):
+            resource.close()
+
+
+def _spool(upstream):
+    """将不可寻址的上游数据复制到溢出缓冲区"""
+    buffer = tempfile.SpooledTemporaryFile(max_size=Config.SPOOL_MAX_SIZE, dir=Config.UPLOAD_FOLDER)
+    for chunk in iter(lambda: upstream.read(Config.STREAM_CHUNK_SIZE), b""):
+        buffer.write(chunk)
+    buffer.seek(0)
+    return buffer
+
+
+def open_layer_reader(algorithm, upstream, expected_name=None):
+    """在上游数据流上打开一层，返回读取该层包内文件的 LayerReader"""
+    if algorithm == 'zip':
+        resources = []
+        # zip 的目录位于文件末尾，内层 zip 需要先缓冲成可寻址的数据
+        source = upstream
+        if not upstream.seekable():
+            source = _spool(upstream)
+            resources.append(source)
+        zipf = zipfile.ZipFile(source, 'r')
+        resources.append(zipf)
+
+        members = [info for info in zipf.infolist() if not info.is_dir()]
+        if not members:
+            raise ValueError("zip 压缩包中没有文件")
+        member = next((info for info in members if info.filename == expected_name), members[0])
+        stream = zipf.open(member)
+        resources.append(stream)
+        return LayerReader(stream, member.filename, resources)
+
+    if algorithm in TAR_COMPRESSION:
+        resources = []
+        compression = TAR_COMPRESSION[algorithm]
+        source = upstream
+        if compression:
+            source = open_decompressor(compression, upstream)
+            resources.append(source)
+        tar = tarfile.open(fileobj=source, mode='r|')
+        resources.append(tar)
+
+        # 流模式只能向前读取，取第一个普通文件成员
+        member = next((info for info in tar if info.isfile()), None)
+        if member is None:
+            raise ValueError("tar 压缩包中没有文件")
+        if expected_name and member.name != expected_name:
+            logger.debug(f"tar 成员名与密码本记录不一致: 期望{expected_name}, 实际{member.name}")
+        stream = tar.extractfile(member)
+        resources.append(stream)
+        return LayerReader(stream, member.name, resources)
+
+    if algorithm in RAW_COMPRESSION:
+        stream = open_decompressor(RAW_COMPRESSION[algorithm], upstream)
+        return LayerReader(stream, expected_name, [stream])
+
+    raise ValueError(f"不支持的解压算法: {algorithm}")
@@ -0,0 +1,144 @@
+import os
+import logging
+from flask import Request
+from utils.hashing import new_hasher, hash_cache
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class UploadSink:
+    """上传文件的接收端：请求体中的文件数据直接写入上传目录，写入时计算内容哈希和大小
+
+    视图通过 claim() 取得文件；请求结束时仍未被取得的文件会被删除。
+    """
+
+    def __init__(self, filepath, hash_spec):
+        self.filepath = filepath
+        self.hash_spec = tuple(hash_spec)
+        self.hasher = new_hasher(hash_spec)
+        self.size = 0
+        self.claimed = False
+        self._file = open(filepath, 'w+b')
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def close(self):
+        self._file.close()
+
+    def claim(self):
+        """取得已写入上传目录的文件，返回 (文件路径, 内容哈希)，并记录到哈希缓存"""
+        self._file.close()
+        self.claimed = True
+        digest = self.hasher.hexdigest()
+        hash_cache.put(self.filepath, self.hash_spec, digest)
+        return self.filepath, digest
+
+    def discard(self):
+        """删除未被取得的文件"""
+        self._file.close()
+        if not self.claimed and os.path.exists(self.filepath):
+            os.remove(self.filepath)
+            logger.debug(f"删除未使用的上传文件: {self.filepath}")
+
+
+class DiscardedUpload:
+    """未通过校验的上传文件：数据直接丢弃，不写入磁盘"""
+
+    def __init__(self, reason):
+        self.reason = reason
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+    def read(self, size=-1):
+        return b""
+
+    def readline(self, size=-1):
+        return b""
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return 0
+
+    def tell(self):
+        return 0
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class UploadRequest(Request):
+    """上传文件不经过 Werkzeug 的临时文件，直接流式写入上传目录的请求类
+
+    file_processor 负责生成上传文件的保存位置（open_upload_sink）和校验文件名；
+    validate_endpoints 中的视图在文件数据到达之前按文件名校验，不合法的文件直接丢弃。
+    """
+
+    file_processor = None
+    validate_endpoints = frozenset()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._upload_sinks = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not filename or self.file_processor is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+        if self.endpoint in self.validate_endpoints:
+            is_valid, message = self.file_processor.validate_file(filename)
+            if not is_valid:
+                logger.debug(f"丢弃未通过校验的上传文件: {filename} - {message}")
+                return DiscardedUpload(message)
+
+        try:
+            sink = self.file_processor.open_upload_sink(filename)
+        except OSError as e:
+            logger.warning(f"无法直接写入上传目录，改用临时文件: {filename} - {str(e)}")
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        self._upload_sinks.append(sink)
+        return sink
+
+    def close(self):
+        super().close()
+        for sink in self._upload_sinks:
+            try:
+                sink.discard()
+            except OSError as e:
+                logger.warning(f"删除上传文件失败: {sink.filepath} - {str(e)}")
@@ -0,0 +1,13 @@
+import os
+import sys
+import logging
+from utils.job_queue import start_workers
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    # 单独运行任务工作进程（web 进程设置 JOB_WORKERS=0 时使用），参数为进程数，默认 CPU 核数
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    for process in start_workers(count):
+        process.join()